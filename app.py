@@ -1,15 +1,12 @@
 import os
 from dotenv import load_dotenv
 from backend import create_app
-from backend.config import ensure_ttl_indexes
-from backend.extensions import init_redis, socketio
+from backend.extensions import socketio
 
 load_dotenv()
 app = create_app()
-init_redis()
 
 # socketio.init_app(app, cors_allowed_origins="*", async_mode="threading")
-ensure_ttl_indexes(app.mongo)
 
 if __name__ == "__main__":
     host = os.environ.get('FLASK_HOST', '0.0.0.0')
@@ -2,8 +2,7 @@ from flask import Flask
 from flask_session import Session
 from flask_cors import CORS
 from datetime import timedelta
-import logging
-from .config import Config, test_mongo_connection, ensure_ttl_indexes, ensure_unique_indexes, delete_expired_refresh_tokens
+from .config import Config
 from backend.extensions import init_redis, limiter, mail, socketio
 from dotenv import load_dotenv
 import os
@@ -11,8 +10,13 @@ from flask_pymongo import PyMongo
 import secrets
 import uuid
 from redis import Redis
-from flasgger import Swagger 
 from backend.routes.exam.exam_socket import socketio
+from backend.middleware.swagger_docs import LazySwaggerMiddleware, init_swagger
+from backend.utils.log_pipeline import configure_logging, init_request_ids
+from backend.utils.rate_limiter import configure_rate_limiter
+from backend.middleware.rate_limit import init_default_limits
+from flask.logging import default_handler
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
 load_dotenv()
@@ -29,8 +33,9 @@ def create_app():
          resources={r"/*": {
              "origins": "*",
              "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-             "allow_headers": ["Content-Type", "Authorization"],
-             "expose_headers": ["Content-Type", "Authorization"],
+             "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+             # get_questions returns the caller's session in X-Session-Id and the paper's ETag
+             "expose_headers": ["Content-Type", "Authorization", "X-Session-Id", "ETag"],
              "supports_credentials": True,
              "max_age": 3600
          }})
@@ -45,12 +50,22 @@ def create_app():
     if not app.config.get('MONGO_URI'):
         raise RuntimeError("MONGO_URI not set in the environment or config")
 
-    test_mongo_connection(app.config['MONGO_URI'])
+    hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if hops:
+        # request.remote_addr is then the client as seen by the outermost trusted proxy
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    # cryptography stays unimported until the first answer is encrypted, but a bad key fails now
+    from backend.utils.security import check_fernet_key
+    check_fernet_key()
 
     mongo.init_app(app, uri=f"{app.config['MONGO_URI']}/{app.config['MONGO_DB']}")
 
     app.mongo = mongo
 
+    from backend.utils.migrations import check_schema_version
+    app.config['SCHEMA_VERSION'] = check_schema_version(app)
+
     app.config['MAIL_SERVER'] = 'smtp.gmail.com'
     app.config['MAIL_PORT'] = 587
     app.config['MAIL_USE_TLS'] = True
@@ -88,18 +103,16 @@ def create_app():
 
     def generate_session_id():
         return str(uuid.uuid4()).hex
-    ensure_ttl_indexes(app.mongo)
-    ensure_unique_indexes(app.mongo)
-    
     app.session_interface.generate_sid = generate_session_id
 
     limiter.init_app(app)
     app.extensions["limiter"] = limiter
+    configure_rate_limiter(app.config.get('RATELIMIT_SYNC_SECONDS', 1))
+    init_default_limits(app)
 
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s %(levelname)s %(name)s %(message)s'
-    )
+    configure_logging(app.config)
+    app.logger.removeHandler(default_handler)
+    init_request_ids(app)
      
 
     from backend.routes.auth import auth_bp
@@ -152,29 +165,34 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(exam_registration_bp)
 
-    
-    delete_expired_refresh_tokens(app.mongo)
 
 
     socketio.init_app(app, message_queue=app.config.get('REDIS_URL'))
-    swagger_config = {
-        "headers": [],
-        "specs": [
-            {
-                "endpoint": 'apispec',
-                "route": '/apispec.json',
-                "rule_filter": lambda rule: True,  # include all routes
-                "model_filter": lambda tag: True,  # include all models
-            }
-        ],
-        "static_url_path": "/flasgger_static",
-        "swagger_ui": True,
-        "specs_route": "/docs/"  # Swagger UI available at /docs
-    }
-    Swagger(app, config=swagger_config)
+    if app.config.get('EXAM_ANSWER_WRITE_BEHIND') and app.config['SCHEMA_VERSION'] < 2:
+        # flushes rely on the unique (session_id, question_id) index to skip stale copies
+        app.logger.error("EXAM_ANSWER_WRITE_BEHIND needs schema version 2; run `flask db-upgrade`. Writing through.")
+        app.config['EXAM_ANSWER_WRITE_BEHIND'] = False
+    if app.config.get('EXAM_ANSWER_WRITE_BEHIND'):
+        from backend.utils.answer_buffer import start_answer_flusher
+        start_answer_flusher(app)
+    if app.config.get('PROCTOR_INGEST_BUFFERED'):
+        from backend.utils.proctor_ingest import start_proctor_flusher
+        start_proctor_flusher(app)
+    if app.config.get('SESSION_TIMER_ENABLED'):
+        from backend.utils.session_timer import start_session_scheduler
+        start_session_scheduler(app)
+    # flasgger is imported and the spec built on the first /docs or /apispec.json hit (SWAGGER_MODE=lazy)
+    swagger_mode = app.config.get('SWAGGER_MODE', 'lazy')
+    if swagger_mode == 'eager':
+        init_swagger(app)
+    elif swagger_mode == 'lazy':
+        app.wsgi_app = LazySwaggerMiddleware(app)
     
 
 
+    from backend.cli import register_commands
+    register_commands(app)
+
     @app.errorhandler(404)
     def not_found(error):
         return {'error': 'Resource not found'}, 404
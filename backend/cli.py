@@ -0,0 +1,475 @@
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import click
+from bson import ObjectId
+
+from backend.extensions import limiter
+
+# commands import what they exercise in their own body: create_app registers them in every
+# worker, and module-level imports here would load most of backend.utils at startup
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pct(50), 2),
+        "p95_ms": round(pct(95), 2),
+        "p99_ms": round(pct(99), 2),
+        "max_ms": round(ordered[-1], 2),
+        "mean_ms": round(statistics.mean(ordered), 2),
+    }
+
+
+_PROFILE_MARKER = "--- import profile start ---"
+_PROFILE_SNIPPET = """
+import importlib, json, sys, time
+sys.stderr.write({marker!r} + '\\n')
+start = time.perf_counter()
+module, _, attr = {entry!r}.partition(':')
+getattr(importlib.import_module(module), attr or 'create_app')()
+print(json.dumps({{'create_app_ms': (time.perf_counter() - start) * 1000}}))
+"""
+
+
+def _parse_importtime(stderr):
+    """-X importtime lines -> [(module, self_ms, cumulative_ms, depth)] in import order."""
+    rows = []
+    # skip interpreter start-up (site, encodings, ...) so only the app's imports are counted
+    if _PROFILE_MARKER in stderr:
+        stderr = stderr.split(_PROFILE_MARKER, 1)[1]
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us.strip()) / 1000, int(cumulative_us.strip()) / 1000, depth))
+    return rows
+
+
+def register_commands(app):
+
+    @app.cli.command("bench-login")
+    @click.option("--logins", default=200, help="Total login requests in the burst.")
+    @click.option("--concurrency", default=16, help="Concurrent login clients.")
+    @click.option("--probe-path", default="/health", help="Unrelated endpoint timed during the burst.")
+    def bench_login(logins, concurrency, probe_path):
+        """Login p99 and unrelated-endpoint latency under a login burst."""
+        from backend.utils.password_hashing import hash_password
+        from backend.utils.refresh_tokens import revoke_user_refresh_tokens
+
+        db = app.mongo.db
+        email = f"bench-{uuid.uuid4().hex[:8]}@bench.local"
+        password = "bench-passw0rd"
+        with app.app_context():
+            user_id = db.users.insert_one({
+                "email": email,
+                "name": f"bench-{uuid.uuid4().hex[:8]}",
+                "password": hash_password(password),
+                "is_active": True,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }).inserted_id
+
+        login_ms, probe_ms, statuses = [], [], {}
+        lock = threading.Lock()
+        remaining = {"n": logins}
+        done = threading.Event()
+
+        def login_worker():
+            client = app.test_client()
+            while True:
+                with lock:
+                    if remaining["n"] <= 0:
+                        return
+                    remaining["n"] -= 1
+                start = time.perf_counter()
+                resp = client.post("/api/auth/login", json={"email": email, "password": password})
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    login_ms.append(elapsed)
+                    statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+        def probe_worker():
+            client = app.test_client()
+            while not done.is_set():
+                start = time.perf_counter()
+                client.get(probe_path)
+                probe_ms.append((time.perf_counter() - start) * 1000)
+                time.sleep(0.01)
+
+        baseline_client = app.test_client()
+        baseline_ms = []
+        for _ in range(50):
+            start = time.perf_counter()
+            baseline_client.get(probe_path)
+            baseline_ms.append((time.perf_counter() - start) * 1000)
+
+        # the per-IP login limit would turn the burst into 429s before any hashing happens
+        limiter_enabled = limiter.enabled
+        limiter.enabled = False
+        app.config["RATELIMIT_ENABLED"], ratelimit_enabled = False, app.config.get("RATELIMIT_ENABLED", True)
+        try:
+            probe = threading.Thread(target=probe_worker, daemon=True)
+            probe.start()
+            workers = [threading.Thread(target=login_worker, daemon=True) for _ in range(concurrency)]
+            started = time.perf_counter()
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            wall = time.perf_counter() - started
+            done.set()
+            probe.join()
+        finally:
+            limiter.enabled = limiter_enabled
+            app.config["RATELIMIT_ENABLED"] = ratelimit_enabled
+            db.users.delete_one({"_id": user_id})
+            with app.app_context():
+                revoke_user_refresh_tokens(user_id, reason="bench_cleanup")
+
+        click.echo(f"workers={app.config.get('PASSWORD_HASH_WORKERS')} "
+                   f"queue={app.config.get('PASSWORD_HASH_QUEUE_SIZE')} "
+                   f"logins={logins} concurrency={concurrency} wall={wall:.2f}s")
+        click.echo(f"login statuses: {statuses}")
+        click.echo(f"login latency:  {_percentiles(login_ms)}")
+        click.echo(f"{probe_path} idle:   {_percentiles(baseline_ms)}")
+        click.echo(f"{probe_path} burst:  {_percentiles(probe_ms)}")
+
+    @app.cli.command("db-status")
+    def db_status():
+        """Stored schema version and pending migrations."""
+        from backend.utils.migrations import LATEST_VERSION, current_version, pending_migrations
+
+        db = app.mongo.db
+        click.echo(f"schema version: {current_version(db)} (latest {LATEST_VERSION})")
+        for migration in pending_migrations(db):
+            click.echo(f"  pending {migration['version']}: {migration['description']}")
+
+    @app.cli.command("db-upgrade")
+    @click.option("--to", "target", type=int, default=None, help="Stop at this schema version.")
+    @click.option("--dry-run", is_flag=True, help="List what would run without applying it.")
+    @click.option("--wait", "wait_seconds", type=int, default=600, show_default=True,
+                  help="Seconds to wait for another run's schema lock.")
+    def db_upgrade(target, dry_run, wait_seconds):
+        """Apply pending index/data migrations (run once per deploy, not per worker)."""
+        from backend.utils.migrations import current_version, pending_migrations, upgrade
+
+        db = app.mongo.db
+        pending = [m for m in pending_migrations(db) if target is None or m["version"] <= target]
+        if not pending:
+            click.echo(f"schema is up to date at version {current_version(db)}")
+            return
+        for migration in pending:
+            click.echo(f"{'would apply' if dry_run else 'applying'} {migration['version']}: {migration['description']}")
+        if dry_run:
+            return
+        try:
+            applied = upgrade(db, target=target, wait_seconds=wait_seconds)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"applied {applied}; schema version now {current_version(db)}")
+
+    @app.cli.command("flush-answers")
+    def flush_answers():
+        """Drain every buffered exam answer stream into Mongo (e.g. before maintenance)."""
+        from backend.utils.answer_buffer import flush_all
+
+        consumed = flush_all(app.mongo.db)
+        click.echo(f"flushed {consumed} buffered answer entries")
+
+    @app.cli.command("import-profile")
+    @click.option("--top", default=25, help="Modules to list, by cumulative import time.")
+    @click.option("--entry", default="backend:create_app", help="module:factory to cold-start.")
+    @click.option("--budget-ms", type=int, default=None, help="Fail if imports exceed this (default STARTUP_BUDGET_MS).")
+    def import_profile(top, entry, budget_ms):
+        """Cold-start create_app in a fresh interpreter and report per-module cumulative import ms."""
+        budget_ms = budget_ms if budget_ms is not None else app.config.get("STARTUP_BUDGET_MS", 1500)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROFILE_SNIPPET.format(entry=entry, marker=_PROFILE_MARKER)],
+            cwd=root, capture_output=True, text=True, env=os.environ.copy(),
+        )
+        rows = _parse_importtime(proc.stderr)
+        if proc.returncode != 0 or not rows:
+            raise click.ClickException(f"cold start failed:\n{proc.stderr[-2000:]}")
+
+        create_app_ms = None
+        for line in reversed(proc.stdout.splitlines()):
+            if line.startswith("{"):
+                create_app_ms = json.loads(line)["create_app_ms"]
+                break
+
+        by_package = {}
+        for name, _, cumulative, depth in rows:
+            if depth == 0:
+                package = name.split(".")[0]
+                by_package[package] = by_package.get(package, 0) + cumulative
+        total_ms = sum(by_package.values())
+
+        click.echo(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, self_ms, cumulative, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+            click.echo(f"{cumulative:>14.1f} {self_ms:>9.1f}  {name}")
+        click.echo("\ntop-level packages:")
+        for package, ms in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+            click.echo(f"{ms:>14.1f}  {package}")
+        if create_app_ms is not None:
+            click.echo(f"\ncreate_app wall: {create_app_ms:.1f} ms")
+        click.echo(f"imports total:   {total_ms:.1f} ms (budget {budget_ms} ms)")
+
+        if total_ms > budget_ms:
+            raise click.ClickException(f"import time {total_ms:.1f} ms exceeds budget of {budget_ms} ms")
+
+    @app.cli.command("bench-logging")
+    @click.option("--requests", "n", default=2000, help="Simulated form submissions.")
+    def bench_logging(n):
+        """Request-thread cost of the form-submission log calls: legacy sync logging vs the queue pipeline."""
+        from backend.utils.log_pipeline import configure_logging, stop_logging
+
+        payload = {"answers": {str(i): f"answer number {i} " * 4 for i in range(1, 21)}, "meta": {"ua": "x" * 200}}
+        structured = [{"question": f"Question {k}", "answer": v} for k, v in payload["answers"].items()]
+        logger = logging.getLogger("backend.routes.form_response")
+        root = logging.getLogger()
+
+        def legacy():
+            # the old create_app setup: basicConfig(DEBUG) and eager f-strings, written inline
+            stop_logging()
+            for h in list(root.handlers):
+                root.removeHandler(h)
+            handler = logging.StreamHandler(io.StringIO())
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+            root.addHandler(handler)
+            root.setLevel(logging.DEBUG)
+            start = time.perf_counter()
+            for _ in range(n):
+                logger.info(f"Received form submission data: {payload}")
+                logger.info(f"Structured answers: {structured}")
+            elapsed = time.perf_counter() - start
+            root.removeHandler(handler)
+            return elapsed / n * 1e6
+
+        def pipeline(profile):
+            configure_logging({**app.config, "LOG_PROFILE": profile, "LOG_LEVEL": None,
+                               "LOG_FORMAT": None, "LOG_PAYLOADS": None, "LOG_QUEUE_SIZE": 0},
+                              stream=io.StringIO())
+            start = time.perf_counter()
+            for _ in range(n):
+                logger.debug("Received form submission for %s: %s", "slug", payload, extra={"payload": True})
+                logger.debug("Structured answers: %s", structured, extra={"payload": True})
+            elapsed = time.perf_counter() - start
+            stop_logging()
+            return elapsed / n * 1e6
+
+        try:
+            results = {
+                "legacy sync (DEBUG, f-strings)": legacy(),
+                "pipeline development (payloads on)": pipeline("development"),
+                "pipeline production (payloads off)": pipeline("production"),
+            }
+        finally:
+            configure_logging(app.config)
+
+        click.echo(f"requests={n}; request-thread cost per submission:")
+        for name, us in results.items():
+            click.echo(f"  {name:<38} {us:8.2f} us")
+
+    @app.cli.command("bench-ratelimit")
+    @click.option("--checks", default=200000, help="Limit checks per mode.")
+    @click.option("--keys", default=1000, help="Distinct client keys.")
+    def bench_ratelimit(checks, keys):
+        """Per-check cost of the local (approximate) and exact (redis) rate-limit paths."""
+        from backend.utils.rate_limiter import compile_limits, hit, hit_exact, rate_limiter_stats, sync_counters
+
+        local = compile_limits("1000000 per minute", "bench.local")
+        exact = compile_limits("1000000 per minute", "bench.exact", exact=True)
+        clients = [f"10.0.{i // 256}.{i % 256}" for i in range(keys)]
+
+        start = time.perf_counter()
+        for i in range(checks):
+            hit(local, clients[i % keys])
+        local_us = (time.perf_counter() - start) / checks * 1e6
+        synced = sync_counters()
+
+        exact_checks = min(checks, 2000)
+        start = time.perf_counter()
+        for i in range(exact_checks):
+            hit_exact(exact[0], clients[i % keys])
+        exact_us = (time.perf_counter() - start) / exact_checks * 1e6
+
+        click.echo(f"local check: {local_us:8.3f} us  ({checks} checks, {keys} keys, {synced} keys synced in one batch)")
+        click.echo(f"exact check: {exact_us:8.3f} us  ({exact_checks} checks, one redis round trip each)")
+        click.echo(f"stats: {rate_limiter_stats()}")
+
+    @app.cli.command("bench-grading")
+    @click.option("--students", default=10000, help="Sessions to grade.")
+    @click.option("--questions", default=100, help="Questions in the synthetic exam.")
+    @click.option("--seed", default=7, help="Random seed for keys and answers.")
+    def bench_grading(students, questions, seed):
+        """Whole-exam grading: per-session scalar loop (submit_session) vs the NumPy batch engine."""
+        from backend.utils.batch_grading import batch_grading_stats, grade_sessions
+        from backend.utils.grading_keys import ExamGradingKeys, grade_session
+        from backend.utils.question_cache import QuestionIndex
+        from backend.utils.security import encrypt_answer
+
+        rng = random.Random(seed)
+        letters = list("abcdef")
+        docs = []
+        for i in range(questions):
+            kind = ("mcq", "mcq", "mcq", "multi", "boolean", "text", "essay")[i % 7]
+            doc = {"_id": ObjectId(), "type": "mcq" if kind == "multi" else kind, "points": rng.choice([1, 2, 3])}
+            if kind == "mcq":
+                doc["answer_key_encrypted"] = encrypt_answer(rng.choice(letters))
+            elif kind == "multi":
+                doc["answer_key_encrypted"] = encrypt_answer(rng.sample(letters, 3))
+                doc["allow_partial"] = True
+            elif kind == "boolean":
+                doc["answer_key_encrypted"] = encrypt_answer(rng.choice([True, False]))
+            elif kind == "text":
+                doc["answer_key_encrypted"] = encrypt_answer(["Paris", "paris, france"])
+            docs.append(doc)
+        keys = ExamGradingKeys(QuestionIndex(ObjectId(), datetime.utcnow(), docs))
+
+        def answer_for(key):
+            if rng.random() < 0.05:
+                return None
+            if key.type == "mcq" and key.allow_partial:
+                return rng.sample(letters, rng.randint(1, 4))
+            if key.type == "mcq":
+                return rng.choice(letters).upper() if rng.random() < 0.2 else rng.choice(letters)
+            if key.type == "boolean":
+                return rng.choice([True, False, "true", "False"])
+            if key.type == "text":
+                return rng.choice(["Paris", " paris ", "London"])
+            return "some essay text"
+
+        sessions = [{key.question_id: answer_for(key) for key in keys.order} for _ in range(students)]
+
+        # compared chunk by chunk (as grade_exam writes them) so neither side pays GC for the other's results
+        scalar_s = batch_s = totals_s = 0.0
+        mismatches = 0
+        for start_at in range(0, students, 1000):
+            chunk = sessions[start_at:start_at + 1000]
+            start = time.perf_counter()
+            expected = [grade_session(keys, answers) for answers in chunk]
+            scalar_s += time.perf_counter() - start
+            start = time.perf_counter()
+            got = grade_sessions(keys, chunk)
+            batch_s += time.perf_counter() - start
+            start = time.perf_counter()
+            totals = grade_sessions(keys, chunk, detailed=False)
+            totals_s += time.perf_counter() - start
+            mismatches += sum(
+                1 for a, b, t in zip(expected, got, totals) if a != b or (a[0], a[1]) != (t[0], t[1])
+            )
+            del expected, got, totals
+
+        cells = students * questions
+        click.echo(f"students={students} questions={questions} cells={cells}")
+        click.echo(f"scalar (submit_session loop): {scalar_s:8.3f} s  {scalar_s / cells * 1e6:7.3f} us/cell")
+        click.echo(f"batch, full results:          {batch_s:8.3f} s  {batch_s / cells * 1e6:7.3f} us/cell")
+        click.echo(f"batch, scores only:           {totals_s:8.3f} s  {totals_s / cells * 1e6:7.3f} us/cell")
+        click.echo(f"speedup x{scalar_s / batch_s:.1f} full, x{scalar_s / totals_s:.1f} scores only; "
+                   f"sessions differing from submit_session: {mismatches}")
+        click.echo(f"stats: {batch_grading_stats()}")
+        if mismatches:
+            raise click.ClickException("batch grading differs from submit_session")
+
+    @app.cli.command("bench-timers")
+    @click.option("--workers", default=4, help="Scheduler processes sharing the partitions.")
+    @click.option("--sessions", default=2000, help="Synthetic session deadlines.")
+    @click.option("--seconds", default=10, help="Deadlines are spread over this many seconds.")
+    @click.option("--lease-ms", default=2000, help="Partition lease TTL for the run.")
+    @click.option("--kill-one/--no-kill", default=True, help="Kill one worker midway to exercise failover.")
+    def bench_timers(workers, sessions, seconds, lease_ms, kill_one):
+        """Session timers across worker processes on the configured redis: every deadline fires exactly once."""
+        import multiprocessing
+
+        from backend.extensions import get_redis
+        from backend.utils import session_timer
+
+        client = get_redis()
+        if client is None:
+            raise click.ClickException("bench-timers needs REDIS_URL")
+        prefix = f"bench_session_timer:{uuid.uuid4().hex[:8]}"
+        app.config.update(
+            SESSION_TIMER_KEY_PREFIX=prefix,
+            SESSION_TIMER_LEASE_MS=lease_ms,
+            SESSION_TIMER_TICK_SECONDS=0.05,
+            SESSION_TIMER_MILESTONES="",
+        )
+        fired_key, lateness_key = f"{prefix}:fired", f"{prefix}:lateness"
+
+        with app.app_context():
+            start_at = time.time() + 1
+            pipe = client.pipeline(transaction=False)
+            for i in range(sessions):
+                sid = str(ObjectId())
+                due_ms = int((start_at + seconds * i / sessions) * 1000)
+                pipe.zadd(session_timer._key("due", session_timer.partition_of(sid)), {sid: due_ms})
+            pipe.execute()
+
+        def record(db, session_ids):
+            # stands in for expire_sessions: counts every hand-off instead of submitting
+            now_ms = int(time.time() * 1000)
+            pipe = client.pipeline(transaction=False)
+            for sid in session_ids:
+                pipe.hincrby(fired_key, sid, 1)
+            due = client.pipeline(transaction=False)
+            for sid in session_ids:
+                due.zscore(session_timer._key("due", session_timer.partition_of(sid)), sid)
+            for score in due.execute():
+                if score is not None:
+                    pipe.rpush(lateness_key, now_ms - int(score))
+            pipe.execute()
+            return len(session_ids)
+
+        def worker(index, run_for, kill_at):
+            with app.app_context():
+                stop = time.monotonic() + run_for
+                while time.monotonic() < stop:
+                    if kill_at is not None and time.monotonic() >= kill_at:
+                        os._exit(1)  # no lease release: the others must wait the TTL out
+                    session_timer.tick(None, client, expire=record)
+                    time.sleep(0.05)
+
+        run_for = seconds + 2 * lease_ms / 1000 + 3
+        ctx = multiprocessing.get_context("fork")
+        procs = [
+            ctx.Process(target=worker, args=(i, run_for, time.monotonic() + seconds / 2 if kill_one and i == 0 else None))
+            for i in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+
+        counts = [int(v) for v in client.hvals(fired_key)]
+        lateness = [float(v) for v in client.lrange(lateness_key, 0, -1)]
+        duplicates = sum(1 for c in counts if c > 1)
+        missed = sessions - len(counts)
+        for key in client.scan_iter(match=f"{prefix}:*"):
+            client.delete(key)
+
+        click.echo(f"workers={workers} sessions={sessions} partitions={app.config.get('SESSION_TIMER_PARTITIONS', 16)} "
+                   f"lease_ms={lease_ms} killed_one={kill_one}")
+        click.echo(f"fired={sum(counts)} distinct={len(counts)} duplicates={duplicates} missed={missed}")
+        click.echo(f"lateness: {_percentiles(lateness)}")
+        if duplicates or missed:
+            raise click.ClickException("session timers fired more or less than once")
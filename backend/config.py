@@ -1,10 +1,7 @@
 import os
-from datetime import timedelta, datetime
+from datetime import timedelta
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
 from flask_session import Session
-from pymongo import ASCENDING
 from bson import ObjectId
 
 load_dotenv()
@@ -27,6 +24,9 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     
     RATELIMIT_STORAGE_URL = os.getenv('REDIS_URL')
+    # middleware.rate_limit: per-worker counters reconciled with redis every RATELIMIT_SYNC_SECONDS
+    RATELIMIT_APP_DEFAULTS = os.getenv('RATELIMIT_APP_DEFAULTS', '2000 per day;200 per hour')
+    RATELIMIT_SYNC_SECONDS = float(os.getenv('RATELIMIT_SYNC_SECONDS', 1))
     
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  
     WTF_CSRF_ENABLED = True
@@ -45,66 +45,130 @@ class Config:
     FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
  
     SECURITY_PASSWORD_SALT = os.getenv('SALT')
-    
-def ensure_ttl_indexes(mongo):
-    db = mongo.db
-    db.anonymous.create_index(
-        [("submitted_at", 1)],
-        expireAfterSeconds=7 * 24 * 60 * 60,
-    )
-    
-    db.anonymous_links.create_index(
-        [("created_at", 1)],
-        expireAfterSeconds=7 * 24 * 60 * 60,
-    )
-    db.exams.create_index('code', unique=True)
-    db.exams.create_index([('owner_id', 1)])
-    db.exam_registration.create_index([('user_id', 1)])
-    db.exam_session.create_index([('exam_id', 1), ('user_id', 1)])
-    db.exam_results.create_index([('exam_id', 1)])
-    print('✅ MongoDB indexes ensured.')
-    
-    
-def test_mongo_connection(uri):
-    try:
-        client = MongoClient(uri, serverSelectionTimeoutMS=5000)
-        client.admin.command("ping")
-        print("MongoDB connection successful")
-    except ConnectionFailure as e:
-        print(f"Mongo connection failed: {e}")
-        raise e
-    
-    
-def ensure_unique_indexes(mongo):
-    mongo.db.users.create_index("email", unique=True, name="unique_email")
-    mongo.db.users.create_index("name", unique=True, name="unique_name")
-    
-def ensure_ttl_indexes(mongo):
-    """
-    Ensure indexes exist for collections (TTL + unique).
-    """
-    db = mongo.db
-    if "anonymous" in db.list_collection_names():
-        db.anonymous.create_index("submitted_at", expireAfterSeconds=60*60*24*7)
-    if "feedback" in db.list_collection_names():
-        db.feedback.create_index("created_at", expireAfterSeconds=60*60*24*30)
-
-    if "users" in db.list_collection_names():
-        db.users.create_index([("email", ASCENDING)], unique=True, name="unique_email")
-        db.users.create_index([("name", ASCENDING)], unique=True, name="unique_name")
-        
-    db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
-    print("TTL index for refresh_tokens created")
-        
+
+    # authenticated-user cache (per-worker LRU in front of redis)
+    USER_CACHE_LOCAL_TTL = int(os.getenv('USER_CACHE_LOCAL_TTL', 5))
+    USER_CACHE_REDIS_TTL = int(os.getenv('USER_CACHE_REDIS_TTL', 60))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+    # stateless auth fast path for hot exam endpoints (see middleware.auth.stateless_token_required)
+    AUTH_STATELESS_FAST_PATH = os.getenv('AUTH_STATELESS_FAST_PATH', 'false').lower() in ('1', 'true', 'yes')
+    TOKEN_VERSION_REFRESH_SECONDS = int(os.getenv('TOKEN_VERSION_REFRESH_SECONDS', 5))
+
+    # per-worker bloom filter mirroring the redis jti blacklist
+    REVOCATION_FILTER_CAPACITY = int(os.getenv('REVOCATION_FILTER_CAPACITY', 100000))
+    REVOCATION_FILTER_ERROR_RATE = float(os.getenv('REVOCATION_FILTER_ERROR_RATE', 0.001))
+    REVOCATION_FILTER_REBUILD_SECONDS = int(os.getenv('REVOCATION_FILTER_REBUILD_SECONDS', 3600))
+
+    # password hashing process pool (0 workers = hash inline on the request thread)
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 16))
+    PASSWORD_HASH_TIMEOUT = int(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))
+
+    # failed-login sliding windows (per identifier and per IP) with exponential backoff; a whole
+    # exam hall can share one NAT address, so the IP window only ever adds a short delay
+    LOGIN_FAILURE_WINDOW_SECONDS = int(os.getenv('LOGIN_FAILURE_WINDOW_SECONDS', 900))
+    LOGIN_MAX_FAILURES_PER_IDENTIFIER = int(os.getenv('LOGIN_MAX_FAILURES_PER_IDENTIFIER', 5))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 200))
+    LOGIN_BACKOFF_BASE_SECONDS = int(os.getenv('LOGIN_BACKOFF_BASE_SECONDS', 1))
+    LOGIN_BACKOFF_MAX_SECONDS = int(os.getenv('LOGIN_BACKOFF_MAX_SECONDS', 900))
+    LOGIN_IP_MAX_DELAY_SECONDS = int(os.getenv('LOGIN_IP_MAX_DELAY_SECONDS', 5))
+    # reverse proxies in front of the app whose X-Forwarded-For / -Proto are trusted (werkzeug
+    # ProxyFix), so per-IP limits see the client; set it to the proxy count behind one
+    PROXY_FIX_HOPS = int(os.getenv('PROXY_FIX_HOPS', 0))
+
+    # refresh tokens live in redis; mongo only keeps an optional audit trail
+    REFRESH_TOKEN_TTL_DAYS = int(os.getenv('REFRESH_TOKEN_TTL_DAYS', 7))
+    REFRESH_TOKEN_AUDIT = os.getenv('REFRESH_TOKEN_AUDIT', 'false').lower() in ('1', 'true', 'yes')
+    # a rotated refresh token presented again this soon (two tabs at once) gets the same successor
+    REFRESH_TOKEN_GRACE_SECONDS = float(os.getenv('REFRESH_TOKEN_GRACE_SECONDS', 10))
+
+    # indexes/migrations are applied by `flask db-upgrade`; boot only checks the stored version
+    SCHEMA_AUTO_UPGRADE = os.getenv('SCHEMA_AUTO_UPGRADE', 'false').lower() in ('1', 'true', 'yes')
+
+    # cold start: swagger docs "lazy" (built on first /docs hit), "eager" or "off";
+    # `flask import-profile` and tests/test_startup.py fail above this many ms of cold start
+    SWAGGER_MODE = os.getenv('SWAGGER_MODE', 'lazy').lower()
+    STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', 1500))
+
+    # logging pipeline (utils.log_pipeline): "production" = INFO, JSON lines, no payload dumps
+    LOG_PROFILE = os.getenv('LOG_PROFILE', 'development' if os.getenv('FLASK_ENV') == 'development' else 'production')
+    LOG_LEVEL = os.getenv('LOG_LEVEL')
+    LOG_FORMAT = os.getenv('LOG_FORMAT')
+    LOG_PAYLOADS = os.getenv('LOG_PAYLOADS', '').lower() in ('1', 'true', 'yes') if os.getenv('LOG_PAYLOADS') else None
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    # per-logger sampling for sub-warning records, e.g. "backend.routes.form_response=0.1"
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
+    # per-worker exam question index (utils.question_cache), versioned by the exam's updated_at
+    QUESTION_CACHE_MAX_EXAMS = int(os.getenv('QUESTION_CACHE_MAX_EXAMS', 256))
+    QUESTION_CACHE_RECHECK_SECONDS = int(os.getenv('QUESTION_CACHE_RECHECK_SECONDS', 5))
+
+    # answers accepted by one /api/exam_take/answer request (one bulk_write)
+    EXAM_ANSWER_BATCH_MAX = int(os.getenv('EXAM_ANSWER_BATCH_MAX', 200))
+    # lifetime of the per-session answered counters/bitset in redis (utils.exam_progress)
+    EXAM_PROGRESS_TTL_SECONDS = int(os.getenv('EXAM_PROGRESS_TTL_SECONDS', 86400))
+
+    # write-behind autosaves (utils.answer_buffer): answers go to a redis stream per exam and a
+    # flusher bulk-writes the latest value per (session, question); submit forces a flush
+    EXAM_ANSWER_WRITE_BEHIND = os.getenv('EXAM_ANSWER_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+    EXAM_ANSWER_FLUSH_SECONDS = float(os.getenv('EXAM_ANSWER_FLUSH_SECONDS', 1))
+    EXAM_ANSWER_FLUSH_BATCH = int(os.getenv('EXAM_ANSWER_FLUSH_BATCH', 1000))
+    EXAM_ANSWER_RECLAIM_MS = int(os.getenv('EXAM_ANSWER_RECLAIM_MS', 60000))
+
+    # precompiled exam papers (utils.exam_paper): shared on local disk, recent ones kept in memory;
+    # brotli is used when the `brotli` package is installed, gzip always
+    EXAM_PAPER_DIR = os.getenv('EXAM_PAPER_DIR')
+    EXAM_PAPER_CACHE_SIZE = int(os.getenv('EXAM_PAPER_CACHE_SIZE', 64))
+    EXAM_PAPER_CACHE_CONTROL = os.getenv('EXAM_PAPER_CACHE_CONTROL', 'private, no-cache')
+
+    # single-flight read coalescing (utils.single_flight); the redis variant also shares a
+    # leader's result across workers for SINGLE_FLIGHT_RESULT_MS
+    SINGLE_FLIGHT_REDIS = os.getenv('SINGLE_FLIGHT_REDIS', 'false').lower() in ('1', 'true', 'yes')
+    SINGLE_FLIGHT_LOCK_MS = int(os.getenv('SINGLE_FLIGHT_LOCK_MS', 2000))
+    SINGLE_FLIGHT_RESULT_MS = int(os.getenv('SINGLE_FLIGHT_RESULT_MS', 500))
+
+    # decrypted, pre-normalized answer keys per exam version (utils.grading_keys); kept short
+    # since they hold plaintext keys
+    GRADING_KEY_TTL_SECONDS = int(os.getenv('GRADING_KEY_TTL_SECONDS', 300))
+    GRADING_KEY_CACHE_SIZE = int(os.getenv('GRADING_KEY_CACHE_SIZE', 64))
+
+    # chunked grading jobs (utils.grading_jobs; celery settings are read in utils.background)
+    GRADING_CHUNK_SIZE = int(os.getenv('GRADING_CHUNK_SIZE', 500))
+    GRADING_JOB_STALL_SECONDS = int(os.getenv('GRADING_JOB_STALL_SECONDS', 600))
+    GRADING_STREAM_POLL_SECONDS = float(os.getenv('GRADING_STREAM_POLL_SECONDS', 1))
+    # submit returns 202 and grades on the celery grading queue (a request can pass "async")
+    EXAM_SUBMIT_ASYNC = os.getenv('EXAM_SUBMIT_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+
+    # exam deadlines (utils.session_timer): one scheduler per worker auto-submits expired sessions;
+    # clients count down locally and get `time_milestone` at these seconds left
+    SESSION_TIMER_ENABLED = os.getenv('SESSION_TIMER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SESSION_TIMER_TICK_SECONDS = float(os.getenv('SESSION_TIMER_TICK_SECONDS', 1))
+    SESSION_TIMER_SWEEP_SECONDS = int(os.getenv('SESSION_TIMER_SWEEP_SECONDS', 30))
+    SESSION_TIMER_MILESTONES = os.getenv('SESSION_TIMER_MILESTONES', '300,60')
+    # with redis, sessions hash to partitions and each partition's timers run on the one worker
+    # holding its lease; a dead worker's partitions move after SESSION_TIMER_LEASE_MS
+    SESSION_TIMER_PARTITIONS = int(os.getenv('SESSION_TIMER_PARTITIONS', 16))
+    SESSION_TIMER_LEASE_MS = int(os.getenv('SESSION_TIMER_LEASE_MS', 10000))
+    SESSION_TIMER_KEY_PREFIX = os.getenv('SESSION_TIMER_KEY_PREFIX', 'session_timer')
+
+    # live exam presence (utils.exam_presence): heartbeats refresh a per-exam redis zset; a
+    # session is idle / disconnected after these seconds of silence and swept after STALE
+    EXAM_PRESENCE_IDLE_SECONDS = int(os.getenv('EXAM_PRESENCE_IDLE_SECONDS', 30))
+    EXAM_PRESENCE_DISCONNECT_SECONDS = int(os.getenv('EXAM_PRESENCE_DISCONNECT_SECONDS', 90))
+    EXAM_PRESENCE_STALE_SECONDS = int(os.getenv('EXAM_PRESENCE_STALE_SECONDS', 1800))
+
+    # buffered proctoring events (utils.proctor_ingest): one insert_many + one counter bulk_write
+    # per flush, every PROCTOR_FLUSH_MS or PROCTOR_FLUSH_EVENTS; producers flush inline past MAX
+    PROCTOR_INGEST_BUFFERED = os.getenv('PROCTOR_INGEST_BUFFERED', 'true').lower() in ('1', 'true', 'yes')
+    PROCTOR_FLUSH_MS = int(os.getenv('PROCTOR_FLUSH_MS', 500))
+    PROCTOR_FLUSH_EVENTS = int(os.getenv('PROCTOR_FLUSH_EVENTS', 500))
+    PROCTOR_BUFFER_MAX = int(os.getenv('PROCTOR_BUFFER_MAX', 10000))
+    PROCTOR_DETAILS_MAX_BYTES = int(os.getenv('PROCTOR_DETAILS_MAX_BYTES', 2048))
+
+
 def to_objectid(value):
     if isinstance(value, ObjectId):
         return value 
     return ObjectId(str(value))
-
-def delete_expired_refresh_tokens(mongo):
-    db = mongo.db
-    now = datetime.utcnow()
-    result = db.refresh_tokens.delete_many({
-        "expires_at": {"$lt": now}
-    })
-    print(f"🧹 Deleted {result.deleted_count} expired refresh tokens.")
\ No newline at end of file
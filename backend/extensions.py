@@ -12,9 +12,9 @@ load_dotenv()
 mail = Mail()
 redis_client = None
 
+# app-wide defaults are enforced by middleware.rate_limit.init_default_limits (local counters)
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["2000 per day", "200 per hour"],
     storage_uri=os.getenv("REDIS_URL")
 )
 
@@ -27,6 +27,10 @@ def api_rate_limit(limit="10/minute"):
         return limiter.limit(limit)(f)
     return decorator
 
+def get_redis():
+    """Return the shared redis client (None when Redis is unavailable)."""
+    return redis_client
+
 def init_redis():
     global redis_client
     redis_url = os.getenv("REDIS_URL")
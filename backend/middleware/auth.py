@@ -3,6 +3,13 @@ from flask import request, jsonify, g, current_app
 from bson import ObjectId
 import jwt
 from backend.extensions import redis_client
+from backend.utils.user_cache import get_cached_user
+from backend.utils.revocation_filter import start_revocation_listener, might_be_revoked, record_redis_check
+from backend.utils.token_version import (
+    start_version_refresher,
+    version_table_is_fresh,
+    is_token_version_current,
+)
 
 # ---------------------------
 # Helpers
@@ -34,8 +41,19 @@ def _is_jti_blacklisted(jti):
     try:
         if not redis_client:
             return False
+        start_revocation_listener(
+            capacity=current_app.config.get("REVOCATION_FILTER_CAPACITY", 100000),
+            error_rate=current_app.config.get("REVOCATION_FILTER_ERROR_RATE", 0.001),
+            rebuild_seconds=current_app.config.get("REVOCATION_FILTER_REBUILD_SECONDS", 3600),
+        )
+        # the local filter answers "definitely not revoked" without a round trip
+        filter_hit = might_be_revoked(jti)
+        if filter_hit is False:
+            return False
         # exists returns 1 if key exists
-        return bool(redis_client.exists(f"blacklist:{jti}"))
+        revoked = bool(redis_client.exists(f"blacklist:{jti}"))
+        record_redis_check(revoked, filter_hit)
+        return revoked
     except Exception as e:
         # Don't fail hard if Redis is down; log and continue
         current_app.logger.warning(f"Redis blacklist check failed: {e}")
@@ -43,20 +61,34 @@ def _is_jti_blacklisted(jti):
 
 def _load_user(user_id):
     try:
-        user = current_app.mongo.db.users.find_one({"_id": ObjectId(user_id), "is_active": True})
-        return user
+        return get_cached_user(user_id)
     except Exception as e:
         current_app.logger.exception(f"MongoDB user lookup failed: {e}")
         return None
 
+def _attach_user(user, payload, jti):
+    # Attach contexts for compatibility with existing code
+    g.current_user = user
+    # attach user_id both to request and g for compatibility (some code uses request.user_id)
+    try:
+        # request is a proxy, setting attribute directly is fine for short-lived per-request usage
+        request.user_id = str(user["_id"])
+    except Exception:
+        # If setting on request fails for whatever reason, still attach to g
+        current_app.logger.debug("Could not set request.user_id; falling back to g.current_user only")
+    # also attach on g
+    g.user_id = str(user["_id"])
+    g.token_payload = payload
+    g.jti = jti
+
 # ---------------------------
 # Decorators
 # ---------------------------
 
 def jwt_required(func):
     """
-    Validate JWT, check jti blacklist, load user, and attach:
-      - g.current_user -> full user document
+    Validate JWT, check jti blacklist, load user (via the user cache), and attach:
+      - g.current_user -> projected user document (no password hash)
       - request.user_id  -> string user id (for code that expects it)
     """
     @wraps(func)
@@ -87,20 +119,51 @@ def jwt_required(func):
         if user is None:
             return jsonify({"error": "User not found"}), 404
 
-        # Attach contexts for compatibility with existing code
-        g.current_user = user
-        # attach user_id both to request and g for compatibility (some code uses request.user_id)
+        _attach_user(user, payload, jti)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+def stateless_token_required(func):
+    """
+    Opt-in fast path for hot endpoints (AUTH_STATELESS_FAST_PATH).
+    Trusts the signed claims (user_id, email, role) and checks the token's `ver` claim
+    against the per-worker version table instead of the redis blacklist and the user lookup.
+    g.current_user only carries _id, email and role, so only use it on routes that need no more.
+    Falls back to jwt_required when disabled, for tokens without `ver`, or while the table is stale.
+    """
+    full_check = jwt_required(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get("AUTH_STATELESS_FAST_PATH"):
+            return full_check(*args, **kwargs)
+
+        start_version_refresher(current_app.config.get("TOKEN_VERSION_REFRESH_SECONDS", 5))
+
+        token = _get_bearer_token()
+        if not token:
+            return jsonify({"error": "Authorization header missing or invalid"}), 401
+
+        payload, err = _decode_jwt(token)
+        if err:
+            msg, code = err
+            return jsonify({"error": msg}), code
+
+        user_id = payload.get("user_id")
+        version = payload.get("ver")
+        if not user_id or version is None or not version_table_is_fresh():
+            return full_check(*args, **kwargs)
+
+        if not is_token_version_current(user_id, version, payload.get("sid")):
+            return jsonify({"error": "Token revoked"}), 401
+
         try:
-            # request is a proxy, setting attribute directly is fine for short-lived per-request usage
-            request.user_id = str(user["_id"])
+            user = {"_id": ObjectId(user_id), "email": payload.get("email"), "role": payload.get("role")}
         except Exception:
-            # If setting on request fails for whatever reason, still attach to g
-            current_app.logger.debug("Could not set request.user_id; falling back to g.current_user only")
-        # also attach on g
-        g.user_id = str(user["_id"])
-        g.token_payload = payload
-        g.jti = jti
+            return jsonify({"error": "Malformed token: invalid user_id"}), 401
 
+        _attach_user(user, payload, payload.get("jti"))
         return func(*args, **kwargs)
 
     return wrapper
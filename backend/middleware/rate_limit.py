@@ -1,19 +1,67 @@
 from functools import wraps
-from flask import current_app
+from flask import current_app, g, jsonify, request
+from backend.utils.rate_limiter import compile_limits, hit
 
-def api_rate_limit():
-    return rate_limit_decorator("100 per minute")
 
-def feedback_rate_limit():
-    return rate_limit_decorator("5 per minute")
+def remote_address():
+    return request.remote_addr or "127.0.0.1"
 
-def rate_limit_decorator(limit_string):
+
+def current_user_key():
+    """Per-user key for routes behind an auth decorator, so students sharing an IP don't share a limit."""
+    user = g.get("current_user")
+    return f"user:{user['_id']}" if user else remote_address()
+
+
+def too_many_requests(limit, retry_after):
+    response = jsonify({'error': f'Rate limit exceeded: {limit.text}'})
+    response.headers['Retry-After'] = str(int(retry_after) + 1)
+    return response, 429
+
+
+def rate_limit(limit_string, exact=False, key_func=remote_address, scope=None):
+    """
+    Route limit compiled once at decoration time.
+    Default mode counts in-process and reconciles with redis in the background (approximate
+    global limit, no round trip per request); exact=True does one atomic redis INCR per request
+    and is meant for sensitive routes such as login.
+    """
     def decorator(f):
+        limits = compile_limits(limit_string, scope or f"{f.__module__}.{f.__name__}", exact=exact)
+
         @wraps(f)
         def wrapped(*args, **kwargs):
-            limiter = current_app.extensions.get('limiter')
-            if limiter:
-                return limiter.limit(limit_string)(f)(*args, **kwargs)
+            if current_app.config.get('RATELIMIT_ENABLED', True):
+                retry_after, limit = hit(limits, key_func())
+                if retry_after:
+                    return too_many_requests(limit, retry_after)
             return f(*args, **kwargs)
+        wrapped.rate_limits = limits
         return wrapped
     return decorator
+
+
+def init_default_limits(app):
+    """App-wide limits (RATELIMIT_APP_DEFAULTS) in local mode, replacing Flask-Limiter's per-request redis hits."""
+    if not app.config.get('RATELIMIT_APP_DEFAULTS'):
+        return
+    limits = compile_limits(app.config['RATELIMIT_APP_DEFAULTS'], "default")
+
+    @app.before_request
+    def apply_default_limits():
+        if request.method == 'OPTIONS' or not current_app.config.get('RATELIMIT_ENABLED', True):
+            return None
+        retry_after, limit = hit(limits, remote_address())
+        if retry_after:
+            return too_many_requests(limit, retry_after)
+        return None
+
+
+def api_rate_limit():
+    return rate_limit_decorator("100 per minute")
+
+def feedback_rate_limit():
+    return rate_limit_decorator("5 per minute")
+
+def rate_limit_decorator(limit_string):
+    return rate_limit(limit_string)
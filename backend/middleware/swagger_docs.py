@@ -0,0 +1,73 @@
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+SWAGGER_CONFIG = {
+    "headers": [],
+    "specs": [
+        {
+            "endpoint": 'apispec',
+            "route": '/apispec.json',
+            "rule_filter": lambda rule: True,  # include all routes
+            "model_filter": lambda tag: True,  # include all models
+        }
+    ],
+    "static_url_path": "/flasgger_static",
+    "swagger_ui": True,
+    "specs_route": "/docs/"  # Swagger UI available at /docs
+}
+
+DOCS_PATH_PREFIXES = ("/docs/", "/apispec.json", "/flasgger_static/", "/oauth2-redirect.html", "/apidocs/")
+
+
+def init_swagger(app):
+    """Eager mode: import flasgger and register the docs views on the app itself."""
+    from flasgger import Swagger
+    return Swagger(app, config=SWAGGER_CONFIG)
+
+
+class LazySwaggerMiddleware:
+    """
+    Serves /docs and /apispec.json from a side app that is only built (and flasgger only
+    imported) on the first docs request. The spec is generated from the main app's url_map.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self._docs_app = None
+        self._lock = Lock()
+
+    def _build(self):
+        from flask import Flask
+        from flasgger import Swagger
+
+        main_app = self.app
+        docs_app = Flask(main_app.import_name)
+        docs_app.debug = main_app.debug
+
+        def in_main_app(view):
+            # flasgger reads routes from current_app; point it at the real app for the spec view
+            if view.__name__ not in {spec["endpoint"] for spec in SWAGGER_CONFIG["specs"]}:
+                return view
+
+            def wrapped(*args, **kwargs):
+                with main_app.app_context():
+                    return view(*args, **kwargs)
+            wrapped.__name__ = view.__name__
+            return wrapped
+
+        Swagger(docs_app, config=SWAGGER_CONFIG, decorators=[in_main_app])
+        logger.info("Swagger docs app initialised on first request")
+        return docs_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path != "/docs" and not path.startswith(DOCS_PATH_PREFIXES):
+            return self.wsgi_app(environ, start_response)
+        if self._docs_app is None:
+            with self._lock:
+                if self._docs_app is None:
+                    self._docs_app = self._build()
+        return self._docs_app.wsgi_app(environ, start_response)
@@ -1,5 +1,7 @@
 from datetime import datetime
 from bson import ObjectId
+from flask import current_app
+from backend.utils.single_flight import forget, single_flight
 
 def exam_doc(title, description, start_time, end_time, duration_seconds, owner_id, code, settings=None):
     return {
@@ -27,4 +29,24 @@ def exam_doc(title, description, start_time, end_time, duration_seconds, owner_i
         "invited_examiners": [],
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
-    }
\ No newline at end of file
+    }
+
+
+@single_flight("exam_by_id", key_func=lambda exam_id, published_only=False: f"{exam_id}:{int(bool(published_only))}", distributed=True)
+def find_exam(exam_id, published_only=False):
+    """Exam by id (optionally only if published). Concurrent identical lookups share one query."""
+    query = {"_id": ObjectId(str(exam_id))}
+    if published_only:
+        query["status"] = "published"
+    return current_app.mongo.db.exams.find_one(query)
+
+
+@single_flight("exam_by_code", key_func=lambda code: str(code), distributed=True)
+def find_published_exam_by_code(code):
+    return current_app.mongo.db.exams.find_one({"code": code, "status": "published"})
+
+
+def invalidate_exam(exam_id, *codes):
+    """Call after writing an exam: drops the lookups other workers share for it (id and codes)."""
+    forget("exam_by_id", f"{exam_id}:0", f"{exam_id}:1")
+    forget("exam_by_code", *(code for code in codes if code))
@@ -3,7 +3,6 @@ from bson import ObjectId
 from typing import Any
 import hashlib
 import json
-from cryptography.fernet import InvalidToken
 from backend.utils.security import hash_answer, encrypt_answer
 from backend.utils.security import get_fernet
 
@@ -15,6 +14,7 @@ def encrypt_value(value: any) -> str:
 
 
 def decrypt_value(value: str) -> any:
+    from cryptography.fernet import InvalidToken
     f = get_fernet()
     try:
         payload = f.decrypt(value.encode("utf-8"))
@@ -1,12 +1,12 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 from backend import mongo 
+from backend.utils.password_hashing import hash_password, verify_password
 
 USERS_COLLECTION = "users"
 
 def create_user(email, password, name=""):
-    hashed_password = generate_password_hash(password)
+    hashed_password = hash_password(password)
     user_data = {
         "email": email,
         "name": name,
@@ -28,7 +28,7 @@ def get_user_by_id(user_id):
     return mongo.db[USERS_COLLECTION].find_one({"_id": ObjectId(user_id)})
 
 def check_user_password(user, password):
-    return check_password_hash(user["password"], password)
+    return verify_password(user["password"], password)
 
 def generate_registration_token():
     """Generate a unique registration token"""
@@ -1,18 +1,32 @@
 from flask import Blueprint, request, jsonify, current_app, url_for, g, make_response, redirect
-from werkzeug.security import generate_password_hash, check_password_hash
-from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime, timedelta
-from backend.middleware.auth import token_required
+from backend.middleware.auth import token_required, _is_jti_blacklisted
+from backend.middleware.rate_limit import rate_limit
 from pymongo.errors import DuplicateKeyError
 import logging
 import jwt
 import uuid
 import requests
-from backend.extensions import redis_client, mongo, limiter
+from backend.extensions import redis_client, mongo
 from google.oauth2 import id_token
 from backend.utils.validation import validate_email, validate_password, generate_token, verify_token
 from backend.utils.mailer import send_email
+from backend.utils.user_cache import get_cached_user, invalidate_user
+from backend.utils.token_version import get_token_version, bump_token_version
+from backend.utils.revocation_filter import publish_revocation
+from backend.utils.password_hashing import hash_password, verify_password, HashingBusy
+from backend.utils.login_throttle import login_retry_after, record_login_failure, clear_login_failures
+from backend.utils.session_registry import list_sessions
+from backend.utils.refresh_tokens import (
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+    revoke_user_refresh_tokens,
+    revoke_refresh_family,
+    RefreshStoreUnavailable,
+    RefreshTokenReuse,
+)
 from google.auth.transport.requests import Request
 
 auth_bp = Blueprint("auth", __name__)
@@ -34,6 +48,23 @@ def create_jwt(payload, expires_in_seconds=900):
     return jwt.encode(payload_copy, current_app.config["SECRET_KEY"], algorithm="HS256")
 
 
+def access_token_claims(user, token_version=None, session_id=None):
+    """Claims for an access token; `ver` lets the stateless fast path detect revocation, `sid` names the session."""
+    claims = {
+        "user_id": str(user["_id"]),
+        "email": user["email"],
+        "role": user.get("role"),
+        "ver": token_version if token_version is not None else get_token_version(user["_id"]),
+    }
+    if session_id:
+        claims["sid"] = session_id
+    return claims
+
+
+def client_device():
+    return request.headers.get("User-Agent", "unknown")
+
+
 def decode_jwt(token):
     try:
         return jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
@@ -51,60 +82,20 @@ def blacklist_access_token(jti, expires_in_seconds=None):
         key = f"blacklist:{jti}"
         ttl = expires_in_seconds if expires_in_seconds else 60 * 60 * 24
         redis_client.setex(key, ttl, "1")
+        # workers mirror the blacklist in a local bloom filter fed by this channel
+        publish_revocation(jti, client=redis_client)
     except Exception:
         logger.exception("Failed to blacklist token in redis")
 
 
 def is_token_blacklisted(jti):
-    try:
-        if not redis_client:
-            return False
-        return bool(redis_client.get(f"blacklist:{jti}"))
-    except Exception:
-        logger.exception("Redis check failed")
-        return False
+    return _is_jti_blacklisted(jti)
 
 
-# wrapper that validates JWT + non-blacklisted jti and attaches user to request
-from functools import wraps
-
-
-def jwt_required(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", "")
-        if not auth_header.startswith("Bearer "):
-            return jsonify({"error": "Authorization header missing or invalid"}), 401
-
-        token = auth_header.split(" ", 1)[1]
-        payload = decode_jwt(token)
-        if not payload:
-            return jsonify({"error": "Invalid or expired token"}), 401
-
-        jti = payload.get("jti")
-        if not jti:
-            return jsonify({"error": "Malformed token"}), 401
-
-        if is_token_blacklisted(jti):
-            return jsonify({"error": "Token revoked"}), 401
-
-        # attach user id/email for handlers
-        request.user_id = payload.get("user_id")
-        request.user_email = payload.get("email")
-
-        # optionally load user into g
-        db = get_db()
-        try:
-            user = db.users.find_one({"_id": ObjectId(request.user_id), "is_active": True})
-            if not user:
-                return jsonify({"error": "User not found"}), 404
-            g.current_user = user
-        except Exception:
-            return jsonify({"error": "Invalid user id in token"}), 401
-
-        return func(*args, **kwargs)
-
-    return wrapper
+def hashing_busy_response(e):
+    response = jsonify({"error": "Server busy, please retry shortly"})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
 
 
 # --- Refresh token helpers ---
@@ -126,45 +117,14 @@ def clear_refresh_cookie(response):
     response.delete_cookie("refresh_token", path="/api/auth/refresh")
 
 
-def store_refresh_token_in_db(token, user_id, expires_days=7, replaced_by=None):
-    db = get_db()
-    doc = {
-        "token": token,
-        "user_id": str(user_id),
-        "created_at": datetime.utcnow(),
-        "expires_at": datetime.utcnow() + timedelta(days=expires_days),
-        "revoked": False,
-        "replaced_by": replaced_by,
-    }
-    db.refresh_tokens.insert_one(doc)
-    return doc
-
-
-def revoke_refresh_token(token, reason="user_logout"):
-    db = get_db()
-    db.refresh_tokens.update_one({"token": token}, {"$set": {"revoked": True, "revoked_at": datetime.utcnow(), "revoked_reason": reason}})
-
-
-def rotate_refresh_token(old_token):
-    db = get_db()
-    old = db.refresh_tokens.find_one({"token": old_token})
-    if not old:
-        return None
-
-    if old.get("revoked"):
-        return None
-
-    # mark old revoked and create a new one
-    new_token = str(uuid.uuid4())
-    db.refresh_tokens.update_one({"token": old_token}, {"$set": {"revoked": True, "revoked_at": datetime.utcnow()}})
-    store_refresh_token_in_db(new_token, old["user_id"])  # default 7 days
-    return new_token
+def refresh_store_unavailable_response():
+    return jsonify({"error": "Session store unavailable, please retry shortly"}), 503
 
 
 # --- Routes ---
 
 @auth_bp.route("/register", methods=["POST"])
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute', exact=True)
 def register():
     try:
         data = request.get_json() or {}
@@ -195,7 +155,7 @@ def register():
         user_doc = {
             "email": email,
             "name": name,
-            "password": generate_password_hash(password),
+            "password": hash_password(password),
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
@@ -236,6 +196,9 @@ def register():
             }
         }), 201
 
+    except HashingBusy as e:
+        return hashing_busy_response(e)
+
     except DuplicateKeyError as e:
         if "email" in str(e):
             return jsonify({"error": "Email already exists"}), 400
@@ -249,7 +212,7 @@ def register():
 
 
 @auth_bp.route("/login", methods=["POST"])
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute', exact=True)
 def login():
     try:
         data = request.get_json() or {}
@@ -259,6 +222,14 @@ def login():
         if not all([identifier, password]):
             return jsonify({"error": "Email and password are required"}), 400
 
+        # Throttle before any Mongo lookup or hash comparison
+        client_ip = request.remote_addr or "unknown"
+        retry_after = login_retry_after(identifier, client_ip)
+        if retry_after:
+            response = jsonify({"error": "Too many failed login attempts, try again later"})
+            response.headers["Retry-After"] = str(retry_after)
+            return response, 429
+
         db = get_db()
 
         query = {"is_active": True}
@@ -268,22 +239,15 @@ def login():
             query["name"] = identifier
 
         user = db.users.find_one(query)
-        if not user or not user.get("password") or not check_password_hash(user["password"], password):
+        if not user or not user.get("password") or not verify_password(user["password"], password):
+            record_login_failure(identifier, client_ip)
             return jsonify({"error": "Invalid email or password"}), 401
 
-        # Create tokens
-        access_token = create_jwt({"user_id": str(user["_id"]), "email": user["email"]}, expires_in_seconds=900)
-        refresh_token = str(uuid.uuid4())
-
-        # persist refresh token in DB
-        store_refresh_token_in_db(refresh_token, user["_id"])
+        clear_login_failures(identifier)
 
-        # Optionally store session in redis: (keeps track of active sessions)
-        try:
-            if redis_client:
-                redis_client.setex(f"user_session:{user['_id']}", 7 * 24 * 3600, refresh_token)
-        except Exception:
-            logger.exception("Redis session write failed")
+        # Create tokens; the refresh family is registered as this device's session
+        refresh_token, session_id = issue_refresh_token(user["_id"], device=client_device(), ip=client_ip)
+        access_token = create_jwt(access_token_claims(user, session_id=session_id), expires_in_seconds=900)
 
         logger.info(f"User logged in: {identifier}")
         response = jsonify({
@@ -299,6 +263,12 @@ def login():
         set_refresh_cookie(response, refresh_token)
         return response, 200
 
+    except HashingBusy as e:
+        return hashing_busy_response(e)
+
+    except RefreshStoreUnavailable:
+        return refresh_store_unavailable_response()
+
     except Exception:
         logger.exception("Login error")
         return jsonify({"error": "Login failed"}), 500
@@ -311,29 +281,28 @@ def refresh():
         if not refresh_token:
             return jsonify({"error": "Missing refresh token"}), 401
 
-        db = get_db()
-        stored = db.refresh_tokens.find_one({"token": refresh_token})
-        if not stored:
-            return jsonify({"error": "Invalid refresh token"}), 401
-
-        if stored.get("revoked"):
-            return jsonify({"error": "Refresh token revoked"}), 401
-
-        if stored.get("expires_at") < datetime.utcnow():
-            db.refresh_tokens.delete_one({"token": refresh_token})
-            return jsonify({"error": "Refresh token expired"}), 401
-
-        user = db.users.find_one({"_id": ObjectId(stored["user_id"]), "is_active": True})
+        # Rotate refresh token (invalidate old, issue new) in a single redis round trip.
+        # Expired tokens are gone via their redis TTL; replaying a rotated token revokes its family.
+        try:
+            rotated = rotate_refresh_token(refresh_token)
+        except RefreshTokenReuse as e:
+            logger.warning(f"Refresh token reuse detected for user {e.user_id}; family {e.family} revoked")
+            response = jsonify({"error": "Refresh token revoked"})
+            clear_refresh_cookie(response)
+            return response, 401
+        if not rotated:
+            return jsonify({"error": "Invalid or expired refresh token"}), 401
+        new_refresh, user_id, session_id, token_version = rotated
+
+        user = get_cached_user(user_id)
         if not user:
+            revoke_refresh_token(new_refresh, reason="user_inactive")
             return jsonify({"error": "User not found"}), 404
 
-        # Rotate refresh token (invalidate old, issue new)
-        new_refresh = rotate_refresh_token(refresh_token)
-        if not new_refresh:
-            return jsonify({"error": "Refresh token rotation failed"}), 401
-
         # Issue a new short-lived access token
-        access_token = create_jwt({"user_id": str(user["_id"]), "email": user["email"]}, expires_in_seconds=900)
+        access_token = create_jwt(
+            access_token_claims(user, token_version, session_id=session_id), expires_in_seconds=900
+        )
 
         # Blacklist old access token if client sent it (optional)
         # If client sends old access token in Authorization header, mark its jti as revoked
@@ -350,6 +319,9 @@ def refresh():
         set_refresh_cookie(response, new_refresh)
         return response, 200
 
+    except RefreshStoreUnavailable:
+        return refresh_store_unavailable_response()
+
     except Exception:
         logger.exception("Refresh token error")
         return jsonify({"error": "Failed to refresh token"}), 500
@@ -357,12 +329,20 @@ def refresh():
 
 @auth_bp.route("/logout", methods=["POST"])
 def logout():
+    """
+    Log out this device: its refresh session and access token are revoked.
+    Body { "all_devices": true } logs out every session of the user instead.
+    """
     try:
+        all_devices = bool((request.get_json(silent=True) or {}).get("all_devices"))
         # Prefer cookie-based logout: read refresh token from cookie
         refresh_token = request.cookies.get("refresh_token")
 
         if refresh_token:
-            revoke_refresh_token(refresh_token, reason="user_logout")
+            try:
+                revoke_refresh_token(refresh_token, reason="user_logout")
+            except RefreshStoreUnavailable:
+                logger.warning("Refresh store unavailable during logout; token left to expire")
 
         # If client provided Authorization header, blacklist access token jti
         auth_header = request.headers.get("Authorization", "")
@@ -373,6 +353,20 @@ def logout():
                 exp = payload.get("exp")
                 ttl = int(exp - datetime.utcnow().timestamp()) if exp else 60
                 blacklist_access_token(payload.get("jti"), expires_in_seconds=max(ttl, 60))
+            if payload and payload.get("user_id") and all_devices:
+                bump_token_version(payload["user_id"])
+                try:
+                    revoke_user_refresh_tokens(payload["user_id"], reason="user_logout_all")
+                except RefreshStoreUnavailable:
+                    logger.warning("Refresh store unavailable during logout; sessions left to expire")
+            elif payload and payload.get("user_id"):
+                # the refresh cookie is scoped to /refresh, so end the session named in the token too
+                if payload.get("sid"):
+                    bump_token_version(payload["user_id"], payload["sid"])
+                    try:
+                        revoke_refresh_family(payload["user_id"], payload["sid"], reason="user_logout")
+                    except RefreshStoreUnavailable:
+                        logger.warning("Refresh store unavailable during logout; session left to expire")
 
         response = jsonify({"message": "Logged out successfully"})
         clear_refresh_cookie(response)
@@ -460,20 +454,26 @@ def reset_password():
         if not is_valid_password:
             return jsonify({"error": password_message}), 400
 
-        result = db.users.update_one(
+        user = db.users.find_one_and_update(
             {"email": email},
             {
                 "$set": {
-                    "password": generate_password_hash(new_password),
+                    "password": hash_password(new_password),
                     "updated_at": datetime.utcnow()
                 }
-            }
+            },
+            projection={"_id": 1}
         )
 
-        if result.matched_count == 0:
+        if not user:
             return jsonify({"error": "User not found"}), 404
 
-        db.refresh_tokens.delete_many({"user_id": str(result.upserted_id)})
+        invalidate_user(user["_id"])
+        bump_token_version(user["_id"])
+        try:
+            revoke_user_refresh_tokens(user["_id"])
+        except RefreshStoreUnavailable:
+            logger.error(f"Could not revoke refresh tokens after password reset for {user['_id']}")
 
         db.used_tokens.insert_one({
             "token": token,
@@ -483,6 +483,9 @@ def reset_password():
 
         return jsonify({"message": "Password reset successful"}), 200
 
+    except HashingBusy as e:
+        return hashing_busy_response(e)
+
     except Exception as e:
         logger.exception("Reset password error")
         return jsonify({"error": "Password reset failed"}), 500
@@ -500,8 +503,40 @@ def get_current_user():
     })
 
 
+@auth_bp.route("/sessions", methods=["GET"])
+@token_required
+def get_sessions():
+    """Active sessions (one per login/device) of the current user."""
+    current_sid = (g.get("token_payload") or {}).get("sid")
+    sessions = list_sessions(g.current_user["_id"])
+    for session in sessions:
+        session["current"] = session["session_id"] == current_sid
+    return jsonify({"sessions": sessions, "count": len(sessions)}), 200
+
+
+@auth_bp.route("/sessions/<session_id>", methods=["DELETE"])
+@token_required
+def revoke_session(session_id):
+    """
+    Log out one device: its refresh family is revoked and its session's token version bumped,
+    so access tokens already issued to it stop working too (as on logout).
+    """
+    try:
+        revoked = revoke_refresh_family(g.current_user["_id"], session_id)
+    except RefreshStoreUnavailable:
+        return refresh_store_unavailable_response()
+    if not revoked:
+        return jsonify({"error": "Session not found"}), 404
+    bump_token_version(g.current_user["_id"], session_id)
+
+    response = jsonify({"message": "Session revoked"})
+    if session_id == (g.get("token_payload") or {}).get("sid"):
+        clear_refresh_cookie(response)
+    return response, 200
+
+
 @auth_bp.route("/google", methods=["GET"])
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute', exact=True)
 def google_auth_url():
     client_id = current_app.config["GOOGLE_CLIENT_ID"]
     redirect_uri = f"{current_app.config['BACKEND_URL']}/api/auth/google/callback"
@@ -590,13 +625,10 @@ def google_callback():
         user = db.users.find_one({"_id": result.inserted_id})
 
     # Generate our JWT + refresh token
-    access_token = create_jwt(
-        {"user_id": str(user["_id"]), "email": user["email"]},
-        expires_in_seconds=900
+    refresh_token, session_id = issue_refresh_token(
+        user["_id"], device=client_device(), ip=request.remote_addr
     )
-    refresh_token = str(uuid.uuid4())
-
-    store_refresh_token_in_db(refresh_token, user["_id"])
+    access_token = create_jwt(access_token_claims(user, session_id=session_id), expires_in_seconds=900)
 
     frontend_redirect = (
         f"{current_app.config['FRONTEND_URL']}/auth/callback?access={access_token}&refresh={refresh_token}"
@@ -616,7 +648,7 @@ def google_callback():
     return resp
 
 @auth_bp.route("/send-verification", methods=["POST"])
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute', exact=True)
 @token_required
 def send_verification():
     try:
@@ -670,14 +702,17 @@ def verify_email(token):
             return jsonify({"error": "Invalid or expired token"}), 400
 
         db = get_db()
-        result = db.users.update_one(
-            {"email": email},
-            {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}}
+        user = db.users.find_one_and_update(
+            {"email": email, "is_verified": {"$ne": True}},
+            {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}},
+            projection={"_id": 1}
         )
 
-        if result.modified_count == 0:
+        if not user:
             return jsonify({"error": "User not found"}), 404
 
+        invalidate_user(user["_id"])
+
         return jsonify({"message": "Email verified successfully"}), 200
 
     except Exception as e:
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app, g
 from backend.middleware.auth import token_required
 from bson import ObjectId
 from datetime import datetime
+from backend.models.exam import invalidate_exam
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -58,7 +59,10 @@ def disable_exam(exam_id):
     if not require_admin(): return jsonify({'error': 'Forbidden'}), 403
     try:
         db = current_app.mongo.db
-        db.exams.update_one({'_id': ObjectId(exam_id)}, {'$set': {'status': 'disabled', 'updated_at': datetime.utcnow()}})
+        exam = db.exams.find_one_and_update(
+            {'_id': ObjectId(exam_id)}, {'$set': {'status': 'disabled', 'updated_at': datetime.utcnow()}}, {'code': 1}
+        )
+        invalidate_exam(exam_id, exam.get('code') if exam else None)
         return jsonify({'message': 'Exam disabled'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,15 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app, g 
 from backend.middleware.auth import token_required
-from backend.extensions import mongo, limiter
+from backend.extensions import mongo
+from backend.middleware.rate_limit import rate_limit
 from backend.models.answer import answer_doc
 from bson import ObjectId
 from backend.utils.background import grade_exam_task
+from backend.utils.answer_buffer import merge_pending
 
 exam_answer_bp = Blueprint('exam_answer', __name__, url_prefix='/api/exam/answer')
 
 @exam_answer_bp.route('/submit/', methods=['POST'])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def submit_answer():
     """
     Body: { exam_id, question_id, answer_text }
@@ -41,6 +43,15 @@ def submit_answer():
         return jsonify({'error': str(e)}), 500
 
 
+def _stringify_answer(answer, session=None):
+    # answers saved through /api/exam_take/answer carry no exam_id/user_id; fill them from the session
+    if session is not None:
+        answer.setdefault('exam_id', session['exam_id'])
+        answer.setdefault('user_id', session['user_id'])
+    for key in ('_id', 'session_id', 'question_id', 'exam_id', 'user_id'):
+        answer[key] = str(answer[key]) if answer.get(key) is not None else None
+
+
 @exam_answer_bp.route('/<session_id>', methods=['GET'])
 @token_required
 def get_session_answers(session_id):
@@ -48,7 +59,7 @@ def get_session_answers(session_id):
     Fetch all answers for a session (for review).
     """
     try:
-        db = mongo.db
+        db = current_app.mongo.db
         # Verify session ownership or permission
         session = db.exam_sessions.find_one({'_id': ObjectId(session_id)})
         if not session:
@@ -65,12 +76,10 @@ def get_session_answers(session_id):
                  return jsonify({'error': 'Forbidden'}), 403
 
         answers = list(db.exam_answers.find({'session_id': ObjectId(session_id)}))
+        # overlay autosaves still in the write-behind buffer
+        merge_pending(session_id, answers)
         for a in answers:
-            a['_id'] = str(a['_id'])
-            a['session_id'] = str(a['session_id'])
-            a['question_id'] = str(a['question_id'])
-            a['exam_id'] = str(a['exam_id'])
-            a['user_id'] = str(a['user_id'])
+            _stringify_answer(a, session)
             
         return jsonify({'answers': answers}), 200
     except Exception as e:
@@ -85,24 +94,22 @@ def get_single_answer(session_id, question_id):
     Fetch single answer.
     """
     try:
-        db = mongo.db
+        db = current_app.mongo.db
         answer = db.exam_answers.find_one({
             'session_id': ObjectId(session_id),
             'question_id': ObjectId(question_id)
         })
+        buffered = merge_pending(session_id, [answer] if answer else [])
+        answer = next((a for a in buffered if str(a['question_id']) == question_id), None)
         
         if not answer:
             return jsonify({'error': 'Answer not found'}), 404
             
         # Permission check (same as above, simplified)
-        if str(answer['user_id']) != str(g.current_user['_id']):
+        if str(answer.get('user_id')) != str(g.current_user['_id']):
              pass 
 
-        answer['_id'] = str(answer['_id'])
-        answer['session_id'] = str(answer['session_id'])
-        answer['question_id'] = str(answer['question_id'])
-        answer['exam_id'] = str(answer['exam_id'])
-        answer['user_id'] = str(answer['user_id'])
+        _stringify_answer(answer)
         
         return jsonify(answer), 200
     except Exception as e:
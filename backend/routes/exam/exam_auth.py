@@ -3,16 +3,18 @@ from backend.utils.exam_validation import sanitize_student_id, is_valid_objectid
 from bson import ObjectId
 from datetime import datetime
 from backend.middleware.auth import token_required
-from backend.extensions import mongo, limiter
+from backend.extensions import mongo
+from backend.middleware.rate_limit import rate_limit
 from backend.models.exam_registration import registration_doc
 from backend.utils.mailer import send_email
+from backend.utils.user_cache import invalidate_user
 
 
 exam_auth_bp = Blueprint("exam_auth", __name__, url_prefix="/api/exam/auth")
 
 @exam_auth_bp.route("/register", methods=["POST"])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def register_for_exam():
     """
     Registers the current user for an exam.
@@ -44,6 +46,7 @@ def register_for_exam():
                     break
 
             users.update_one({"_id": user_id}, {"$set": {"student_id": student_id}})
+            invalidate_user(user_id)
             current_app.logger.info(f"Assigned new student_id {student_id} to user {user_id}")
 
         # --- Validate format ---
@@ -90,7 +93,7 @@ def register_for_exam():
     
 @exam_auth_bp.route("/registred", methods=["GET"])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def get_registered_exams():
     # return list of registration for current users
     try:
@@ -114,7 +117,7 @@ def get_registered_exams():
         
 @exam_auth_bp.route("/create-student-id", methods=["POST"])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def create_student_id():
     """
     Allows a logged-in user to create (or retrieve) their student_id.
@@ -140,6 +143,7 @@ def create_student_id():
 
         # update user profile
         users.update_one({"_id": user_id}, {"$set": {"student_id": student_id}})
+        invalidate_user(user_id)
 
         return jsonify({
             "message": "Student ID created successfully",
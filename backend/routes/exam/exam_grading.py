@@ -1,17 +1,24 @@
-from flask import Blueprint, request, jsonify, current_app, g
+from flask import Blueprint, Response, request, jsonify, current_app, g, stream_with_context
 from backend.middleware.auth import token_required
-from backend.utils.background import grade_exam_task
-from backend.extensions import mongo, limiter
+from backend.utils.background import dispatch_grading
+from backend.utils.grading_jobs import start_job, find_job, job_progress
+from backend.extensions import mongo, socketio
+from backend.middleware.rate_limit import rate_limit
 from bson import ObjectId
 from datetime import datetime
+import json
 
 exam_grading_bp = Blueprint('exam_grading', __name__, url_prefix='/api/exam_grading')
 
 @exam_grading_bp.route('/trigger/<exam_id>', methods=['POST'])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def trigger_grading(exam_id):
-    """Manually trigger background grading. """
+    """
+    Manually trigger background grading. Returns the grading job (202); an unfinished job for
+    the exam is returned instead of starting another, a failed one resumes where it stopped.
+    Poll /jobs/<job_id> or stream /jobs/<job_id>/stream for progress.
+    """
     try:
         db = current_app.mongo.db 
         exam = db.exams.find_one({'_id': ObjectId(exam_id)})
@@ -20,15 +27,84 @@ def trigger_grading(exam_id):
         if str(g.current_user['_id']) not in [str(exam['owner_id'])] + [str(x) for x in exam.get('invited_examiners', [])]:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        grade_exam_task.delay(str(exam_id))
-        return jsonify({'message': 'Grading started'}), 200
+        job, dispatch = start_job(db, exam['_id'], created_by=g.current_user['_id'])
+        if dispatch:
+            try:
+                dispatch_grading(job)
+            except Exception:
+                # eager mode runs the chunks inline; the failure is recorded on the job
+                current_app.logger.exception('Grading job failed')
+                return jsonify({'error': 'Grading failed', 'job': job_progress(find_job(db, job['_id']) or job)}), 500
+            job = find_job(db, job['_id']) or job
+        return jsonify({
+            'message': 'Grading started' if dispatch else 'Grading already in progress',
+            'job': job_progress(job),
+        }), 202
     except Exception as e:
         current_app.logger.exception('Trigger grading error')
         return jsonify({'error': str(e)}), 500
     
+def _job_for_user(db, job_id):
+    """(job, error response) for a grading job of an exam the caller may grade."""
+    job = find_job(db, job_id)
+    if not job:
+        return None, (jsonify({'error': 'Grading job not found'}), 404)
+    exam = db.exams.find_one({'_id': job['exam_id']}, {'owner_id': 1, 'invited_examiners': 1})
+    if not exam or str(g.current_user['_id']) not in [str(exam['owner_id'])] + [str(x) for x in exam.get('invited_examiners', [])]:
+        return None, (jsonify({'error': 'Unauthorized'}), 403)
+    return job, None
+
+
+@exam_grading_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def grading_job_status(job_id):
+    """Progress of a grading job: status, percent, graded/total sessions."""
+    try:
+        job, error = _job_for_user(current_app.mongo.db, job_id)
+        if error:
+            return error
+        return jsonify(job_progress(job)), 200
+    except Exception as e:
+        current_app.logger.exception('Grading job status error')
+        return jsonify({'error': str(e)}), 500
+
+
+@exam_grading_bp.route('/jobs/<job_id>/stream', methods=['GET'])
+@token_required
+def grading_job_stream(job_id):
+    """
+    Server-sent events: a `progress` event whenever the job's progress changes, ending with
+    the final state once it is completed, failed or superseded.
+    """
+    db = current_app.mongo.db
+    job, error = _job_for_user(db, job_id)
+    if error:
+        return error
+    interval = current_app.config.get('GRADING_STREAM_POLL_SECONDS', 1)
+
+    def events():
+        last = None
+        current = job
+        while current:
+            progress = job_progress(current)
+            if progress != last:
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+                last = progress
+            if progress['status'] in ('completed', 'failed', 'superseded'):
+                return
+            socketio.sleep(interval)
+            current = find_job(db, job_id)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @exam_grading_bp.route('/manual/<exam_id>/<student_id>', methods=['POST'])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def manual_grade(exam_id, student_id):
     """
     Body: [{ question_id, score, comment? }, ... ]
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify, current_app, g, url_for
 from backend.middleware.auth import token_required
-from backend.extensions import mongo, limiter
+from backend.extensions import mongo
+from backend.middleware.rate_limit import rate_limit
 from bson import ObjectId
 from datetime import datetime, timedelta
 from backend.utils.mailer import send_email  # your Brevo sender
+from backend.models.exam import invalidate_exam
 from backend.routes.exam.exam_manage import add_questions
 from backend.utils.exam_invite_helper import now_utc, make_token, log_exam_action, ensure_exam_and_owner, permission_defaults_for_role
 
@@ -46,7 +48,7 @@ def search_user_by_email():
 # --- INVITE EXAMINERS ---
 @exam_invite_bp.route('/<exam_id>', methods=['POST'])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def invite_examiner(exam_id):
     """
     Body: { "examiner_emails": ["john@example.com", "jane@example.com"] }
@@ -89,6 +91,7 @@ def invite_examiner(exam_id):
                 {"_id": exam["_id"]},
                 {"$addToSet": {"invited_examiners": invite_data}}
             )
+            invalidate_exam(exam["_id"])
             invited_list.append(user["email"])
 
             # Send email notification via Brevo
@@ -122,7 +125,7 @@ def invite_examiner(exam_id):
 
 @exam_invite_bp.route("/<exam_id>/create", methods=['POST'])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def create_invite_link(exam_id):
     """
     Body:
@@ -279,6 +282,7 @@ def accept_invite(token):
             {"_id": ObjectId(exam_id)},
             {"$addToSet": {"examiners": examiner_entry}}
         )
+        invalidate_exam(exam_id)
         
         # mark invite accepted
         db.invites.update_one(
@@ -373,6 +377,7 @@ def remove_examiner(exam_id):
             {'_id': ObjectId(exam_id)},
             {'$pull': {'examiners': {'_id': ObjectId(target_id)}}}
         )
+        invalidate_exam(exam_id)
         
         db.invites.update_many(
             {'exam_id': ObjectId(exam_id), 'user_id': ObjectId(target_id)},
@@ -440,6 +445,7 @@ def update_examiner_permissions(exam_id):
             {'_id': ObjectId(exam_id), 'examiners._id': ObjectId(examiner_id)},
             {'$set': {'examiners.$.permissions': new_perms, **({'examiners.$.role': new_role} if new_role else {})}}
         )
+        invalidate_exam(exam_id)
         
         log_exam_action(exam_id, 'examiner_permissions_updated', actor_id, {'examiner_id': examiner_id, 'permissions': new_perms, 'role': new_role})
         
@@ -535,7 +541,7 @@ def list_examiners_and_invite(exam_id):
         
 @exam_invite_bp.route('/<exam_id>/invite/regenerate', methods=['POST'])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def regenerate_invite(exam_id):
     """
     Regenerate an invite for a specific email or invite_id.
@@ -1,11 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app, g 
 from backend.utils.exam_validation import validate_exam_payload, validate_question_payload
-from backend.models.exam import exam_doc
-from backend.models.question import question_doc
-from backend.extensions import limiter
+from backend.models.exam import exam_doc, find_exam, invalidate_exam
+from backend.models.question import question_doc, hash_answer, encrypt_answer
+from backend.middleware.rate_limit import rate_limit
 from datetime import datetime 
 from bson import ObjectId
 from backend.middleware.auth import token_required
+from backend.utils.question_cache import invalidate_exam_questions
+from backend.utils.exam_paper import compile_paper
+from backend.utils.grading_keys import get_grading_keys, invalidate_grading_keys
 from backend import mongo
 
 exam_manage_bp = Blueprint("exam_manage", __name__, url_prefix="/api/exam/manage")
@@ -14,6 +17,25 @@ def require_exam_owner(exam):
     return str(exam.get("owner_id")) == str(g.current_user["_id"])
 
 
+def refresh_exam_questions(db, exam_id):
+    """
+    Call after any change to an exam's questions (with updated_at already bumped): drops this
+    worker's question index and grading keys and the exam lookups shared across workers and,
+    for a published exam, recompiles the delivered paper.
+    """
+    invalidate_exam_questions(exam_id)
+    invalidate_grading_keys(exam_id)
+    exam = db.exams.find_one({"_id": exam_id})
+    invalidate_exam(exam_id, exam.get("code") if exam else None)
+    if not exam or exam.get("status") != "published":
+        return
+    try:
+        compile_paper(db, exam)
+    except Exception:
+        # get_questions compiles on demand if this fails
+        current_app.logger.exception("Exam paper compile failed")
+
+
 @exam_manage_bp.route("/list", methods=["GET"])
 @token_required
 def list_exams():
@@ -32,7 +54,7 @@ def list_exams():
 
 @exam_manage_bp.route("/create", methods=["POST"])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def create_exam():
     """
     body: {title, description, start_time, endtime, duration, code, settings}
@@ -67,7 +89,7 @@ def create_exam():
     
 @exam_manage_bp.route("/<exam_id>/publish", methods=["POST"])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def publish_exam(exam_id):
     try:
         db = current_app.mongo.db
@@ -77,7 +99,13 @@ def publish_exam(exam_id):
         if not require_exam_owner(exam):
             return jsonify({"error": "Forbidden"}), 403
         
-        db.exams.update_one({"_id": exam["_id"]}, {"$set": {"status": "published", "updated_at": datetime.utcnow()}})
+        # question_count is drift-corrected here; sessions read the total from the question index
+        question_count = db.exam_questions.count_documents({"exam_id": exam["_id"]})
+        db.exams.update_one(
+            {"_id": exam["_id"]},
+            {"$set": {"status": "published", "question_count": question_count, "updated_at": datetime.utcnow()}}
+        )
+        refresh_exam_questions(db, exam["_id"])
         return jsonify({"message": "Exam published"}), 200
     except Exception as e:
         current_app.logger.exception("Published exam error")
@@ -113,11 +141,11 @@ def get_exam_questions(exam_id):
         
         # Fetch all questions
         questions = list(db.exam_questions.find({"exam_id": ObjectId(exam_id)}))
-        
-        # Format questions (prompt and options are stored as plain text, not encrypted)
 
-        from backend.utils.security import decrypt_answer
+        # answer keys come decrypted from the per-exam grading key cache
+        keys = get_grading_keys(db, exam)
 
+        # Format questions (prompt and options are stored as plain text, not encrypted)
         formatted_questions = []
         
         for q in questions:
@@ -135,19 +163,9 @@ def get_exam_questions(exam_id):
                 "allow_partial": q.get("allow_partial", False),
             }
             
-            # Decrypt correct answer for examiners (answer_key_encrypted is the encrypted field)
-
-            if q.get("answer_key_encrypted"):
-
-                try:
-
-                    formatted_q["correct_answer"] = decrypt_answer(q["answer_key_encrypted"])
-
-                except Exception as e:
-
-                    current_app.logger.warning(f"Failed to decrypt answer for question {q['_id']}: {e}")
-
-                    formatted_q["correct_answer"] = None
+            key = keys.get(q["_id"])
+            if key is not None:
+                formatted_q["correct_answer"] = key.answer
 
             formatted_questions.append(formatted_q)
         
@@ -160,7 +178,7 @@ def get_exam_questions(exam_id):
 
 @exam_manage_bp.route("/<exam_id>/questions", methods=["POST"])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def add_questions(exam_id):
     """
     Add multiple questions in one request.
@@ -228,6 +246,7 @@ def add_questions(exam_id):
                 {"_id": exam["_id"]},
                 {"$inc": {"question_count": len(inserted_ids)}, "$set": {"updated_at": datetime.utcnow()}}
             )
+            refresh_exam_questions(db, exam["_id"])
 
         return jsonify({
             "message": "Bulk question upload completed",
@@ -240,7 +259,7 @@ def add_questions(exam_id):
 
 @exam_manage_bp.route("/<exam_id>/update", methods=["PUT"])
 @token_required
-@limiter.limit("10 per minute")
+@rate_limit("10 per minute")
 def update_exam(exam_id):
     """
     Update an exam. only allowed for the owner.
@@ -292,6 +311,7 @@ def update_exam(exam_id):
             
         update_fields["updated_at"] = datetime.utcnow()
         db.exams.update_one({"_id": exam["_id"]}, {"$set": update_fields})
+        invalidate_exam(exam["_id"], exam.get("code"), update_fields.get("code"))
         
         return jsonify({"message": "Exam updated successfully"}), 200
         
@@ -303,7 +323,7 @@ def update_exam(exam_id):
     
 @exam_manage_bp.route("/<exam_id>/delete", methods=["DELETE"])
 @token_required
-@limiter.limit("10 per minute")
+@rate_limit("10 per minute")
 def delete_exam(exam_id):
     """
     Delete an exam and all its associated questions.
@@ -322,6 +342,9 @@ def delete_exam(exam_id):
         db.exam_questions.delete_many({"exam_id": exam["_id"]})
         
         db.exams.delete_one({"_id": exam['_id']})
+        invalidate_exam(exam["_id"], exam.get("code"))
+        invalidate_exam_questions(exam["_id"])
+        invalidate_grading_keys(exam["_id"])
         
         return jsonify({"message": "Exam deleted successsufully"}), 200
     
@@ -337,8 +360,7 @@ def get_exam_details(exam_id):
     Fetch full exam info (for editors/owners).
     """
     try:
-        db = current_app.mongo.db
-        exam = db.exams.find_one({"_id": ObjectId(exam_id)})
+        exam = find_exam(exam_id)
         if not exam:
             return jsonify({"error": "Exam not found"}), 404
         
@@ -367,7 +389,7 @@ def get_exam_details(exam_id):
 
 @exam_manage_bp.route("/<exam_id>/settings", methods=["PUT"])
 @token_required
-@limiter.limit("10 per minute")
+@rate_limit("10 per minute")
 def update_exam_settings(exam_id):
     """
     Update specific settings (time, shuffle, retake, etc.)
@@ -392,6 +414,7 @@ def update_exam_settings(exam_id):
             {"_id": exam["_id"]},
             {"$set": {"settings": settings, "updated_at": datetime.utcnow()}}
         )
+        invalidate_exam(exam["_id"], exam.get("code"))
         return jsonify({"message": "Settings updated"}), 200
     except Exception as e:
         current_app.logger.exception("Update settings error")
@@ -400,7 +423,7 @@ def update_exam_settings(exam_id):
 
 @exam_manage_bp.route("/<exam_id>/questions/<qid>", methods=["PUT"])
 @token_required
-@limiter.limit("10 per minute")
+@rate_limit("10 per minute")
 def update_question(exam_id, qid):
     """
     Update a specific question.
@@ -421,7 +444,17 @@ def update_question(exam_id, qid):
         update_fields = {}
         if "prompt" in data: update_fields["prompt"] = data["prompt"]
         if "options" in data: update_fields["options"] = data["options"]
-        if "answer_key" in data: update_fields["answer_key"] = data["answer_key"]
+        if "answer_key" in data:
+            # stored like question_doc does: hash(es) for verification, ciphertext for grading
+            answer_key = data["answer_key"]
+            if answer_key is None:
+                update_fields["answer_key_hash"] = None
+                update_fields["answer_key_encrypted"] = None
+            else:
+                update_fields["answer_key_hash"] = (
+                    [hash_answer(a) for a in answer_key] if isinstance(answer_key, list) else hash_answer(answer_key)
+                )
+                update_fields["answer_key_encrypted"] = encrypt_answer(answer_key)
         if "points" in data: update_fields["points"] = int(data["points"])
         if "media" in data: update_fields["media"] = data["media"]
         if "type" in data: update_fields["type"] = data["type"]
@@ -429,14 +462,22 @@ def update_question(exam_id, qid):
         if not update_fields:
             return jsonify({"error": "No fields to update"}), 400
 
+        update = {"$set": update_fields}
+        if "answer_key" in data:
+            # questions from before encryption kept the key in plaintext next to the new fields
+            update["$unset"] = {"answer_key": ""}
         result = db.exam_questions.update_one(
             {"_id": ObjectId(qid), "exam_id": ObjectId(exam_id)},
-            {"$set": update_fields}
+            update
         )
         
         if result.matched_count == 0:
             return jsonify({"error": "Question not found"}), 404
 
+        # updated_at is the question cache version other workers compare against
+        db.exams.update_one({"_id": exam["_id"]}, {"$set": {"updated_at": datetime.utcnow()}})
+        refresh_exam_questions(db, exam["_id"])
+
         return jsonify({"message": "Question updated"}), 200
     except Exception as e:
         current_app.logger.exception("Update question error")
@@ -445,7 +486,7 @@ def update_question(exam_id, qid):
 
 @exam_manage_bp.route("/<exam_id>/questions/<qid>", methods=["DELETE"])
 @token_required
-@limiter.limit("10 per minute")
+@rate_limit("10 per minute")
 def delete_question(exam_id, qid):
     """
     Remove a specific question.
@@ -469,6 +510,7 @@ def delete_question(exam_id, qid):
             {"_id": exam["_id"]},
             {"$inc": {"question_count": -1}, "$set": {"updated_at": datetime.utcnow()}}
         )
+        refresh_exam_questions(db, exam["_id"])
 
         return jsonify({"message": "Question deleted"}), 200
     except Exception as e:
@@ -478,7 +520,7 @@ def delete_question(exam_id, qid):
 
 @exam_manage_bp.route("/<exam_id>/clone", methods=["POST"])
 @token_required
-@limiter.limit("5 per minute")
+@rate_limit("5 per minute")
 def clone_exam(exam_id):
     """
     Duplicate exam and its questions.
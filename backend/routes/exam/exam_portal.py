@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app, g
 from backend.middleware.auth import token_required
 from bson import ObjectId
 from datetime import datetime
+from backend.utils.exam_presence import live_sessions, presence_summary, student_names
 
 exam_portal_bp = Blueprint('exam_portal', __name__, url_prefix='/api/exam/portal/')
 
@@ -89,6 +90,25 @@ def proctor_dashboard(exam_id):
         if str(g.current_user['_id']) not in [str(exam['owner_id'])] + [str(x) for x in exam.get('invited_examiners', [])]:
             return jsonify({'error': 'Unauthorized'}), 403
 
+        # heartbeat presence from redis; without it, fall back to scanning in-progress sessions
+        present = live_sessions(exam_id)
+        if present is not None:
+            names = student_names(db, [p['user_id'] for p in present])
+            active_students = [{
+                'session_id': p['session_id'],
+                'student_name': names.get(p['user_id'], 'Unknown'),
+                'started_at': p['started_at'],
+                'violation_count': p['violation_count'],
+                'last_seen': p['last_seen'],
+                'presence': p['presence'],
+            } for p in present]
+            return jsonify({
+                'exam_title': exam.get('title'),
+                'active_sessions': active_students,
+                'total_active': len(active_students),
+                'presence': presence_summary(present)
+            }), 200
+
         # Fetch active sessions
         sessions = list(db.exam_sessions.find({
             'exam_id': ObjectId(exam_id),
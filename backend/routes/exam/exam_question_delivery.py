@@ -1,5 +1,7 @@
-from flask import Blueprint, jsonify, current_app, g
+from flask import Blueprint, request, jsonify, current_app, g
 from backend.utils.ansers import load_correct_answer
+from backend.utils.question_cache import get_question_index
+from datetime import datetime
 from bson import ObjectId
 from backend.middleware.auth import token_required
 from backend.extensions import mongo, limiter
@@ -52,12 +54,12 @@ def review_session_questions(session_id):
         if not session:
             return jsonify({'error': 'Session not found'}), 404
 
-        questions = list(db.exam_questions.find({'exam_id': session['exam_id']}))
+        questions = get_question_index(db, session['exam_id'])
         
         results = []
-        for q in questions:
+        for q in questions.order:
             results.append({
-                'question_id': str(q['_id']),
+                'question_id': q['question_id'],
                 'type': q['type'],
                 'prompt': q.get('prompt') or q.get('text'),
             })
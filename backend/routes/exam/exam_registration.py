@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app, g
 from backend.middleware.auth import token_required
-from backend.extensions import limiter
+from backend.middleware.rate_limit import rate_limit
+from backend.models.exam import find_published_exam_by_code, invalidate_exam
 from datetime import datetime
 from bson import ObjectId
 
@@ -9,7 +10,7 @@ exam_registration_bp = Blueprint("exam_registration", __name__, url_prefix="/api
 
 @exam_registration_bp.route("", methods=["POST"])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def register_for_exam():
     """
     Register a student for an exam using exam code.
@@ -55,6 +56,7 @@ def register_for_exam():
             {"_id": exam["_id"]},
             {"$inc": {"registered_count": 1}}
         )
+        invalidate_exam(exam["_id"], exam.get("code"))
         
         return jsonify({
             "message": "Successfully registered for exam",
@@ -117,7 +119,7 @@ def list_registrations():
 
 @exam_registration_bp.route("/<registration_id>", methods=["DELETE"])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def unregister_from_exam(registration_id):
     """
     Unregister from an exam.
@@ -151,6 +153,7 @@ def unregister_from_exam(registration_id):
             {"_id": registration["exam_id"]},
             {"$inc": {"registered_count": -1}}
         )
+        invalidate_exam(registration["exam_id"])
         
         return jsonify({"message": "Successfully unregistered"}), 200
         
@@ -169,7 +172,7 @@ def check_exam_by_code(exam_code):
     try:
         db = current_app.mongo.db
         
-        exam = db.exams.find_one({"code": exam_code, "status": "published"})
+        exam = find_published_exam_by_code(exam_code)
         if not exam:
             return jsonify({"error": "Exam not found or not available"}), 404
         
@@ -1,87 +1,24 @@
-from flask_socketio import  disconnect, emit, join_room, leave_room
+from flask_socketio import  disconnect, emit, join_room, leave_room, rooms
 from flask import current_app, request
 import jwt 
 from bson import ObjectId
 from datetime import datetime
-from threading import Lock
 from backend.extensions import socketio
-
-background_tasks = {}
-_bg_lock = Lock()
+from backend.utils import exam_presence
+from backend.utils.proctor_ingest import ingest
+from backend.utils.session_timer import OPEN_STATUSES, schedule_session, sync_payload
 
 # helper: validate token in query param 'token'
 def verify_sw_token(token):
     try:
-        payload = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"]),
+        payload = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
         if not payload.get("user_id") or not payload.get("session_id"):
             return None
         return payload
     except Exception as e:
         current_app.logger.debug(f"WS token verify failed: {e}")
         return None
-    
-def start_session_timer(session_id):
-    sid = str(session_id)
-    with _bg_lock:
-        if sid in background_tasks and not background_tasks[sid]["stop"]:
-            return 
-        ctrl = {"stop": False, "lock": Lock(), "task": None}
-        background_tasks[sid] = ctrl
-        
-        def _task():
-            current_app.logger.info(f"WS timer task started for session {sid}")
-            try:
-                db = current_app.mongo.db
-                while True:
-                    with ctrl["lock"]:
-                        if ctrl["stop"]:
-                            current_app.logger.info(f"WS timer task stopping (request) for {sid}")
-                            
-                    sess = db.exam_sessions.find_one({"_id": ObjectId(sid)})
-                    if not sess:
-                        current_app.logger.info(f"Session {sid} not found; stopping timer")
-                        break
-                    
-                    expire_at = sess.get("expire_at")
-                    if not expire_at:
-                        socketio.sleep(2)
-                        continue
-                    
-                    now = datetime.utcnow()
-                    remaining = int((expire_at - now).total_seconds())
-                    if remaining <= 0:
-                        db.exam_session.update_one(
-                            {"_id": ObjectId(sid), "status": {"$in": ["in_progress", "started"]}},
-                            {"$set": {"status": "expired", "ended_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
-                        )
-                        socketio.emit('time_up', {'session_id': sid, 'ts': datetime.utcnow().isoformat()}, room=sid, namespace='/ws/exam')
-                        current_app.logger.info(f"Session {sid} expired -> emitted time_up")
-                        break 
-                    
-                    socketio.emit('time_update', {'session_id': sid, 'remaining_seconds': remaining, "ts": datetime.utcnow().isoformat()}, room=sid, namespace='/ws/exam/')
-                    
-                    socketio.sleep(1)
-                    
-            except Exception:
-                current_app.logger.exception("Error in session timer background task")
-            finally:
-                with _bg_lock:
-                    background_tasks.pop(sid, None)
-                current_app.logger.info(f"WS timer task finished for session {sid}")
-                
-        ctrl["task"] = socketio.start_background_task(_task)
-        return ctrl
-    
-    
-def _stop_session_timer(session_id):
-    sid = str(session_id)
-    with _bg_lock:
-        ctrl = background_tasks.get(sid)
-        if not ctrl:
-            return 
-        with ctrl["lock"]:
-            ctrl["stop"] = True
-            
+
 # socket handlers
     
 @socketio.on('connect', namespace='/ws/exam')
@@ -111,28 +48,55 @@ def ws_connect():
         return False
 
     join_room(session_id)
-    emit('connected', {'message': 'connected', 'session_id': session_id, 'ts': datetime.utcnow().isoformat()}, room=session_id, namespace='/ws/exam')
+    # the client counts down locally from expire_at_ms, corrected by server_ts (see clock_sync)
+    emit('connected', {'message': 'connected', 'ts': datetime.utcnow().isoformat(), **sync_payload(sess)}, room=session_id, namespace='/ws/exam')
 
-    # start the timer background task for this session (if not running)
-    try:
-        start_session_timer(session_id)
-    except Exception:
-        current_app.logger.exception("Failed to start session timer on connect")
+    if sess.get("status") == "in_progress":
+        exam_presence.join(sess)
+
+    # register the deadline with this worker's scheduler (no-op if already tracked)
+    if sess.get("status") in OPEN_STATUSES:
+        try:
+            schedule_session(session_id, sess.get("expire_at"))
+        except Exception:
+            current_app.logger.exception("Failed to schedule session deadline on connect")
 
 @socketio.on('disconnect', namespace='/ws/exam')
 def ws_disconnect():
-    # attempt to leave all rooms (Socket.IO will manage)
-    # If you want to stop timer when no participants remain, you could check room occupancy (not shown)
+    # the session room is the only room besides the client's own sid
+    for room in rooms():
+        if room != request.sid:
+            exam_presence.leave(room)
     current_app.logger.info(f"WS client disconnected sid={request.sid}")
 
+@socketio.on('clock_sync', namespace='/ws/exam')
+def handle_clock_sync(data):
+    """
+    Clock-sync handshake, answered to the sender only.
+    data: { session_id, client_ts }  (client_ts in epoch ms, echoed back)
+    The client takes offset = server_ts - (client_ts + round_trip / 2).
+    """
+    try:
+        session_id = data.get('session_id')
+        sess = current_app.mongo.db.exam_sessions.find_one({"_id": ObjectId(session_id)}, {"_id": 1, "expire_at": 1})
+        if not sess:
+            return
+        emit('clock_sync', {**sync_payload(sess), 'client_ts': data.get('client_ts')})
+    except Exception:
+        current_app.logger.exception("clock_sync error")
+
 @socketio.on('heartbeat', namespace='/ws/exam')
 def handle_heartbeat(data):
     """
-    Client periodically sends heartbeat to keep connection alive and optionally update ephemeral ping list.
-    data: { session_id, ts }
+    Client periodically sends heartbeat; it refreshes the session's presence (last_seen) for
+    the live proctoring views.
+    data: { session_id, ts, question?, visible? }
     """
     try:
         session_id = data.get('session_id')
+        if str(session_id) not in rooms():
+            return
+        exam_presence.rejoin(current_app.mongo.db, session_id, data)
         emit('heartbeat_ack', {'ts': datetime.utcnow().isoformat()}, room=session_id, namespace='/ws/exam')
     except Exception:
         current_app.logger.exception("heartbeat error")
@@ -145,24 +109,31 @@ def handle_proctor_event(data):
     """
     try:
         session_id = data.get('session_id')
-        evt = {
-            'session_id': ObjectId(session_id),
-            'event_type': data.get('type'),
-            'details': data.get('details', {}),
-            'timestamp': datetime.utcnow()
-        }
-        current_app.mongo.db.proctor_logs.insert_one(evt)
-        # increment violation counter (optional)
-        current_app.mongo.db.exam_sessions.update_one(
-            {"_id": ObjectId(session_id)},
-            {"$inc": {"violation_count": 1}, "$set": {"updated_at": datetime.utcnow()}}
-        )
+        # only the session's own sockets may log against it (they share this worker's buffer)
+        if str(session_id) not in rooms():
+            return
+        # buffered: the log and the violation_count increment are written with the next flush
+        if not ingest(current_app.mongo.db, session_id, data.get('type'), data.get('details', {})):
+            emit('proctor_logged', {'ok': False, 'session_id': session_id, 'retry': True})
+            return
+        exam_presence.record_violation(session_id)
         emit('proctor_logged', {'ok': True, 'session_id': session_id}, room=session_id, namespace='/ws/exam')
     except Exception:
         current_app.logger.exception('WS proctor event error')
         # don't crash the socket
 
 # helper: server-side push helper (callable from routes)
+def push_result_ready(session_id, payload):
+    """
+    Tell the session room its asynchronously graded result is stored.
+    payload example: {'grading_status': 'graded', 'auto_score': 9, 'possible_score': 14}
+    """
+    try:
+        socketio.emit('result_ready', payload, room=str(session_id), namespace='/ws/exam')
+    except Exception:
+        current_app.logger.exception("push_result_ready failed")
+
+
 def push_progress_update(session_id, payload):
     """
     Emit a progress update to all clients in the session room.
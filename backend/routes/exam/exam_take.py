@@ -1,12 +1,23 @@
 from flask import Blueprint, request, jsonify, current_app, g
-from backend.middleware.auth import token_required
+from backend.middleware.auth import token_required, stateless_token_required
 from backend.models.result import result_doc
+from backend.models.exam import find_exam
 from backend.models.question import hash_answer, normalize_answer
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import uuid
 import jwt
-from backend.extensions import limiter
+from backend.middleware.rate_limit import rate_limit, current_user_key
+from backend.utils.question_cache import get_question_index
+from backend.utils.exam_progress import init_progress, record_answers, get_progress, is_answered
+from backend.utils.answer_buffer import write_behind_enabled, buffer_answers, direct_seq
+from backend.utils.exam_paper import get_paper, send_paper
+from backend.utils.batch_grading import grade_submission
+from backend.utils.background import grade_submission_task
+from backend.utils.session_timer import schedule_session, cancel_session
+from backend.utils.exam_presence import join as join_presence, remove_sessions
 
 from backend.routes.exam.exam_socket import push_progress_update
 
@@ -17,7 +28,7 @@ exam_take_bp = Blueprint("exam_take", __name__, url_prefix="/api/exam/take")
 def start_exam(exam_id):
     try:
         db = current_app.mongo.db
-        exam = db.exams.find_one({"_id": ObjectId(exam_id), "status": "published"})
+        exam = find_exam(exam_id, published_only=True)
         if not exam:
             return jsonify({"error": "Exam not available"}), 404
 
@@ -43,6 +54,7 @@ def start_exam(exam_id):
         }
         # insert only once
         db.exam_sessions.insert_one(session)
+        init_progress(str(session["_id"]), get_question_index(db, exam))
 
         res = result_doc(
             exam_id=exam['_id'],
@@ -53,6 +65,10 @@ def start_exam(exam_id):
             graded=False
         )
         db.exam_results.insert_one(res)
+        # the worker's scheduler auto-submits at expire_at, connected or not
+        schedule_session(session["_id"], expire_at)
+        # listed by the live views (as disconnected) until the client's socket connects
+        join_presence(session, connections=0)
 
         # create a short-lived WS token for the client to use when connecting to socket
         ws_payload = {
@@ -77,13 +93,61 @@ def start_exam(exam_id):
         return jsonify({'error': 'Failed to start exam', 'details': str(e)}), 500
 
 
+def normalize_answer_for_type(qtype, raw_answer):
+    """
+    Canonical stored form of an answer for a question type.
+    Returns (answer, error); error is set when the answer can't be stored for that type.
+    A null answer clears the question and is stored as None.
+    """
+    if raw_answer is None:
+        return None, None
+    answer = normalize_answer(raw_answer)
+
+    if qtype == 'mcq':
+        # normalize_answer turns option values into strings; dicts and nested lists stay as they are
+        selections = answer if isinstance(answer, list) else [answer]
+        if not all(isinstance(a, str) for a in selections):
+            return None, 'mcq selections must be option values'
+        if isinstance(answer, list):
+            answer = sorted(answer)
+
+    elif qtype in ('fill_blank', 'text', 'math', 'image_label'):
+        if isinstance(answer, str):
+            answer = answer.strip().lower()
+
+    elif qtype == 'boolean':
+        if isinstance(answer, str):
+            answer = answer.lower() in ['true', '1', 'yes']
+        elif isinstance(answer, (int, float)):
+            answer = bool(answer)
+
+    elif qtype == 'file_upload':
+        if not isinstance(answer, dict) or 'url' not in answer:
+            return None, 'file_upload answer must include url'
+
+    elif qtype == 'match':
+        if isinstance(answer, dict):
+            answer = {k.strip().lower(): v.strip().lower() for k, v in sorted(answer.items())}
+
+    elif qtype == 'code':
+        if isinstance(answer, str):
+            answer = answer.strip()
+
+    return answer, None
+
+
 @exam_take_bp.route('/answer', methods=['POST'])
-@token_required
+@stateless_token_required
+# autosave fires on every change; keyed per student, counted locally (no redis hit per save)
+@rate_limit('120 per minute', key_func=current_user_key)
 def save_answer():
     """
     Saves one or multiple answers.
     Body (single): { session_id, question_id, answer }
     Body (bulk): { session_id, answers: [{ question_id, answer }, ...] }
+    The whole batch is validated first and written with one unordered bulk_write, or appended
+    to the redis answer stream when EXAM_ANSWER_WRITE_BEHIND is on;
+    `results` reports the outcome of every item in request order.
     """
     try:
         data = request.get_json() or {}
@@ -91,6 +155,20 @@ def save_answer():
         if not session_id:
             return jsonify({'error': 'session_id required'}), 400
 
+        # Normalize for both single and multiple answers
+        if 'answers' in data:
+            answers_input = data['answers']
+            if not isinstance(answers_input, list):
+                return jsonify({'error': 'answers must be a list'}), 400
+        elif 'question_id' in data:
+            answers_input = [{'question_id': data['question_id'], 'answer': data.get('answer')}]
+        else:
+            return jsonify({'error': 'No answers provided'}), 400
+
+        max_batch = current_app.config.get('EXAM_ANSWER_BATCH_MAX', 200)
+        if len(answers_input) > max_batch:
+            return jsonify({'error': f'At most {max_batch} answers per request'}), 400
+
         db = current_app.mongo.db
         session = db.exam_sessions.find_one(
             {'_id': ObjectId(session_id), 'user_id': ObjectId(g.current_user['_id'])}
@@ -98,82 +176,92 @@ def save_answer():
         if not session:
             return jsonify({'error': 'Session not found or not yours'}), 404
 
-        # Normalize for both single and multiple answers
-        answers_input = []
-        if 'answers' in data:
-            answers_input = data['answers']
-        elif 'question_id' in data:
-            answers_input = [{'question_id': data['question_id'], 'answer': data['answer']}]
-        else:
-            return jsonify({'error': 'No answers provided'}), 400
+        questions = get_question_index(db, session['exam_id'])
 
-        saved_answers = []
+        # --- Validate the whole batch before writing anything ---
+        results = []
+        accepted = {}  # question_id -> result; a repeated question keeps its last answer
         for entry in answers_input:
-            qid = entry.get('question_id')
-            raw_answer = entry.get('answer')
-            if not qid:
-                continue
+            qid = str(entry.get('question_id') or '') if isinstance(entry, dict) else ''
+            result = {'question_id': qid or None, 'status': 'rejected'}
+            results.append(result)
 
-            question = db.exam_questions.find_one({'_id': ObjectId(qid)})
+            question = questions.get(qid) if qid else None
             if not question:
+                result['error'] = 'question_id missing' if not qid else 'question not in this exam'
                 continue
 
-            qtype = question.get('type')
-            answer = normalize_answer(raw_answer)
-
-            # --- Type-specific normalization ---
-            if qtype == 'mcq':
-                if isinstance(answer, list):
-                    answer = sorted([normalize_answer(a) for a in answer])
-                else:
-                    answer = normalize_answer(answer)
-
-            elif qtype in ('fill_blank', 'text', 'math', 'image_label'):
-                if isinstance(answer, str):
-                    answer = answer.strip().lower()
-
-            elif qtype == 'boolean':
-                if isinstance(answer, str):
-                    answer = answer.lower() in ['true', '1', 'yes']
-                elif isinstance(answer, (int, float)):
-                    answer = bool(answer)
-
-            elif qtype == 'file_upload':
-                if not isinstance(answer, dict) or 'url' not in answer:
-                    return jsonify({'error': 'file_upload answer must include url'}), 400
-
-            elif qtype == 'match':
-                if isinstance(answer, dict):
-                    answer = {k.strip().lower(): v.strip().lower() for k, v in sorted(answer.items())}
-
-            elif qtype == 'code':
-                if isinstance(answer, str):
-                    answer = answer.strip()
-
-            # --- Save (upsert) each answer ---
-            db.exam_answers.update_one(
-                {'session_id': session['_id'], 'question_id': ObjectId(qid)},
-                {
-                    '$set': {
-                        'answer': answer,
-                        'saved_at': datetime.utcnow(),
-                        'is_final': False
-                    },
-                    '$setOnInsert': {'_id': ObjectId()}
-                },
-                upsert=True
-            )
-            saved_answers.append({'question_id': str(qid), 'normalized_answer': answer})
+            answer, error = normalize_answer_for_type(question.get('type'), entry.get('answer'))
+            if error:
+                result['error'] = error
+                continue
 
-        # Update session timestamp
-        db.exam_sessions.update_one(
-            {'_id': session['_id']},
-            {'$set': {'updated_at': datetime.utcnow()}}
+            if qid in accepted:
+                accepted[qid]['status'] = 'superseded'
+                accepted[qid].pop('normalized_answer', None)
+            result.update(status='saved', normalized_answer=answer, _oid=question['_id'])
+            accepted[qid] = result
+
+        # --- Persist with one round trip ---
+        now = datetime.utcnow()
+        batch = list(accepted.values())
+        buffered = bool(batch) and write_behind_enabled() and buffer_answers(
+            session['exam_id'], session['_id'],
+            [(item['question_id'], item['normalized_answer']) for item in batch]
         )
+        if batch and not buffered:
+            # stamped so answers still buffered from before never overwrite this write
+            seq = direct_seq()
+            ops = [
+                UpdateOne(
+                    {'session_id': session['_id'], 'question_id': item['_oid']},
+                    {
+                        '$set': {
+                            'answer': item['normalized_answer'],
+                            'saved_at': now,
+                            'is_final': False,
+                            'buffer_seq': seq
+                        },
+                        '$setOnInsert': {'_id': ObjectId()}
+                    },
+                    upsert=True
+                )
+                for item in batch
+            ]
+            try:
+                db.exam_answers.bulk_write(ops, ordered=False)
+            except BulkWriteError as bwe:
+                for err in bwe.details.get('writeErrors', []):
+                    failed = batch[err['index']]
+                    failed.update(status='failed', error=err.get('errmsg', 'write failed'))
+                    failed.pop('normalized_answer', None)
+                current_app.logger.warning(
+                    'Bulk answer write partially failed for session %s: %d errors',
+                    session_id, len(bwe.details.get('writeErrors', []))
+                )
+        for result in results:
+            result.pop('_oid', None)
+
+        saved_answers = [
+            {'question_id': r['question_id'], 'normalized_answer': r['normalized_answer']}
+            for r in batch if r['status'] == 'saved'
+        ]
+        if not saved_answers:
+            return jsonify({'saved': False, 'count': 0, 'answers': [], 'results': results}), 400
+
+        # Update session timestamp (the flusher does it for buffered answers)
+        if not buffered:
+            db.exam_sessions.update_one(
+                {'_id': session['_id']},
+                {'$set': {'updated_at': now}}
+            )
 
-        # Emit progress update once
-        total_questions = db.exam_questions.count_documents({'exam_id': session['exam_id']})
-        answered_count = db.exam_answers.count_documents({'session_id': session['_id']})
+        # Emit progress update once; counters only move when an answer flips empty <-> non-empty
+        total_questions = len(questions)
+        answered_count = record_answers(db, session['_id'], questions, [
+            (questions.get(r['question_id']), is_answered(r['normalized_answer']))
+            for r in batch if r['status'] == 'saved'
+        ])
         percent = int((answered_count / max(total_questions, 1)) * 100)
 
         push_progress_update(session_id, {
@@ -181,13 +269,14 @@ def save_answer():
             'answered': answered_count,
             'total': total_questions,
             'percent': percent,
-            'ts': datetime.utcnow().isoformat()
+            'ts': now.isoformat()
         })
 
         return jsonify({
             'saved': True,
             'count': len(saved_answers),
             'answers': saved_answers,
+            'results': results,
             'progress': {'answered': answered_count, 'total': total_questions, 'percent': percent}
         }), 200
 
@@ -196,9 +285,32 @@ def save_answer():
         return jsonify({'error': 'Failed to save answer', 'details': str(e)}), 500
 
     
+def submitted_response(db, session):
+    """Response for a session that is no longer in progress: its result, or where grading stands."""
+    result = db.exam_results.find_one(
+        {"session_id": session["_id"]},
+        {"grading_status": 1, "auto_score": 1, "possible_score": 1, "graded": 1}
+    ) or {}
+    grading_status = result.get("grading_status")
+    if grading_status == "graded":
+        return jsonify({
+            "message": "Already submitted",
+            "auto_score": result.get("auto_score"),
+            "possible_score": result.get("possible_score"),
+            "needs_manual_review": not result.get("graded", False)
+        }), 200
+    return jsonify({
+        "message": "Already submitted",
+        "session_id": str(session["_id"]),
+        "status": session.get("status"),
+        "grading_status": grading_status,
+        "result_url": f"/api/exam_result/session/{session['_id']}"
+    }), 202 if grading_status in ("queued", "grading") else 200
+
+
 @exam_take_bp.route('/submit', methods=['POST'])
 @token_required
-@limiter.limit('10 per minute')
+@rate_limit('10 per minute')
 def submit_session():
     try:
         data = request.get_json() or {}
@@ -214,113 +326,47 @@ def submit_session():
         if not session:
             return jsonify({'error': 'Session not found or not yours'}), 404
 
-        db.exam_sessions.update_one(
-            {"_id": session["_id"]},
+        moved = db.exam_sessions.update_one(
+            {"_id": session["_id"], "status": "in_progress"},
             {"$set": {
                 "status": "submitted",
                 "ended_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }}
         )
-
+        if not moved.modified_count:
+            # a retried or double-clicked submit, or the session timer got there first:
+            # report what the first submit produced instead of grading again
+            return submitted_response(db, session)
+        cancel_session(session["_id"])
+        remove_sessions([session])
+
+        run_async = data.get("async", current_app.config.get("EXAM_SUBMIT_ASYNC", False))
         db.exam_results.update_one(
             {"session_id": session["_id"]},
             {"$set": {
                 "status": "submitted",
-                "submitted_at": datetime.utcnow()
+                "submitted_at": datetime.utcnow(),
+                "grading_status": "queued" if run_async else "grading"
             }}
         )
 
-        exam_id = session["exam_id"]
-        questions = list(db.exam_questions.find({"exam_id": exam_id}))
-        answers_docs = list(db.exam_answers.find({"session_id": session["_id"]}))
-
-        # map answers
-        latest = {}
-        for a in answers_docs:
-            qid = str(a["question_id"])
-            if qid not in latest or a["saved_at"] > latest[qid]["saved_at"]:
-                latest[qid] = a
-
-        total_score = 0
-        possible_score = 0
-        detailed_results = []
-
-        from backend.models.question import decrypt_value, normalize_answer
-
-        for q in questions:
-            qid = str(q["_id"])
-            qtype = q["type"]
-            points = q.get("points", 1)
-            possible_score += points
-
-            encrypted_key = q.get("answer_key")
-            correct_answer = decrypt_value(encrypted_key) if encrypted_key else None
-            user_answer = latest.get(qid, {}).get("answer")
-
-            auto_score = 0
-            needs_manual = False
-
-            if qtype == "mcq" and correct_answer is not None:
-                corr = normalize_answer(correct_answer)
-                given = normalize_answer(user_answer)
-
-                if isinstance(corr, list):
-                    corr = sorted(corr)
-                if isinstance(given, list):
-                    given = sorted(given)
-
-                if corr == given:
-                    auto_score = points
-                elif q.get("allow_partial") and isinstance(corr, list) and isinstance(given, list):
-                    correct_hits = len(set(corr) & set(given))
-                    auto_score = (correct_hits / len(corr)) * points
-
-            elif qtype == "boolean":
-                if str(user_answer).lower() == str(correct_answer).lower():
-                    auto_score = points
-
-            elif qtype in ("text", "fill_blank"):
-                # crude auto grading; can be replaced with fuzzy matching or embeddings later
-                if normalize_answer(user_answer) == normalize_answer(correct_answer):
-                    auto_score = points
-                else:
-                    needs_manual = True
-
-            elif qtype in ("code", "essay", "file_upload"):
-                needs_manual = True
-
-            # Save question_result entry
-            detailed_results.append({
-                "question_id": qid,
-                "type": qtype,
-                "user_answer": user_answer,
-                "correct_answer": None,     # Hide from student
-                "awarded": auto_score,
-                "possible": points,
-                "needs_manual": needs_manual
-            })
-
-            total_score += auto_score
-
-        # Update main result record
-        db.exam_results.update_one(
-            {"session_id": session["_id"]},
-            {"$set": {
-                "auto_score": total_score,
-                "possible_score": possible_score,
-                "detailed": detailed_results,
-                "graded": not any(r["needs_manual"] for r in detailed_results),
-                "updated_at": datetime.utcnow()
-            }}
-        )
-
-        return jsonify({
-            "message": "Submitted successfully",
-            "auto_score": total_score,
-            "possible_score": possible_score,
-            "needs_manual_review": any(r["needs_manual"] for r in detailed_results)
-        }), 200
+        if run_async:
+            # the session is already durably submitted; scoring happens on the grading queue
+            # and the client hears `result_ready` on /ws/exam (or polls the result)
+            try:
+                grade_submission_task.delay(str(session["_id"]))
+                return jsonify({
+                    "message": "Submitted; grading queued",
+                    "session_id": str(session["_id"]),
+                    "grading_status": "queued",
+                    "result_url": f"/api/exam_result/session/{session['_id']}"
+                }), 202
+            except Exception:
+                current_app.logger.exception("Grading enqueue failed; grading inline")
+
+        summary = grade_submission(db, session)
+        return jsonify({"message": "Submitted successfully", **summary}), 200
 
     except Exception as e:
         current_app.logger.exception("Submit grading error")
@@ -329,10 +375,15 @@ def submit_session():
 @exam_take_bp.route('/<exam_id>/question', methods=["GET"])
 @token_required
 def get_questions(exam_id):
+    """
+    Serve the exam's precompiled paper (same bytes for every student of an exam version).
+    Body: { exam_id, version, questions }; the caller's session id is in X-Session-Id.
+    Honors If-None-Match with 304.
+    """
     try:
         db = current_app.mongo.db
         
-        exam = db.exams.find_one({'_id': ObjectId(exam_id), "status": "published"})
+        exam = find_exam(exam_id, published_only=True)
         if not exam:
             return jsonify({'error': 'Exam not found'}), 404
         
@@ -345,31 +396,7 @@ def get_questions(exam_id):
         if not session:
             return jsonify({'error': 'No active session found'}), 403
         
-        questions = list(db.exam_questions.find({'exam_id': ObjectId(exam_id)}))
-        
-        delivered = []
-        # from backend.models.question import decrypt_value
-        
-        for q in questions:
-            # Prompt and options are stored as plain text
-            decrypted_text = q.get("prompt", "")
-            decrypted_options = q.get("options")
-            
-            delivered.append({
-                "question_id": str(q["_id"]),
-                "type": q["type"],
-                "points": q.get("points", 1),
-                "text": decrypted_text,
-                "options": decrypted_options,
-                "media": q.get("media"),
-                "shuffle": q.get("shuffle_options", False),
-                "allow_partial": q.get("allow_partial", False),
-            })
-            
-        return jsonify({
-            "session_id": str(session["_id"]),
-            "questions": delivered
-        }), 200
+        return send_paper(get_paper(db, exam), headers={"X-Session-Id": str(session["_id"])})
 
     except Exception as e:
         current_app.logger.exception("Failed to fetch questions")
@@ -377,7 +404,7 @@ def get_questions(exam_id):
 
 
 @exam_take_bp.route('/session/<session_id>', methods=['GET'])
-@token_required
+@stateless_token_required
 def get_session_state(session_id):
     """
     Get current session state.
@@ -395,6 +422,15 @@ def get_session_state(session_id):
         session['exam_id'] = str(session['exam_id'])
         session['user_id'] = str(session['user_id'])
         session['student_id'] = str(session['student_id']) if session.get('student_id') else None
+
+        progress = get_progress(session['_id'])
+        if progress:
+            answered, total = progress
+            session['progress'] = {
+                'answered': answered,
+                'total': total,
+                'percent': int((answered / max(total, 1)) * 100)
+            }
         
         return jsonify(session), 200
     except Exception as e:
@@ -429,6 +465,8 @@ def pause_session(session_id):
             {'_id': ObjectId(session_id)},
             {'$set': {'status': 'paused', 'updated_at': datetime.utcnow()}}
         )
+        # live views list in-progress sessions only; the next heartbeat after resume rejoins
+        remove_sessions([session])
         
         return jsonify({'message': 'Session paused'}), 200
     except Exception as e:
@@ -458,6 +496,7 @@ def resume_session(session_id):
             {'_id': ObjectId(session_id)},
             {'$set': {'status': 'in_progress', 'updated_at': datetime.utcnow()}}
         )
+        join_presence(session, connections=0)
         
         return jsonify({'message': 'Session resumed'}), 200
     except Exception as e:
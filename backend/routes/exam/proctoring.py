@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app, g
 from backend.middleware.auth import token_required
 from bson import ObjectId
-from datetime import datetime
+from backend.utils.exam_presence import live_sessions, presence_summary, record_violation, student_names
+from backend.utils.proctor_ingest import ingest
 
 proctoring_bp = Blueprint('proctoring', __name__, url_prefix='/api/proctoring')
 
@@ -49,6 +50,21 @@ def get_live_students(exam_id):
         if str(g.current_user['_id']) not in [str(exam['owner_id'])] + [str(x) for x in exam.get('invited_examiners', [])]:
             return jsonify({'error': 'Unauthorized'}), 403
 
+        # heartbeat presence from redis; without it, fall back to scanning in-progress sessions
+        present = live_sessions(exam_id)
+        if present is not None:
+            names = student_names(db, [p['user_id'] for p in present])
+            live_data = [{
+                'session_id': p['session_id'],
+                'student_id': p['user_id'],
+                'name': names.get(p['user_id'], 'Unknown'),
+                'started_at': p['started_at'],
+                'violation_count': p['violation_count'],
+                'last_heartbeat': p['last_seen'],
+                'presence': p['presence'],
+            } for p in present]
+            return jsonify({'live_sessions': live_data, 'presence': presence_summary(present)}), 200
+
         sessions = list(db.exam_sessions.find({
             'exam_id': ObjectId(exam_id),
             'status': 'in_progress'
@@ -92,20 +108,11 @@ def manual_flag_incident(session_id):
         if str(g.current_user['_id']) not in [str(exam['owner_id'])] + [str(x) for x in exam.get('invited_examiners', [])]:
             return jsonify({'error': 'Unauthorized'}), 403
 
-        # Log incident
-        incident = {
-            'session_id': ObjectId(session_id),
-            'event_type': 'manual_flag',
-            'details': {'reason': reason, 'flagged_by': ObjectId(g.current_user['_id'])},
-            'timestamp': datetime.utcnow()
-        }
-        db.proctor_logs.insert_one(incident)
-        
-        # Update session violation count
-        db.exam_sessions.update_one(
-            {'_id': ObjectId(session_id)},
-            {'$inc': {'violation_count': 1}, '$set': {'updated_at': datetime.utcnow()}}
-        )
+        # Log incident and count it as a violation (buffered, written with the next flush)
+        details = {'reason': reason, 'flagged_by': ObjectId(g.current_user['_id'])}
+        if not ingest(db, session_id, 'manual_flag', details):
+            return jsonify({'error': 'Proctor log busy, retry shortly'}), 503
+        record_violation(session_id)
         
         return jsonify({'message': 'Session flagged'}), 200
     except Exception as e:
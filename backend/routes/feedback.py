@@ -6,7 +6,7 @@ from bson import ObjectId
 from backend.utils.validation import validate_feedback_data, sanitize_input, validate_email
 from backend.utils.security import get_client_ip, hash_ip_address
 from backend.middleware.auth import jwt_required
-from backend.extensions import api_rate_limit
+from backend.middleware.rate_limit import rate_limit
 from backend.models.feedback import Feedback
 
 feedback_bp = Blueprint("feedback", __name__)
@@ -121,7 +121,7 @@ def submit_feedback(slug):
 
 
 @feedback_bp.route("/link/<link_id>", methods=["GET"])
-@api_rate_limit()
+@rate_limit("10/minute")
 @jwt_required
 def get_link_feedback(link_id):
     try:
@@ -201,7 +201,7 @@ def get_feedback_detail(feedback_id):
         return jsonify({"error": "Failed to get feedback details"}), 500
 
 @feedback_bp.route("/<feedback_id>", methods=["DELETE"])
-@api_rate_limit()
+@rate_limit("10/minute")
 @jwt_required
 def delete_feedback(feedback_id):
     try:
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from backend.middleware.auth import jwt_required
+from backend.middleware.rate_limit import rate_limit
 from backend.utils.validation import sanitize_input
 from bson import ObjectId
 import logging
@@ -19,18 +20,10 @@ def simple_slugify(value):
 feedback_links_bp = Blueprint("feedback_links", __name__)
 logger = logging.getLogger(__name__)
 
-def get_limiter():
-    from flask import current_app
-    return current_app.extensions.get("limiter")
-
-
 @feedback_links_bp.route("/links", methods=["GET"])
+@rate_limit("100/minute")
 @jwt_required
 def get_user_links():
-    limiter = get_limiter()
-    if limiter:
-        limiter.limit("100/minute")(lambda: None)()
-
     try:
         page = max(int(request.args.get("page", 1)), 1)
         per_page = min(int(request.args.get("per_page", 10)), 50)
@@ -65,12 +58,9 @@ def get_user_links():
 
 
 @feedback_links_bp.route("", methods=["POST"])
+@rate_limit("100/minute")
 @jwt_required
 def create_link():
-    limiter = get_limiter()
-    if limiter:
-        limiter.limit("100/minute")(lambda: None)()
-
     try:
         data = request.get_json()
         if not data:
@@ -114,12 +104,9 @@ def create_link():
 
 
 @feedback_links_bp.route("/<link_id>", methods=["GET"])
+@rate_limit("100/minute")
 @jwt_required
 def get_link(link_id):
-    limiter = get_limiter()
-    if limiter:
-        limiter.limit("100/minute")(lambda: None)()
-
     try:
         db = current_app.mongo.db
         link = db.feedback_links.find_one({
@@ -140,12 +127,9 @@ def get_link(link_id):
 
 
 @feedback_links_bp.route("/<link_id>", methods=["PUT"])
+@rate_limit("100/minute")
 @jwt_required
 def update_link(link_id):
-    limiter = get_limiter()
-    if limiter:
-        limiter.limit("100/minute")(lambda: None)()
-
     try:
         data = request.get_json()
         if not data:
@@ -185,12 +169,9 @@ def update_link(link_id):
 
 
 @feedback_links_bp.route("/<link_id>", methods=["DELETE"])
+@rate_limit("100/minute")
 @jwt_required
 def delete_link(link_id):
-    limiter = get_limiter()
-    if limiter:
-        limiter.limit("100/minute")(lambda: None)()
-
     try:
         db = current_app.mongo.db
 
@@ -228,11 +209,8 @@ def delete_link(link_id):
 
 
 @feedback_links_bp.route("/by-slug/<slug>", methods=["GET"])
+@rate_limit("100/minute")
 def get_link_by_slug(slug):
-    limiter = get_limiter()
-    if limiter:
-        limiter.limit("100/minute")(lambda: None)()
-
     try:
         db = current_app.mongo.db
         feedback_link = db.feedback_links.find_one({
@@ -1,11 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from backend.models.form_links import FORM_LINK
 from backend.models.forms import FORM
 from backend.models.form_responses import FORM_RESPONSE
 from backend.middleware.auth import jwt_required
 from backend import socketio
+import logging
 
 form_response_bp = Blueprint("form_response", __name__)
+logger = logging.getLogger(__name__)
 
 @form_response_bp.route("/submit/<slug>", methods=["POST"])
 def submit_response(slug):
@@ -19,7 +21,7 @@ def submit_response(slug):
             return jsonify({"error": "Form not found"}), 404
         
         data = request.get_json()
-        current_app.logger.info(f"Received form submission data: {data}")
+        logger.debug("Received form submission for %s: %s", slug, data, extra={"payload": True})
         
         # Handle both 'answers' and 'responses' keys for flexibility
         raw_answers = data.get("answers") or data.get("responses", {})
@@ -36,7 +38,7 @@ def submit_response(slug):
                     "answer": raw_answers[question_key]
                 })
         
-        current_app.logger.info(f"Structured answers: {structured_answers}")
+        logger.debug("Structured answers: %s", structured_answers, extra={"payload": True})
         
         responder_ip = request.remote_addr
         response_id = FORM_RESPONSE.submit(str(form["_id"]), structured_answers, responder_ip)
@@ -45,7 +47,7 @@ def submit_response(slug):
             results = FORM_RESPONSE.get_poll_results(str(form["_id"]))
             socketio.emit("form_update", {"form_id": str(form["_id"]), "results": results}, room=str(form["_id"]))
         except Exception as e:
-            current_app.logger.warning(f"Failed to emit socket update: {e}")
+            logger.warning("Failed to emit socket update: %s", e)
         
         return jsonify({
             "message": "Response submitted successfully", 
@@ -53,24 +55,20 @@ def submit_response(slug):
         }), 201
         
     except Exception as e:
-        current_app.logger.error(f"Form submission error: {e}")
+        logger.exception("Form submission error: %s", e)
         return jsonify({"error": "Failed to submit form response"}), 500
 
 
 @form_response_bp.route("/form/<form_id>", methods=["GET"])
 @jwt_required
 def list_response(form_id):
-    current_app.logger.info(f"Getting responses for form_id: {form_id}")
     responses = FORM_RESPONSE.get_by_form_id(form_id)
-    current_app.logger.info(f"Found {len(responses)} responses")
+    logger.info("Found %d responses for form %s", len(responses), form_id)
     
     for r in responses:
         r["_id"] = str(r["_id"])
         r["form_id"] = str(r["form_id"])
         
-        # Log original answers structure
-        current_app.logger.info(f"Original answers structure: {r.get('answers', 'NO ANSWERS')}")
-        
         # Transform answers from array to object for frontend compatibility
         if "answers" in r and isinstance(r["answers"], list):
             answers_obj = {}
@@ -78,17 +76,15 @@ def list_response(form_id):
                 if "question" in ans and "answer" in ans:
                     answers_obj[ans["question"]] = ans["answer"]
             r["answers"] = answers_obj
-            current_app.logger.info(f"Transformed answers: {r['answers']}")
     
     return jsonify(responses), 200
 
 @form_response_bp.route("/results/<form_id>", methods=["GET"])
 def poll_results(form_id):
     try:
-        current_app.logger.info(f"Getting poll results for form_id: {form_id}")
         results = FORM_RESPONSE.get_poll_results(form_id)
-        current_app.logger.info(f"Poll results: {results}")
+        logger.debug("Poll results for %s: %s", form_id, results, extra={"payload": True})
         return jsonify(results), 200
     except Exception as e:
-        current_app.logger.error(f"Error getting poll results for form_id {form_id}: {e}")
+        logger.error("Error getting poll results for form_id %s: %s", form_id, e)
         return jsonify({"error": "Failed to get poll results"}), 500
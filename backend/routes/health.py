@@ -8,6 +8,24 @@ health_bp = Blueprint("health", __name__)
 
 @health_bp.route("/health", methods=["GET"])
 def health_check():
+    # the stats helpers load their util modules here, not while create_app registers routes
+    from backend.utils.user_cache import user_cache_stats
+    from backend.utils.revocation_filter import revocation_filter_stats
+    from backend.utils.token_version import token_version_stats
+    from backend.utils.session_registry import active_session_counts
+    from backend.utils.log_pipeline import logging_stats
+    from backend.utils.rate_limiter import rate_limiter_stats
+    from backend.utils.question_cache import question_cache_stats
+    from backend.utils.answer_buffer import answer_buffer_stats
+    from backend.utils.exam_paper import exam_paper_stats
+    from backend.utils.single_flight import single_flight_stats
+    from backend.utils.grading_keys import grading_key_stats
+    from backend.utils.batch_grading import batch_grading_stats
+    from backend.utils.grading_jobs import grading_job_stats
+    from backend.utils.session_timer import session_timer_stats
+    from backend.utils.exam_presence import exam_presence_stats
+    from backend.utils.proctor_ingest import proctor_ingest_stats
+
     status = {
         "timestamp": datetime.utcnow().isoformat(),
         "services": {
@@ -15,7 +33,7 @@ def health_check():
             "redis": False,
             "mail": False
         },
-        "sessions": [],
+        "sessions": {},
         "summary": "OK"
     }
 
@@ -32,14 +50,8 @@ def health_check():
     try:
         if redis_client and redis_client.ping():
             status["services"]["redis"] = True
-            # List all user sessions
-            session_keys = redis_client.keys("user_session:*")
-            status["sessions"] = [
-                {
-                    "key": key,
-                    "ttl": redis_client.ttl(key)
-                } for key in session_keys
-            ]
+            # Counters from the session registry; no keyspace scan
+            status["sessions"] = active_session_counts()
         else:
             status["services"]["redis_error"] = "Redis client not initialized"
             status["summary"] = "ERROR"
@@ -58,4 +70,20 @@ def health_check():
         status["services"]["mail_error"] = str(e)
         status["summary"] = "ERROR"
 
+    status["user_cache"] = user_cache_stats()
+    status["revocation_filter"] = revocation_filter_stats()
+    status["token_versions"] = token_version_stats()
+    status["logging"] = logging_stats()
+    status["rate_limiter"] = rate_limiter_stats()
+    status["question_cache"] = question_cache_stats()
+    status["answer_buffer"] = answer_buffer_stats()
+    status["exam_paper"] = exam_paper_stats()
+    status["single_flight"] = single_flight_stats()
+    status["grading_keys"] = grading_key_stats()
+    status["batch_grading"] = batch_grading_stats()
+    status["grading_jobs"] = grading_job_stats()
+    status["session_timer"] = session_timer_stats()
+    status["exam_presence"] = exam_presence_stats()
+    status["proctor_ingest"] = proctor_ingest_stats()
+
     return jsonify(status), 200 if status["summary"] == "OK" else 500
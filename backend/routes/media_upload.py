@@ -1,14 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app, g 
 from backend.middleware.auth import token_required
 from backend.models.media_upload import media_upload_doc
-from backend.extensions import mongo, limiter 
+from backend.extensions import mongo
+from backend.middleware.rate_limit import rate_limit
 from backend.utils.cloudinary_helper import upload_media
 
 media_upload_bp = Blueprint('media_upload', __name__, url_prefix='/api/exam_media')
 
 @media_upload_bp.route('/upload', methods=['POST'])
 @token_required
-@limiter.limit('5 per minute')
+@rate_limit('5 per minute')
 def upload_exam_media():
     """
     Multipart Form: { file: <image>, exam_id (optional) }
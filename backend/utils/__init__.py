@@ -1,9 +1,29 @@
-from .validation import validate_email, validate_password, sanitize_input, to_objectid
-from .security import generate_csrf_token, verify_csrf_token
-from .background import grade_exam_task
-from .cloudinary_helper import upload_media
-from .cloudinary_utils import uploader_media
-from .exam_validation import validate_exam_payload, validate_question_payload, is_valid_objectid
-from .mailer import send_email
+from importlib import import_module
+
+# Re-exports are resolved on first access so that `import backend.utils.x` doesn't drag in
+# celery, cloudinary and the Brevo SDK through this package.
+_EXPORTS = {
+    'validate_email': '.validation',
+    'validate_password': '.validation',
+    'sanitize_input': '.validation',
+    'to_objectid': '.validation',
+    'generate_csrf_token': '.security',
+    'verify_csrf_token': '.security',
+    'grade_exam_task': '.background',
+    'upload_media': '.cloudinary_helper',
+    'uploader_media': '.cloudinary_utils',
+    'validate_exam_payload': '.exam_validation',
+    'validate_question_payload': '.exam_validation',
+    'is_valid_objectid': '.exam_validation',
+    'send_email': '.mailer',
+}
 
 __all__ = ['validate_email', 'validate_password', 'sanitize_input', 'generate_csrf_token', 'verify_csrf_token', 'to_objectid', 'grade_exam_task', 'upload_media', 'uploader_media', 'send_email', 'validate_exam_payload', 'validate_question_payload', 'is_valid_objectid']
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from threading import Lock
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.extensions import get_redis, socketio
+
+logger = logging.getLogger(__name__)
+
+# Write-behind for exam autosaves (EXAM_ANSWER_WRITE_BEHIND):
+#   answer_stream:<exam_id>         stream of {session_id, question_id, answer, saved_at}
+#   answer_pending:<session_id>     hash question_id -> latest unflushed {answer, saved_at, seq}
+#   answer_streams                  set of stream keys the flushers poll
+# The stream is the durable log consumed by the flusher group; the pending hash lets reads
+# merge unflushed answers without scanning the stream. Every Mongo write carries the stream
+# sequence (`buffer_seq`) and only replaces an older one, so out-of-order or repeated
+# flushes can never roll an answer back.
+STREAM_PREFIX = "answer_stream:"
+PENDING_PREFIX = "answer_pending:"
+STREAMS_KEY = "answer_streams"
+GROUP = "answer_flushers"
+CONSUMER = f"{socket.gethostname()}-{os.getpid()}"
+
+# KEYS: stream, pending hash, streams set
+# ARGV: session_id, ttl seconds, then (question_id, answer json, saved_at) triples
+# -> 1, or 0 when the stream (and so its consumer group) doesn't exist yet
+_APPEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 3, #ARGV, 3 do
+    local id = redis.call('XADD', KEYS[1], '*', 'session_id', ARGV[1], 'question_id', ARGV[i],
+        'answer', ARGV[i + 1], 'saved_at', ARGV[i + 2])
+    redis.call('HSET', KEYS[2], ARGV[i], cjson.encode({answer = ARGV[i + 1], saved_at = ARGV[i + 2], id = id}))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('SADD', KEYS[3], KEYS[1])
+return 1
+"""
+
+# KEYS: pending hash
+# ARGV: (question_id, stream id) pairs; drops entries not overwritten since they were flushed
+_RELEASE_SCRIPT = """
+local released = 0
+for i = 1, #ARGV, 2 do
+    local raw = redis.call('HGET', KEYS[1], ARGV[i])
+    if raw and cjson.decode(raw)['id'] == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        released = released + 1
+    end
+end
+return released
+"""
+
+_lock = Lock()
+_state = {"flusher_started": False}
+_stats = {
+    "buffered": 0,
+    "flushed": 0,
+    "flush_batches": 0,
+    "forced_flushes": 0,
+    "stale_skipped": 0,
+    "flush_errors": 0,
+    "fallbacks": 0,
+}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def write_behind_enabled():
+    return bool(current_app.config.get("EXAM_ANSWER_WRITE_BEHIND")) and get_redis() is not None
+
+
+def _seq(stream_id):
+    # "1700000000000-3" -> sortable int (ms * 1e6 + sequence)
+    ms, _, n = stream_id.partition("-")
+    return int(ms) * 1_000_000 + int(n or 0)
+
+
+def direct_seq():
+    """
+    buffer_seq for an answer written straight to Mongo (write-behind off or failed): later than
+    every entry buffered before now, so neither a flush nor merge_pending can roll it back.
+    """
+    return int(time.time() * 1000) * 1_000_000 + 999_999
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _create_group(client, stream):
+    try:
+        client.xgroup_create(stream, GROUP, id="0", mkstream=True)
+    except Exception as e:
+        # another worker created it first
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def buffer_answers(exam_id, session_id, items):
+    """
+    Append [(question_id, answer), ...] for a session in one redis round trip.
+    Returns False (nothing buffered) when redis fails so the caller can write to Mongo directly.
+    """
+    client = get_redis()
+    if not client:
+        return False
+    saved_at = datetime.utcnow().isoformat()
+    args = []
+    for question_id, answer in items:
+        args += [str(question_id), json.dumps(answer), saved_at]
+    stream = f"{STREAM_PREFIX}{exam_id}"
+    keys = [stream, f"{PENDING_PREFIX}{session_id}", STREAMS_KEY]
+    ttl = current_app.config.get("EXAM_PROGRESS_TTL_SECONDS", 86400)
+    try:
+        if not client.eval(_APPEND_SCRIPT, 3, *keys, str(session_id), ttl, *args):
+            _create_group(client, stream)
+            client.eval(_APPEND_SCRIPT, 3, *keys, str(session_id), ttl, *args)
+    except Exception as e:
+        _count("fallbacks")
+        logger.warning(f"Answer buffer append failed, writing through: {e}")
+        return False
+    _count("buffered", len(items))
+    _ensure_flusher()
+    return True
+
+
+def pending_answers(session_id):
+    """Unflushed answers for a session: {question_id: {"answer", "saved_at", "id"}}."""
+    client = get_redis()
+    if not client:
+        return {}
+    try:
+        raw = client.hgetall(f"{PENDING_PREFIX}{session_id}")
+    except Exception as e:
+        logger.warning(f"Answer buffer read failed for {session_id}: {e}")
+        return {}
+    pending = {}
+    for qid, value in raw.items():
+        entry = json.loads(_decode(value))
+        pending[_decode(qid)] = {
+            "answer": json.loads(entry["answer"]),
+            "saved_at": datetime.fromisoformat(entry["saved_at"]),
+            "id": entry["id"],
+        }
+    return pending
+
+
+def merge_pending(session_id, answers):
+    """
+    Overlay unflushed answers on exam_answers documents for one session (mutates and returns
+    `answers`). Buffered-only questions are appended as minimal documents with `pending: True`.
+    """
+    pending = pending_answers(session_id)
+    if not pending:
+        return answers
+    by_qid = {str(a["question_id"]): a for a in answers}
+    for qid, entry in pending.items():
+        doc = by_qid.get(qid)
+        if doc is None:
+            doc = {"_id": None, "session_id": ObjectId(str(session_id)), "question_id": ObjectId(qid), "is_final": False}
+            answers.append(doc)
+        if doc.get("buffer_seq", 0) < _seq(entry["id"]):
+            doc.update(answer=entry["answer"], saved_at=entry["saved_at"], pending=True)
+    return answers
+
+
+def _write(db, latest):
+    """
+    Upsert {(session_id, question_id): (answer, saved_at, seq)} in one unordered bulk_write.
+    The filter only matches older copies; a newer copy makes the upsert hit the unique
+    (session_id, question_id) index, which is counted as stale and ignored. That index comes
+    with schema version 2, below which create_app leaves write-behind off.
+    """
+    if not latest:
+        return 0
+    ops = []
+    for (session_id, question_id), (answer, saved_at, seq) in latest.items():
+        ops.append(UpdateOne(
+            {
+                "session_id": ObjectId(session_id),
+                "question_id": ObjectId(question_id),
+                "$or": [{"buffer_seq": {"$exists": False}}, {"buffer_seq": {"$lt": seq}}],
+            },
+            {
+                "$set": {"answer": answer, "saved_at": saved_at, "is_final": False, "buffer_seq": seq},
+                "$setOnInsert": {"_id": ObjectId()},
+            },
+            upsert=True,
+        ))
+
+    stale = 0
+    try:
+        db.exam_answers.bulk_write(ops, ordered=False)
+    except BulkWriteError as bwe:
+        errors = bwe.details.get("writeErrors", [])
+        stale = sum(1 for err in errors if err.get("code") == 11000)
+        if stale != len(errors):
+            raise
+    # the session touch save_answer skips in write-behind mode
+    sessions = list({ObjectId(session_id) for session_id, _ in latest})
+    db.exam_sessions.update_many({"_id": {"$in": sessions}}, {"$set": {"updated_at": datetime.utcnow()}})
+    _count("stale_skipped", stale)
+    return len(ops) - stale
+
+
+def _release(client, pending_by_session):
+    pipe = client.pipeline(transaction=False)
+    for session_id, pairs in pending_by_session.items():
+        args = []
+        for question_id, stream_id in pairs:
+            args += [question_id, stream_id]
+        pipe.eval(_RELEASE_SCRIPT, 1, f"{PENDING_PREFIX}{session_id}", *args)
+    pipe.execute()
+
+
+def flush_session(db, session_id):
+    """
+    Force a session's buffered answers into Mongo (used at submit, before grading).
+    The stream entries stay behind and are no-ops when the flusher reaches them.
+    """
+    client = get_redis()
+    pending = pending_answers(session_id)
+    if not pending or not client:
+        return 0
+    session_id = str(session_id)
+    latest = {
+        (session_id, qid): (entry["answer"], entry["saved_at"], _seq(entry["id"]))
+        for qid, entry in pending.items()
+    }
+    written = _write(db, latest)
+    _release(client, {session_id: [(qid, entry["id"]) for qid, entry in pending.items()]})
+    _count("forced_flushes")
+    return written
+
+
+def _read_batch(client, stream, count):
+    # entries whose consumer died are reclaimed after a minute
+    idle_ms = current_app.config.get("EXAM_ANSWER_RECLAIM_MS", 60000)
+    claimed = client.xautoclaim(stream, GROUP, CONSUMER, idle_ms, "0-0", count=count)
+    entries = claimed[1] if claimed else []
+    # our own unacknowledged entries first (a failed flush), then new ones
+    for start in ("0", ">"):
+        if len(entries) >= count:
+            break
+        reply = client.xreadgroup(GROUP, CONSUMER, {stream: start}, count=count - len(entries))
+        for _, items in reply or []:
+            entries.extend(item for item in items if item[1])
+    return entries
+
+
+def flush_stream(db, client, stream, count):
+    """Drain up to `count` entries of one exam stream; returns the number of entries consumed."""
+    try:
+        entries = _read_batch(client, stream, count)
+    except Exception as e:
+        if "NOGROUP" in str(e):
+            client.srem(STREAMS_KEY, stream)
+            return 0
+        raise
+    if not entries:
+        return 0
+
+    latest = {}
+    released = {}
+    for stream_id, fields in entries:
+        stream_id = _decode(stream_id)
+        fields = {_decode(k): _decode(v) for k, v in fields.items()}
+        key = (fields["session_id"], fields["question_id"])
+        seq = _seq(stream_id)
+        if key not in latest or latest[key][2] < seq:
+            latest[key] = (json.loads(fields["answer"]), datetime.fromisoformat(fields["saved_at"]), seq)
+            released.setdefault(fields["session_id"], {})[fields["question_id"]] = stream_id
+
+    written = _write(db, latest)
+    ids = [_decode(stream_id) for stream_id, _ in entries]
+    pipe = client.pipeline(transaction=False)
+    pipe.xack(stream, GROUP, *ids)
+    pipe.xdel(stream, *ids)
+    pipe.execute()
+    _release(client, {sid: list(qids.items()) for sid, qids in released.items()})
+
+    _count("flushed", written)
+    _count("flush_batches")
+    return len(entries)
+
+
+def flush_all(db, max_batches=None):
+    """One pass over every active exam stream, batch by batch until each is drained."""
+    client = get_redis()
+    if not client:
+        return 0
+    count = current_app.config.get("EXAM_ANSWER_FLUSH_BATCH", 1000)
+    total = 0
+    for stream in client.smembers(STREAMS_KEY):
+        stream = _decode(stream)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            consumed = flush_stream(db, client, stream, count)
+            total += consumed
+            batches += 1
+            if consumed < count:
+                break
+    return total
+
+
+def _flusher(app):
+    with app.app_context():
+        interval = app.config.get("EXAM_ANSWER_FLUSH_SECONDS", 1)
+        while True:
+            socketio.sleep(interval)
+            try:
+                flush_all(app.mongo.db)
+            except Exception as e:
+                _count("flush_errors")
+                logger.warning(f"Answer buffer flush failed: {e}")
+
+
+def _ensure_flusher():
+    with _lock:
+        if _state["flusher_started"]:
+            return
+        _state["flusher_started"] = True
+    socketio.start_background_task(_flusher, current_app._get_current_object())
+
+
+def start_answer_flusher(app):
+    """Start this worker's flusher at boot so buffered answers drain even if it takes no saves."""
+    with app.app_context():
+        _ensure_flusher()
+
+
+def answer_buffer_stats():
+    with _lock:
+        return {**_stats, "flusher_running": _state["flusher_started"]}
@@ -1,25 +1,12 @@
 from typing import Any, Dict, List, Optional, Tuple, Union
-from decimal import Decimal, InvalidOperation
 
 from backend.utils.security import (
     hash_answer,
-    verify_hashed_answer,
-    decrypt_answer,
+    verify_answer as verify_hashed_answer,
     normalize_answer,
     fuzzy_equal
 )
-
-
-def to_number_if_possible(val):
-    try:
-        if isinstance(val, (int, float)):
-            return Decimal(str(val))
-        if isinstance(val, str):
-            s = val.strip()
-            return Decimal(s)
-    except (InvalidOperation, ValueError):
-        return None 
-    return None 
+from backend.utils.grading_keys import grading_key_for, to_number as to_number_if_possible
 
 def verify_answer(submitted_answer: Any, question_doc: Dict) -> Dict:
     """
@@ -36,6 +23,9 @@ def verify_answer(submitted_answer: Any, question_doc: Dict) -> Dict:
     
     if not stored_hash:
         return {"auto_checked": False, "correct": None, "reason": "No stored hash"}
+
+    # decrypted once per exam version and shared with submit grading
+    key = grading_key_for(question_doc)
     
     if qtype == "mcq":
         if isinstance(submitted_answer, list):
@@ -56,23 +46,15 @@ def verify_answer(submitted_answer: Any, question_doc: Dict) -> Dict:
         if normalized in ("true", "false", "1", "0", "t", "f"):
             val = normalized in ("true", "1", "t")
             ok = verify_hashed_answer(val, stored_hash)
-            return {"auto_checked": True}
+            return {"auto_checked": True, "correct": ok}
         else:
             return {"auto_checked": False, "correct": None, "reason": "Could not parse boolean"}
         
     if qtype == "fill_blank":
         if isinstance(submitted_answer, str):
-            try:
-                encrypted = question_doc.get("answer_key_ancrypted")
-                if encrypted:
-                    answer_list = decrypt_answer(encrypted)
-                    if not isinstance(answer_list, list):
-                        answer_list = [answer_list]
-                    for candidate in answer_list:
-                        if fuzzy_equal(submitted_answer, candidate):
-                            return {"auto_checked": True, "correct": True}
-            except Exception:
-                pass
+            for candidate in key.candidates:
+                if fuzzy_equal(submitted_answer, candidate):
+                    return {"auto_checked": True, "correct": True}
             ok = verify_hashed_answer(submitted_answer, stored_hash)
             return {"auto_checked": True, "correct": ok}
         else:
@@ -80,19 +62,9 @@ def verify_answer(submitted_answer: Any, question_doc: Dict) -> Dict:
         
     if qtype == "text":
         if question_doc.get("answer_key_hash"):
-            try:
-                encrypted = question_doc.get("answer_key_encrypted")
-                if encrypted:
-                    excepted = decrypt_answer(encrypted)
-                    if isinstance(excepted, list):
-                        for e in excepted:
-                            if fuzzy_equal(submitted_answer, e):
-                                return {"auto_checked": True, "correct": True}
-                    else:
-                        if fuzzy_equal(submitted_answer, excepted):
-                            return {"auto_checked": True, "correct": True}
-            except Exception:
-                pass
+            for candidate in key.candidates:
+                if fuzzy_equal(submitted_answer, candidate):
+                    return {"auto_checked": True, "correct": True}
             ok = verify_hashed_answer(submitted_answer, question_doc.get("answer_key_hash"))
             return {"auto_checked": True, "correct": ok}
         else:
@@ -100,26 +72,13 @@ def verify_answer(submitted_answer: Any, question_doc: Dict) -> Dict:
     
     if qtype == "math":
         sub_num = to_number_if_possible(submitted_answer)
-        try:
-            enc = question_doc.get("answer_key_encrypted")
-            if enc:
-                excepted = decrypt_answer(enc)
-                if isinstance(excepted, list):
-                    excepted_nums = [to_number_if_possible(x) for x in excepted]
-                else:
-                    excepted_nums = [to_number_if_possible(excepted)]
-            else:
-                excepted_nums = []
-        except Exception:
-            excepted_nums = []
-            
+        excepted_nums = key.numbers
+
         if sub_num is not None and excepted_nums:
             for e in excepted_nums:
-                if e is None:
-                    continue
                 try:
                     diff = abs(sub_num - e)
-                    if diff == 0 or diff <= Decimal("le-6"):
+                    if diff == 0 or diff <= key.tolerance:
                         return {"auto_checked": True, "correct": True}
                 except Exception:
                     continue
@@ -1,29 +1,172 @@
-from celery import Celery 
-from backend.extensions import mongo 
-from backend.models.question import hash_answer
-import os 
+from contextlib import nullcontext
+from flask import current_app, has_app_context
+from threading import Lock
+import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-celery = Celery('whisper exam', broker=os.getenv('REDIS_URL'))
+# Celery is built on first use (enqueue, or `celery -A backend.utils.background:celery worker`)
+# so web workers don't pay for importing it at boot.
+#
+# Grading tasks are routed to their own queue (CELERY_GRADING_QUEUE, default "grading"):
+#   celery -A backend.utils.background:celery worker -Q grading
+# CELERY_BROKER_URL / CELERY_RESULT_BACKEND default to REDIS_URL (any local redis works);
+# CELERY_TASK_ALWAYS_EAGER=1 runs every task inline, e.g. in tests and local development.
+GRADING_QUEUE = os.getenv('CELERY_GRADING_QUEUE', 'grading')
+GRADING_TASKS = ('grade_exam_task', 'grade_exam_chunk_task', 'finish_exam_grading_task', 'grade_submission_task')
 
-@celery.task 
-def grade_exam_task(exam_id):
-    db = mongo.db 
-    questions = list(db.exam_questions.find({"exam_id": exam_id}))
-    answers = list(db.exam_answers.find({"exam_id": exam_id}))
-    
-    for ans in answers:
-        q = next((x for x in questions if x['_id'] == ans['question_id']), None)
-        if not q:
-            continue
-        if q['type'] == 'mcq' and q['answer_key']:
-            # Hash the submitted answer and compare with stored hash
-            submitted_hash = hash_answer(ans['answer_text'])
-            if submitted_hash == q['answer_key']:
-                db.exam_results.update_one(
-                    {"exam_id": exam_id, "user_id": ans["user_id"]},
-                    {"$inc": {"total_score": q.get("points", 1)}},
-                    upsert=True
+_celery = None
+_task_functions = {}
+_tasks = {}
+_celery_lock = Lock()
+_flask_app = None
+
+
+def get_celery():
+    global _celery
+    if _celery is None:
+        with _celery_lock:
+            if _celery is None:
+                from celery import Celery
+                broker = os.getenv('CELERY_BROKER_URL') or os.getenv('REDIS_URL')
+                app = Celery(
+                    'whisper exam',
+                    broker=broker,
+                    backend=os.getenv('CELERY_RESULT_BACKEND') or broker,
+                )
+                app.conf.update(
+                    task_routes={f"{__name__}.{name}": {"queue": GRADING_QUEUE} for name in GRADING_TASKS},
+                    task_always_eager=os.getenv('CELERY_TASK_ALWAYS_EAGER', 'false').lower() in ('1', 'true', 'yes'),
+                    task_eager_propagates=True,
+                    # a chunk is acknowledged only once written, so a crashed worker's chunk is redelivered
+                    task_acks_late=True,
+                    task_reject_on_worker_lost=True,
+                    worker_prefetch_multiplier=1,
                 )
+                for name, fn in _task_functions.items():
+                    _tasks[name] = app.task(fn)
+                _celery = app
+    return _celery
+
+
+class _LazyTask:
+    """Stands in for a celery task until celery is loaded; `.delay`, `.apply_async` etc. load it."""
+
+    def __init__(self, fn):
+        self._name = fn.__name__
+        self.__wrapped__ = fn
+
+    def _task(self):
+        get_celery()
+        return _tasks[self._name]
+
+    def __call__(self, *args, **kwargs):
+        return self.__wrapped__(*args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self._task(), item)
+
+
+def lazy_task(fn):
+    """Drop-in for `@celery.task` that defers registration until celery is loaded."""
+    _task_functions[fn.__name__] = fn
+    return _LazyTask(fn)
+
+
+def __getattr__(name):
+    if name == "celery":
+        return get_celery()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _app_context():
+    """Tasks run in the caller's app context (eager mode) or in one app built per worker process."""
+    global _flask_app
+    if has_app_context():
+        return nullcontext()
+    if _flask_app is None:
+        from backend import create_app
+        _flask_app = create_app()
+    return _flask_app.app_context()
+
+
+def dispatch_grading(job):
+    """Queue a grading job's pending chunks as a chord; the callback marks the job completed."""
+    from celery import chord
+    from backend.utils.grading_jobs import pending_chunks
+
+    job_id = str(job["_id"])
+    chunks = pending_chunks(job)
+    if not chunks:
+        return finish_exam_grading_task.delay([], job_id)
+    return chord(grade_exam_chunk_task.s(job_id, index) for index in chunks)(finish_exam_grading_task.s(job_id))
+
+
+@lazy_task
+def grade_exam_task(exam_id):
+    # whole-exam re-grade, fanned out in chunks (reuses an unfinished job for the exam)
+    from backend.utils.grading_jobs import start_job
+
+    with _app_context():
+        job, dispatch = start_job(current_app.mongo.db, exam_id)
+        if dispatch:
+            dispatch_grading(job)
+        return str(job["_id"])
+
+
+@lazy_task
+def grade_exam_chunk_task(job_id, index, attempts=3):
+    # retried in place (chunks are idempotent), so eager mode behaves like a worker;
+    # a crashed worker's chunk is redelivered through acks_late instead
+    from backend.extensions import socketio
+    from backend.utils.grading_jobs import fail_job, run_chunk
+
+    with _app_context():
+        db = current_app.mongo.db
+        for attempt in range(attempts):
+            try:
+                return run_chunk(db, job_id, index)
+            except Exception as e:
+                if attempt == attempts - 1:
+                    fail_job(db, job_id, index, e)
+                    raise
+                current_app.logger.warning(f"Grading chunk {index} of job {job_id} failed, retrying: {e}")
+                socketio.sleep(min(2 ** attempt, 30))
+
+
+@lazy_task
+def finish_exam_grading_task(results, job_id):
+    from backend.utils.grading_jobs import finish_job
+
+    with _app_context():
+        job = finish_job(current_app.mongo.db, job_id)
+        return job["status"] if job else None
+
+
+@lazy_task
+def grade_submission_task(session_id, attempts=3):
+    # asynchronous submit: score one session, then tell the student's /ws/exam room
+    from bson import ObjectId
+    from backend.extensions import socketio
+    from backend.routes.exam.exam_socket import push_result_ready
+    from backend.utils.batch_grading import grade_submission
+
+    with _app_context():
+        db = current_app.mongo.db
+        session = db.exam_sessions.find_one({"_id": ObjectId(session_id)}, {"_id": 1, "exam_id": 1})
+        if not session:
+            return None
+        for attempt in range(attempts):
+            try:
+                summary = grade_submission(db, session)
+                break
+            except Exception as e:
+                if attempt == attempts - 1:
+                    db.exam_results.update_one({"session_id": session["_id"]}, {"$set": {"grading_status": "failed"}})
+                    push_result_ready(session_id, {"session_id": session_id, "grading_status": "failed"})
+                    raise
+                current_app.logger.warning(f"Grading session {session_id} failed, retrying: {e}")
+                socketio.sleep(min(2 ** attempt, 30))
+        push_result_ready(session_id, {"session_id": session_id, "grading_status": "graded", **summary})
+        return summary
@@ -0,0 +1,317 @@
+import logging
+from datetime import datetime
+from threading import Lock
+
+from pymongo import UpdateOne
+
+from backend.models.question import normalize_answer
+from backend.utils.answer_buffer import flush_session
+from backend.utils.grading_keys import get_grading_keys, grade_answer, grade_session
+
+logger = logging.getLogger(__name__)
+
+# Whole-exam grading. Answers are streamed per chunk of sessions into (sessions x questions)
+# matrices and scored column-wise with NumPy:
+#   MCQ      selected options as an int64 bitmask per cell (bit = option in the question's
+#            vocabulary), exact match and allow_partial credit from mask AND + popcount
+#   boolean  / text / fill_blank: one "matches the key" flag per cell
+# Cells that can't be encoded exactly (dict answers, duplicate selections, > 63 options) are
+# graded with grade_answer, so every result equals what submit_session stores.
+SCALAR, LIST, FALLBACK = 1, 2, -1
+MAX_OPTIONS = 63
+
+_lock = Lock()
+_stats = {"runs": 0, "sessions": 0, "cells": 0, "fallback_cells": 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _encode_mcq(normalized, vocab):
+    """(kind, mask) for a normalized MCQ answer, growing the question's option vocabulary."""
+    items = normalized if isinstance(normalized, list) else [normalized]
+    try:
+        if len(set(items)) != len(items):
+            return FALLBACK, 0
+        for item in items:
+            if item not in vocab:
+                vocab[item] = len(vocab)
+    except TypeError:
+        return FALLBACK, 0
+    if len(vocab) > MAX_OPTIONS:
+        return FALLBACK, 0
+    mask = 0
+    for item in items:
+        mask |= 1 << vocab[item]
+    return (LIST if isinstance(normalized, list) else SCALAR), mask
+
+
+def _encode_mcq_column(values, vocab):
+    """
+    (kinds, masks) for one MCQ column, encoding each distinct string / list-of-strings answer
+    once. Two selections normalizing to the same option make the cell FALLBACK, since the
+    sorted-list comparison in grade_answer counts duplicates.
+    """
+    memo = {}
+    kinds, masks = [], []
+    for value in values:
+        value_type = type(value)
+        key = value if value_type is str else tuple(value) if value_type is list else None
+        try:
+            encoded = memo.get(key) if key is not None else None
+        except TypeError:
+            # unhashable selections (dicts)
+            key, encoded = None, None
+        if encoded is None:
+            encoded = _encode_mcq(normalize_answer(value), vocab)
+            # only all-string answers are memoized: True, 1 and 1.0 hash alike but normalize apart
+            if key is not None and (value_type is str or all(type(item) is str for item in value)):
+                memo[key] = encoded
+        kinds.append(encoded[0])
+        masks.append(encoded[1])
+    return kinds, masks
+
+
+def _hit_column(values, match):
+    """match() every distinct scalar answer of a column once."""
+    memo = {}
+    out = []
+    for value in values:
+        if type(value) in (list, dict):
+            out.append(match(value))
+            continue
+        key = value if type(value) is str else (type(value), value)
+        hit = memo.get(key)
+        if hit is None:
+            hit = memo[key] = match(value)
+        out.append(hit)
+    return out
+
+
+def _score_numpy(np, keys, columns, n_sessions):
+    """Score (questions x sessions) answer columns -> (totals, values, manual, has_float)."""
+    n_questions = len(keys.order)
+
+    kind = np.zeros((n_questions, n_sessions), dtype=np.int8)
+    mask = np.zeros((n_questions, n_sessions), dtype=np.int64)
+    hit = np.zeros((n_questions, n_sessions), dtype=bool)
+
+    points = np.array([float(key.points) for key in keys.order])[:, None]
+    key_kind = np.zeros((n_questions, 1), dtype=np.int8)
+    key_mask = np.zeros((n_questions, 1), dtype=np.int64)
+    partial_cols = np.zeros((n_questions, 1), dtype=bool)
+    manual_cols = np.zeros((n_questions, 1), dtype=bool)
+    text_cols = np.zeros((n_questions, 1), dtype=bool)
+    hit_cols = np.zeros((n_questions, 1), dtype=bool)
+    fallback_cols = np.zeros((n_questions, 1), dtype=bool)
+
+    for j, key in enumerate(keys.order):
+        if key.type == "mcq":
+            if not key.has_key:
+                continue
+            vocab = {}
+            key_kind[j], key_mask[j] = _encode_mcq(key.normalized, vocab)
+            if key_kind[j] == FALLBACK:
+                fallback_cols[j] = True
+                continue
+            partial_cols[j] = bool(key.allow_partial and key.normalized_set)
+            kind[j], mask[j] = _encode_mcq_column(columns[j], vocab)
+        elif key.type == "boolean":
+            hit_cols[j] = True
+            if key.has_key:
+                expected = key.boolean
+                hit[j] = _hit_column(columns[j], lambda value: str(value).lower() == expected)
+        elif key.type in ("text", "fill_blank"):
+            hit_cols[j] = text_cols[j] = True
+            if key.has_key:
+                candidates = key.normalized_candidates
+                hit[j] = _hit_column(columns[j], lambda value: normalize_answer(value) in candidates)
+        elif key.type in ("code", "essay", "file_upload"):
+            manual_cols[j] = True
+
+    # (questions x sessions): one row per question, so each step below is a column of the exam
+    exact = (key_kind > 0) & (kind == key_kind) & (mask == key_mask)
+    partial = ~exact & (kind == LIST) & (key_kind == LIST) & partial_cols
+    ratio = np.bitwise_count(mask & key_mask) / np.maximum(np.bitwise_count(key_mask), 1)
+    full = exact | (hit & hit_cols)
+    manual = (text_cols & ~hit) | manual_cols
+    fallback = (kind == FALLBACK) | fallback_cols
+
+    awarded = np.where(full, points, 0.0)
+    awarded = np.where(partial, ratio * points, awarded)
+
+    # python values as submit_session produces them: the key's points, a float share or 0
+    values = np.where(full, np.array([key.points for key in keys.order], dtype=object)[:, None], 0)
+    values = np.where(partial, awarded.astype(object), values)
+    float_cols = np.array([isinstance(key.points, float) for key in keys.order])[:, None]
+    is_float = partial | (full & float_cols)
+    for j, s in zip(*np.nonzero(fallback)):
+        value, manual[j, s] = grade_answer(keys.order[j], columns[j][s])
+        values[j, s] = awarded[j, s] = value
+        is_float[j, s] = isinstance(value, float)
+
+    # accumulate question by question, in order, exactly like the scalar loop
+    totals = np.zeros(n_sessions)
+    for j in range(n_questions):
+        totals += awarded[j]
+    _count("fallback_cells", int(fallback.sum()))
+    return totals, values, manual, is_float.any(axis=0)
+
+
+def grade_sessions(keys, sessions, detailed=True):
+    """
+    Grade many sessions at once: `sessions` is a list of {question_id: answer} dicts.
+    Returns [(total_score, possible_score, detailed)], the same values grade_session gives
+    for each session (detailed=False skips building the per-question lists and returns None
+    in their place). Without NumPy this is the scalar loop.
+    """
+    _count("sessions", len(sessions))
+    _count("cells", len(sessions) * len(keys.order))
+    np = _numpy()
+    if np is None or not sessions or not keys.order:
+        results = [grade_session(keys, answers) for answers in sessions]
+        return results if detailed else [(total, possible, None) for total, possible, _ in results]
+
+    n_sessions = len(sessions)
+    columns = [[answers.get(key.question_id) for answers in sessions] for key in keys.order]
+    totals, values, manual, has_float = _score_numpy(np, keys, columns, n_sessions)
+    possible = sum(key.points for key in keys.order)
+    if not detailed:
+        return [
+            (total if is_float else int(total), possible, None)
+            for total, is_float in zip(totals.tolist(), has_float.tolist())
+        ]
+
+    templates = [(key.question_id, key.type, key.points) for key in keys.order]
+    value_rows, manual_rows = values.T.tolist(), manual.T.tolist()
+    answer_rows = list(zip(*columns))
+    results = []
+    for s in range(n_sessions):
+        detailed = [
+            {
+                "question_id": qid,
+                "type": qtype,
+                "user_answer": user_answer,
+                "correct_answer": None,     # Hide from student
+                "awarded": value,
+                "possible": qpoints,
+                "needs_manual": needs_manual,
+            }
+            for (qid, qtype, qpoints), user_answer, value, needs_manual
+            in zip(templates, answer_rows[s], value_rows[s], manual_rows[s])
+        ]
+        total = totals[s].item()
+        results.append((total if has_float[s] else int(total), possible, detailed))
+    return results
+
+
+def _load_answers(db, session_ids, batch_size):
+    """{session_id: {question_id: answer}} keeping the latest save, read with one cursor."""
+    latest = {sid: {} for sid in session_ids}
+    saved = {}
+    cursor = db.exam_answers.find(
+        {"session_id": {"$in": session_ids}},
+        {"session_id": 1, "question_id": 1, "answer": 1, "saved_at": 1},
+    ).batch_size(batch_size)
+    for doc in cursor:
+        key = (doc["session_id"], str(doc["question_id"]))
+        saved_at = doc.get("saved_at")
+        if key in saved and not (saved_at and saved[key] and saved_at > saved[key]):
+            continue
+        saved[key] = saved_at
+        latest[doc["session_id"]][key[1]] = doc.get("answer")
+    return latest
+
+
+def write_results(db, keys, sessions):
+    """
+    Grade `sessions` (exam_sessions documents with _id and user_id) and store their results
+    with one unordered bulk_write. Each write is a full $set keyed by session_id, so running a
+    chunk twice (a retried task) leaves the same documents. Returns the number written.
+    """
+    if not sessions:
+        return 0
+    session_ids = [s["_id"] for s in sessions]
+    answers = _load_answers(db, session_ids, len(session_ids))
+    results = grade_sessions(keys, [answers[sid] for sid in session_ids])
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"session_id": session["_id"]},
+            {
+                "$set": {
+                    "auto_score": total,
+                    "possible_score": possible,
+                    "detailed": detailed,
+                    "graded": not any(r["needs_manual"] for r in detailed),
+                    "grading_status": "graded",
+                    "graded_at": now,
+                    "updated_at": now,
+                },
+                "$setOnInsert": {"exam_id": keys.exam_id, "user_id": session.get("user_id"), "status": "submitted"},
+            },
+            upsert=True,
+        )
+        for session, (total, possible, detailed) in zip(sessions, results)
+    ]
+    db.exam_results.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def grade_submission(db, session):
+    """
+    Grade one submitted session (its buffered autosaves flushed first) and store the result.
+    Returns the summary submit_session reports: auto_score, possible_score, needs_manual_review.
+    """
+    # buffered autosaves must be in Mongo before grading reads them
+    flush_session(db, session["_id"])
+    keys = get_grading_keys(db, session["exam_id"])
+    answers = _load_answers(db, [session["_id"]], 100)[session["_id"]]
+    total, possible, detailed = grade_session(keys, answers)
+    needs_manual = any(r["needs_manual"] for r in detailed)
+    now = datetime.utcnow()
+    db.exam_results.update_one(
+        {"session_id": session["_id"]},
+        {"$set": {
+            "auto_score": total,
+            "possible_score": possible,
+            "detailed": detailed,
+            "graded": not needs_manual,
+            "grading_status": "graded",
+            "graded_at": now,
+            "updated_at": now,
+        }},
+    )
+    return {"auto_score": total, "possible_score": possible, "needs_manual_review": needs_manual}
+
+
+def grade_exam(db, exam_id, statuses=("submitted",), chunk_size=1000):
+    """
+    Re-grade every session of an exam in the given statuses and write the results back,
+    one bulk_write per chunk of sessions. Returns the number of sessions graded.
+    """
+    keys = get_grading_keys(db, exam_id)
+    sessions = list(db.exam_sessions.find(
+        {"exam_id": keys.exam_id, "status": {"$in": list(statuses)}}, {"_id": 1, "user_id": 1}
+    ).sort("_id", 1))
+    graded = 0
+    for start in range(0, len(sessions), chunk_size):
+        graded += write_results(db, keys, sessions[start:start + chunk_size])
+    _count("runs")
+    logger.info(f"Batch graded {graded} sessions of exam {keys.exam_id}")
+    return graded
+
+
+def batch_grading_stats():
+    with _lock:
+        return {**_stats, "numpy": _numpy() is not None}
@@ -1,15 +1,29 @@
-import cloudinary
-import cloudinary.uploader
 import os
+from threading import Lock
+
+_configured = False
+_config_lock = Lock()
+
+
+def get_uploader():
+    """Import and configure the cloudinary SDK on first upload instead of at app start."""
+    global _configured
+    import cloudinary
+    import cloudinary.uploader
+    if not _configured:
+        with _config_lock:
+            if not _configured:
+                cloudinary.config(
+                    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+                    api_key=os.getenv("CLOUDINARY_API_KEY"),
+                    api_secret=os.getenv("CLOUDINARY_API_SECRET")
+                )
+                _configured = True
+    return cloudinary.uploader
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
 
 def upload_media(file, folder="whisper_exams"):
-    upload_result = cloudinary.uploader.upload(
+    upload_result = get_uploader().upload(
         file,
         folder=folder,
         resource_type="auto"
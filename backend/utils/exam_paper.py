@@ -0,0 +1,189 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+from flask import Response, current_app, request
+
+from backend.utils.question_cache import get_question_index, version_token
+from backend.utils.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# A "paper" is the student-facing question list of one exam version, serialized and
+# compressed once. Workers keep recent papers in memory and share them through files in
+# EXAM_PAPER_DIR:  <exam_id>_<version>.json / .json.gz / .json.br
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_local = OrderedDict()
+_lock = Lock()
+_stats = {"memory_hits": 0, "disk_loads": 0, "compiles": 0, "not_modified": 0}
+
+
+class Paper:
+    __slots__ = ("exam_id", "version", "etag", "bodies")
+
+    def __init__(self, exam_id, version, bodies):
+        self.exam_id = exam_id
+        self.version = version
+        self.bodies = bodies  # encoding ("identity", "gzip", "br") -> bytes
+        self.etag = hashlib.sha256(bodies["identity"]).hexdigest()[:32]
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _paper_dir():
+    path = _config("EXAM_PAPER_DIR", None) or os.path.join(tempfile.gettempdir(), "exam_papers")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _base_path(exam_id, version):
+    return os.path.join(_paper_dir(), f"{exam_id}_{re.sub(r'[^0-9A-Za-z]', '', version)}.json")
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _remember(paper):
+    key = (paper.exam_id, paper.version)
+    with _lock:
+        _local[key] = paper
+        _local.move_to_end(key)
+        while len(_local) > _config("EXAM_PAPER_CACHE_SIZE", 64):
+            _local.popitem(last=False)
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def compile_paper(db, exam):
+    """
+    Serialize and compress the delivered questions for the exam's current version and store
+    them in memory and on disk. Called on publish and on question edits to a published exam.
+    """
+    index = get_question_index(db, exam)
+    exam_id, version = str(index.exam_id), index.version_token
+    body = json.dumps(
+        {"exam_id": exam_id, "version": version, "questions": index.delivered()},
+        separators=(",", ":"), default=str,
+    ).encode("utf-8")
+
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=11)
+    paper = Paper(exam_id, version, bodies)
+
+    base = _base_path(exam_id, version)
+    try:
+        for stale in os.listdir(_paper_dir()):
+            if stale.startswith(f"{exam_id}_") and not stale.startswith(os.path.basename(base)):
+                os.remove(os.path.join(_paper_dir(), stale))
+        for encoding, suffix in ENCODINGS:
+            if encoding in bodies:
+                _write_atomic(base + suffix, bodies[encoding])
+        # identity last: its presence marks the set as complete
+        _write_atomic(base, body)
+    except OSError as e:
+        logger.warning(f"Exam paper for {exam_id} not written to disk: {e}")
+
+    _remember(paper)
+    with _lock:
+        _stats["compiles"] += 1
+    logger.info(f"Compiled exam paper {exam_id} v{version} ({len(body)} bytes, etag {paper.etag})")
+    return paper
+
+
+def _load_from_disk(exam_id, version):
+    base = _base_path(exam_id, version)
+    try:
+        with open(base, "rb") as fh:
+            bodies = {"identity": fh.read()}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(base + suffix):
+                with open(base + suffix, "rb") as fh:
+                    bodies[encoding] = fh.read()
+    except OSError:
+        return None
+    return Paper(exam_id, version, bodies)
+
+
+def get_paper(db, exam):
+    """Paper for the exam document's current `updated_at`: memory, then disk, then compile."""
+    exam_id = str(exam["_id"])
+    version = version_token(exam.get("updated_at"))
+    with _lock:
+        paper = _local.get((exam_id, version))
+        if paper is not None:
+            _local.move_to_end((exam_id, version))
+            _stats["memory_hits"] += 1
+            return paper
+
+    return _load_or_compile(db, exam, exam_id, version)
+
+
+@single_flight("exam_paper", key_func=lambda db, exam, exam_id, version: f"{exam_id}:{version}", copy_result=False)
+def _load_or_compile(db, exam, exam_id, version):
+    paper = _load_from_disk(exam_id, version)
+    if paper is not None:
+        _remember(paper)
+        with _lock:
+            _stats["disk_loads"] += 1
+        return paper
+    return compile_paper(db, exam)
+
+
+def send_paper(paper, headers=None):
+    """
+    Serve the precompiled bytes: 304 on a matching If-None-Match, otherwise the best
+    encoding the client accepts. Weak ETag, so every encoding revalidates against it.
+    """
+    etag = f'W/"{paper.etag}"'
+    common = {
+        "ETag": etag,
+        "Cache-Control": _config("EXAM_PAPER_CACHE_CONTROL", "private, no-cache"),
+        "Vary": "Accept-Encoding, Authorization",
+        **(headers or {}),
+    }
+
+    if request.if_none_match.contains_weak(paper.etag):
+        with _lock:
+            _stats["not_modified"] += 1
+        return Response(status=304, headers=common)
+
+    accepted = request.accept_encodings
+    encoding = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in paper.bodies and accepted[candidate]:
+            encoding = candidate
+            break
+
+    response = Response(paper.bodies[encoding], mimetype="application/json", headers=common)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def exam_paper_stats():
+    with _lock:
+        return {**_stats, "papers_cached": len(_local), "brotli": _brotli() is not None}
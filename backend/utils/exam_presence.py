@@ -0,0 +1,305 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app
+
+from backend.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Who is in an exam right now, answered from redis instead of scanning exam_sessions:
+#   exam_presence:<exam_id>          zset session_id -> last_seen (ms), refreshed by heartbeats
+#   exam_presence_state:<session_id> hash {exam_id, user_id, started_at, violation_count,
+#                                    connections, last_seen, question, visible}
+# A member is online while it heartbeats, idle after EXAM_PRESENCE_IDLE_SECONDS of silence and
+# disconnected after EXAM_PRESENCE_DISCONNECT_SECONDS (or once its last socket closed). Members
+# silent for EXAM_PRESENCE_STALE_SECONDS are swept on read; submitted sessions leave at once.
+PRESENCE_PREFIX = "exam_presence:"
+STATE_PREFIX = "exam_presence_state:"
+
+# client-reported fields kept on the state hash (anything else in a heartbeat is ignored)
+CLIENT_FIELDS = ("question", "visible")
+
+# KEYS: state hash, exam zset; ARGV: exam_id, session_id, now ms, ttl seconds, then field/value
+# pairs -> 1, or 0 when the session has no presence in that exam (the caller joins it)
+_HEARTBEAT_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'exam_id') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'last_seen', ARGV[3])
+for i = 5, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+# KEYS: state hash; ARGV: field, increment -> new value, or nil without presence
+_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+return redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+"""
+
+# session_id -> exam_id, so heartbeats can name the exam zset in KEYS without a lookup
+_exam_of = {}
+EXAM_OF_MAX = 10000
+
+_lock = Lock()
+_stats = {"joins": 0, "heartbeats": 0, "rejoins": 0, "leaves": 0, "removed": 0, "swept": 0, "errors": 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _ms_to_datetime(ms):
+    return datetime(1970, 1, 1) + timedelta(milliseconds=int(ms))
+
+
+def _stale_seconds():
+    return int(_config("EXAM_PRESENCE_STALE_SECONDS", 1800))
+
+
+def _remember_exam(session_id, exam_id):
+    with _lock:
+        if len(_exam_of) >= EXAM_OF_MAX:
+            _exam_of.clear()
+        _exam_of[str(session_id)] = str(exam_id)
+
+
+def _exam_id(client, session_id):
+    with _lock:
+        exam_id = _exam_of.get(str(session_id))
+    if exam_id is None:
+        exam_id = _decode(client.hget(f"{STATE_PREFIX}{session_id}", "exam_id"))
+        if exam_id:
+            _remember_exam(session_id, exam_id)
+    return exam_id
+
+
+def join(session, connections=1):
+    """
+    Seed a session's presence from its document and count one socket connection (or none
+    when the exam starts, so it shows as disconnected until the client connects).
+    """
+    client = get_redis()
+    if not client:
+        return False
+    sid, exam_id = str(session["_id"]), str(session["exam_id"])
+    state_key, now, ttl = f"{STATE_PREFIX}{sid}", _now_ms(), _stale_seconds()
+    started_at = session.get("started_at")
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(state_key, mapping={
+            "exam_id": exam_id,
+            "user_id": str(session.get("user_id")),
+            "started_at": started_at.isoformat() if isinstance(started_at, datetime) else "",
+            "violation_count": int(session.get("violation_count", 0)),
+            "last_seen": now,
+        })
+        pipe.hincrby(state_key, "connections", connections)
+        pipe.expire(state_key, ttl)
+        pipe.zadd(f"{PRESENCE_PREFIX}{exam_id}", {sid: now})
+        pipe.expire(f"{PRESENCE_PREFIX}{exam_id}", ttl)
+        pipe.execute()
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"Exam presence join failed for {sid}: {e}")
+        return False
+    _remember_exam(sid, exam_id)
+    _count("joins")
+    return True
+
+
+def heartbeat(session_id, data=None):
+    """
+    Refresh a session's last_seen (and the client fields it sent) in one round trip.
+    Returns False when the session has no presence yet or redis is unavailable.
+    """
+    client = get_redis()
+    if not client:
+        return False
+    args = []
+    for field in CLIENT_FIELDS:
+        if data and data.get(field) is not None:
+            args += [field, str(data[field])[:64]]
+    try:
+        exam_id = _exam_id(client, session_id)
+        if not exam_id:
+            return False
+        keys = [f"{STATE_PREFIX}{session_id}", f"{PRESENCE_PREFIX}{exam_id}"]
+        found = client.eval(_HEARTBEAT_SCRIPT, 2, *keys, exam_id, str(session_id), _now_ms(), _stale_seconds(), *args)
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"Exam presence heartbeat failed for {session_id}: {e}")
+        return False
+    if found:
+        _count("heartbeats")
+    return bool(found)
+
+
+def rejoin(db, session_id, data=None):
+    """Heartbeat, re-seeding presence from Mongo once if it expired or was never joined."""
+    from bson import ObjectId
+
+    if heartbeat(session_id, data):
+        return True
+    if get_redis() is None:
+        return False
+    session = db.exam_sessions.find_one(
+        {"_id": ObjectId(str(session_id)), "status": "in_progress"},
+        {"_id": 1, "exam_id": 1, "user_id": 1, "started_at": 1, "violation_count": 1},
+    )
+    if not session or not join(session):
+        return False
+    _count("rejoins")
+    return heartbeat(session_id, data)
+
+
+def leave(session_id):
+    """One of the session's sockets closed; it shows as disconnected once none are left."""
+    client = get_redis()
+    if not client:
+        return
+    try:
+        client.eval(_INCR_SCRIPT, 1, f"{STATE_PREFIX}{session_id}", "connections", -1)
+        _count("leaves")
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"Exam presence leave failed for {session_id}: {e}")
+
+
+def record_violation(session_id, n=1):
+    """Mirror a violation_count increment onto the presence state (no-op without presence)."""
+    client = get_redis()
+    if not client:
+        return
+    try:
+        client.eval(_INCR_SCRIPT, 1, f"{STATE_PREFIX}{session_id}", "violation_count", n)
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"Exam presence violation update failed for {session_id}: {e}")
+
+
+def remove_sessions(sessions):
+    """Drop submitted sessions (documents with _id and exam_id) from their exams' presence."""
+    client = get_redis()
+    if not client or not sessions:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for session in sessions:
+            pipe.zrem(f"{PRESENCE_PREFIX}{session['exam_id']}", str(session["_id"]))
+            pipe.delete(f"{STATE_PREFIX}{session['_id']}")
+        pipe.execute()
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"Exam presence removal failed for {len(sessions)} sessions: {e}")
+        return
+    with _lock:
+        for session in sessions:
+            _exam_of.pop(str(session["_id"]), None)
+    _count("removed", len(sessions))
+
+
+def classify(last_seen_ms, connections, now_ms=None):
+    """'online', 'idle' or 'disconnected' from the last heartbeat and open socket count."""
+    age = ((now_ms or _now_ms()) - last_seen_ms) / 1000
+    if connections <= 0 or age > int(_config("EXAM_PRESENCE_DISCONNECT_SECONDS", 90)):
+        return "disconnected"
+    if age > int(_config("EXAM_PRESENCE_IDLE_SECONDS", 30)):
+        return "idle"
+    return "online"
+
+
+def live_sessions(exam_id):
+    """
+    Present sessions of an exam, most recently seen first, each with its state and presence
+    status; stale members are swept first. None when redis is unavailable.
+    """
+    client = get_redis()
+    if not client:
+        return None
+    key, now = f"{PRESENCE_PREFIX}{exam_id}", _now_ms()
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.zremrangebyscore(key, "-inf", now - _stale_seconds() * 1000)
+        pipe.zrevrange(key, 0, -1, withscores=True)
+        swept, members = pipe.execute()
+        pipe = client.pipeline(transaction=False)
+        for sid, _ in members:
+            pipe.hgetall(f"{STATE_PREFIX}{_decode(sid)}")
+        states = pipe.execute()
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"Exam presence read failed for exam {exam_id}: {e}")
+        return None
+    if swept:
+        _count("swept", swept)
+
+    sessions, orphaned = [], []
+    for (sid, score), state in zip(members, states):
+        sid = _decode(sid)
+        if not state:
+            orphaned.append(sid)
+            continue
+        state = {_decode(k): _decode(v) for k, v in state.items()}
+        last_seen = int(score)
+        sessions.append({
+            "session_id": sid,
+            "user_id": state.get("user_id"),
+            "started_at": state.get("started_at") or None,
+            "violation_count": int(state.get("violation_count") or 0),
+            "last_seen": _ms_to_datetime(last_seen),
+            "last_seen_ms": last_seen,
+            "presence": classify(last_seen, int(state.get("connections") or 0), now),
+            **{field: state[field] for field in CLIENT_FIELDS if field in state},
+        })
+    if orphaned:
+        client.zrem(key, *orphaned)
+    return sessions
+
+
+def presence_summary(sessions):
+    """Counts per presence status for a live_sessions() result."""
+    summary = {"online": 0, "idle": 0, "disconnected": 0}
+    for session in sessions:
+        summary[session["presence"]] += 1
+    return summary
+
+
+def student_names(db, user_ids):
+    """user_id -> name for the given ids, in one _id lookup."""
+    from bson import ObjectId
+
+    ids = [ObjectId(uid) for uid in set(user_ids) if uid and ObjectId.is_valid(uid)]
+    if not ids:
+        return {}
+    return {str(u["_id"]): u.get("name") or "Unknown" for u in db.users.find({"_id": {"$in": ids}}, {"name": 1})}
+
+
+def exam_presence_stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,136 @@
+import logging
+
+from flask import current_app
+
+from backend.extensions import get_redis
+from backend.utils.answer_buffer import merge_pending
+
+logger = logging.getLogger(__name__)
+
+# exam_progress:<session_id>       hash {version, answered, total}
+# exam_progress_bits:<session_id>  bitset, bit = question position in the QuestionIndex
+# `version` is the question index version the bit positions refer to; when the exam's
+# questions change mid-session the bitset is rebuilt from exam_answers once.
+PROGRESS_PREFIX = "exam_progress:"
+BITS_PREFIX = "exam_progress_bits:"
+
+# KEYS: progress hash, bitset
+# ARGV: version, ttl seconds, then (position, state) pairs with state 1 = answered, 0 = empty
+# -> answered count, or -1 when the stored bitset belongs to another version (or is missing)
+_APPLY_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'version') ~= ARGV[1] then
+    return -1
+end
+local delta = 0
+for i = 3, #ARGV, 2 do
+    local state = tonumber(ARGV[i + 1])
+    local old = redis.call('SETBIT', KEYS[2], tonumber(ARGV[i]), state)
+    if old ~= state then
+        delta = delta + (state == 1 and 1 or -1)
+    end
+end
+local answered = redis.call('HINCRBY', KEYS[1], 'answered', delta)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return answered
+"""
+
+# KEYS: progress hash, bitset
+# ARGV: version, total, ttl seconds, then answered positions
+_SEED_SCRIPT = """
+redis.call('DEL', KEYS[1], KEYS[2])
+for i = 4, #ARGV do
+    redis.call('SETBIT', KEYS[2], tonumber(ARGV[i]), 1)
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'answered', #ARGV - 3, 'total', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+if #ARGV > 3 then
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+return #ARGV - 3
+"""
+
+
+def is_answered(value):
+    """An answer counts towards progress unless it is None or an empty string/list/dict."""
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return bool(value.strip())
+    if isinstance(value, (list, dict)):
+        return bool(value)
+    return True
+
+
+def _ttl():
+    return current_app.config.get("EXAM_PROGRESS_TTL_SECONDS", 86400)
+
+
+def _keys(session_id):
+    return [f"{PROGRESS_PREFIX}{session_id}", f"{BITS_PREFIX}{session_id}"]
+
+
+def _answered_positions(db, session_id, index):
+    positions = []
+    answers = list(db.exam_answers.find({"session_id": session_id}, {"question_id": 1, "answer": 1, "buffer_seq": 1}))
+    for doc in merge_pending(session_id, answers):
+        question = index.get(doc["question_id"])
+        if question is not None and is_answered(doc.get("answer")):
+            positions.append(question["position"])
+    return positions
+
+
+def init_progress(session_id, index, positions=()):
+    """Start a session's counters (empty at exam start). Fails open without redis."""
+    client = get_redis()
+    if not client:
+        return None
+    try:
+        return client.eval(
+            _SEED_SCRIPT, 2, *_keys(session_id), index.version_token, len(index), _ttl(), *positions
+        )
+    except Exception as e:
+        logger.warning(f"Exam progress seed failed for {session_id}: {e}")
+        return None
+
+
+def record_answers(db, session_id, index, changes):
+    """
+    Apply (question, answered) transitions and return the session's answered count.
+    Only empty <-> non-empty flips move the counter, atomically in one redis call. If the
+    counters are missing or were built for another question version they are rebuilt from
+    exam_answers once; without redis this falls back to counting documents.
+    """
+    client = get_redis()
+    if client:
+        args = []
+        for question, answered in changes:
+            args += [question["position"], 1 if answered else 0]
+        keys = _keys(session_id)
+        try:
+            answered = client.eval(_APPLY_SCRIPT, 2, *keys, index.version_token, _ttl(), *args)
+            if answered >= 0:
+                return answered
+            # the answers are already written, so the rebuilt bitset includes this batch
+            seeded = init_progress(session_id, index, _answered_positions(db, session_id, index))
+            if seeded is not None:
+                return seeded
+        except Exception as e:
+            logger.warning(f"Exam progress update failed for {session_id}: {e}")
+
+    return len(_answered_positions(db, session_id, index))
+
+
+def get_progress(session_id):
+    """(answered, total) from redis, or None when the session has no counters."""
+    client = get_redis()
+    if not client:
+        return None
+    try:
+        answered, total = client.hmget(f"{PROGRESS_PREFIX}{session_id}", "answered", "total")
+    except Exception as e:
+        logger.warning(f"Exam progress read failed for {session_id}: {e}")
+        return None
+    if answered is None:
+        return None
+    return int(answered), int(total or 0)
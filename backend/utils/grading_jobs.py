@@ -0,0 +1,220 @@
+import logging
+from datetime import datetime, timedelta
+from threading import Lock
+
+from bson import ObjectId
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+
+from backend.utils.batch_grading import write_results
+from backend.utils.grading_keys import get_grading_keys
+from backend.utils.question_cache import get_question_index
+
+logger = logging.getLogger(__name__)
+
+# A grading job re-grades one exam version in session chunks (grading_jobs collection):
+#   chunks       [{first_id, last_id, sessions}], contiguous _id ranges of exam_sessions
+#   done_chunks  indexes already written; the checkpoint a resumed or retried job skips
+#   graded       sessions written so far
+# Every chunk write is a deterministic $set per session, so a chunk that runs twice (task
+# retry, redelivery after a worker crash) changes nothing. A partial unique index (migration 5)
+# allows one ACTIVE job per (exam_id, version), so concurrent starts cannot both insert.
+ACTIVE = ("queued", "running", "failed")
+STATUSES = ("submitted",)
+
+_lock = Lock()
+_stats = {"jobs_created": 0, "jobs_resumed": 0, "chunks_graded": 0, "chunks_skipped": 0, "chunk_failures": 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _chunk_bounds(db, exam_id, chunk_size):
+    chunks, current = [], []
+    cursor = db.exam_sessions.find(
+        {"exam_id": exam_id, "status": {"$in": list(STATUSES)}}, {"_id": 1}
+    ).sort("_id", 1).batch_size(chunk_size)
+    for session in cursor:
+        current.append(session["_id"])
+        if len(current) == chunk_size:
+            chunks.append({"first_id": current[0], "last_id": current[-1], "sessions": len(current)})
+            current = []
+    if current:
+        chunks.append({"first_id": current[0], "last_id": current[-1], "sessions": len(current)})
+    return chunks
+
+
+def start_job(db, exam_id, created_by=None):
+    """
+    Job to (re-)grade the exam: an unfinished job for the same question version is reused,
+    a failed one is resumed from its checkpoint. Returns (job, dispatch), where dispatch says
+    whether the caller must queue the job's pending chunks.
+    """
+    exam_id = ObjectId(str(exam_id))
+    version = get_question_index(db, exam_id).version_token
+    existing = db.grading_jobs.find_one(
+        {"exam_id": exam_id, "status": {"$in": list(ACTIVE)}}, sort=[("created_at", -1)]
+    )
+    if existing and existing.get("version") == version:
+        stalled_at = datetime.utcnow() - timedelta(seconds=_config("GRADING_JOB_STALL_SECONDS", 600))
+        # a job nobody checkpointed for a while lost its tasks (e.g. the broker was flushed)
+        if existing["status"] != "failed" and existing["updated_at"] > stalled_at:
+            return existing, False
+        db.grading_jobs.update_one(
+            {"_id": existing["_id"]},
+            {"$set": {"status": "queued", "error": None, "updated_at": datetime.utcnow()}},
+        )
+        existing["status"] = "queued"
+        _count("jobs_resumed")
+        logger.info(f"Resuming grading job {existing['_id']} at {len(existing['done_chunks'])}/{len(existing['chunks'])} chunks")
+        return existing, True
+    if existing:
+        # questions changed since: the old job's results are superseded by this one
+        db.grading_jobs.update_one(
+            {"_id": existing["_id"], "status": {"$in": list(ACTIVE)}}, {"$set": {"status": "superseded"}}
+        )
+
+    chunks = _chunk_bounds(db, exam_id, _config("GRADING_CHUNK_SIZE", 500))
+    now = datetime.utcnow()
+    job = {
+        "_id": ObjectId(),
+        "exam_id": exam_id,
+        "version": version,
+        "status": "queued",
+        "chunks": chunks,
+        "done_chunks": [],
+        "total": sum(c["sessions"] for c in chunks),
+        "graded": 0,
+        "error": None,
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+    try:
+        db.grading_jobs.insert_one(job)
+    except DuplicateKeyError:
+        # a concurrent start for the same version inserted first; its caller dispatches it
+        winner = db.grading_jobs.find_one({"exam_id": exam_id, "version": version, "status": {"$in": list(ACTIVE)}})
+        if winner is None:
+            raise
+        return winner, False
+    _count("jobs_created")
+    return job, True
+
+
+def pending_chunks(job):
+    done = set(job.get("done_chunks", []))
+    return [i for i in range(len(job["chunks"])) if i not in done]
+
+
+def run_chunk(db, job_id, index):
+    """Grade one chunk and checkpoint it. Returns sessions written (0 if already done)."""
+    job = db.grading_jobs.find_one({"_id": ObjectId(str(job_id))})
+    if not job or index in job["done_chunks"] or job["status"] == "superseded":
+        _count("chunks_skipped")
+        return 0
+
+    now = datetime.utcnow()
+    if job["status"] == "queued":
+        db.grading_jobs.update_one(
+            {"_id": job["_id"], "status": "queued"},
+            {"$set": {"status": "running", "updated_at": now, "started_at": job.get("started_at") or now}},
+        )
+    chunk = job["chunks"][index]
+    sessions = list(db.exam_sessions.find(
+        {
+            "exam_id": job["exam_id"],
+            "status": {"$in": list(STATUSES)},
+            "_id": {"$gte": chunk["first_id"], "$lte": chunk["last_id"]},
+        },
+        {"_id": 1, "user_id": 1},
+    ))
+    written = write_results(db, get_grading_keys(db, job["exam_id"]), sessions)
+
+    # the $ne guard makes the checkpoint count each chunk once, however often it ran
+    db.grading_jobs.update_one(
+        {"_id": job["_id"], "done_chunks": {"$ne": index}},
+        {
+            "$addToSet": {"done_chunks": index},
+            "$inc": {"graded": written},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+    )
+    _count("chunks_graded")
+    return written
+
+
+def fail_job(db, job_id, index, error):
+    _count("chunk_failures")
+    db.grading_jobs.update_one(
+        {"_id": ObjectId(str(job_id))},
+        {"$set": {"status": "failed", "error": f"chunk {index}: {error}", "updated_at": datetime.utcnow()}},
+    )
+
+
+def finish_job(db, job_id):
+    """Mark the job completed once every chunk is checkpointed."""
+    job = db.grading_jobs.find_one({"_id": ObjectId(str(job_id))})
+    if not job or job["status"] in ("completed", "superseded"):
+        return job
+    if pending_chunks(job):
+        logger.warning(f"Grading job {job_id} finished with {len(pending_chunks(job))} chunks pending")
+        return job
+    now = datetime.utcnow()
+    db.grading_jobs.update_one(
+        {"_id": job["_id"]},
+        {"$set": {
+            "status": "completed",
+            "started_at": job.get("started_at") or now,
+            "finished_at": now,
+            "updated_at": now,
+        }},
+    )
+    job.update(status="completed", finished_at=now)
+    logger.info(f"Grading job {job_id} completed: {job['graded']} sessions of exam {job['exam_id']}")
+    return job
+
+
+def find_job(db, job_id):
+    return db.grading_jobs.find_one({"_id": ObjectId(str(job_id))})
+
+
+def job_progress(job):
+    """Client view of a job, with percent complete weighted by chunk size."""
+    done = set(job.get("done_chunks", []))
+    done_sessions = sum(c["sessions"] for i, c in enumerate(job["chunks"]) if i in done)
+    total = job.get("total", 0)
+    if total:
+        percent = round(100 * done_sessions / total, 1)
+    else:
+        percent = 100.0 if job["status"] == "completed" else 0.0
+    return {
+        "job_id": str(job["_id"]),
+        "exam_id": str(job["exam_id"]),
+        "status": job["status"],
+        "percent": percent,
+        "graded_sessions": job.get("graded", 0),
+        "total_sessions": total,
+        "chunks_done": len(done),
+        "chunks_total": len(job["chunks"]),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "started_at": job["started_at"].isoformat() if job.get("started_at") else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+    }
+
+
+def grading_job_stats():
+    with _lock:
+        return dict(_stats)
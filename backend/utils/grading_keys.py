@@ -0,0 +1,228 @@
+import logging
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from threading import Lock
+
+from flask import current_app
+
+from backend.models.question import normalize_answer
+from backend.utils.question_cache import get_question_index
+from backend.utils.security import decrypt_answer
+from backend.utils.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE = Decimal("1e-6")
+
+# (exam_id, version) -> (expires_at, ExamGradingKeys). Holds decrypted answer keys, so entries
+# are short-lived (GRADING_KEY_TTL_SECONDS), bounded and dropped on any question edit.
+_local = OrderedDict()
+_lock = Lock()
+_stats = {"hits": 0, "compiles": 0, "decrypted": 0, "decrypt_errors": 0, "invalidations": 0}
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def to_number(value):
+    """Decimal for numeric answers ("3.50", 7, 2.5), None for anything else."""
+    if isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return Decimal(str(value))
+        if isinstance(value, str):
+            return Decimal(value.strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return None
+
+
+class GradingKey:
+    """One question's answer key, decrypted and pre-normalized for every check the graders run."""
+
+    __slots__ = (
+        "question_id", "type", "points", "allow_partial", "answer_hash", "encrypted",
+        "answer", "candidates", "normalized", "normalized_set", "normalized_candidates",
+        "boolean", "numbers", "tolerance",
+    )
+
+    def __init__(self, question):
+        self.question_id = str(question["_id"])
+        self.type = question.get("type")
+        self.points = question.get("points", 1)
+        self.allow_partial = question.get("allow_partial", False)
+        self.answer_hash = question.get("answer_key_hash")
+        self.encrypted = question.get("answer_key_encrypted")
+
+        self.answer = None
+        if self.encrypted:
+            try:
+                self.answer = decrypt_answer(self.encrypted)
+            except Exception as e:
+                logger.warning(f"Failed to decrypt answer key for question {self.question_id}: {e}")
+
+        answer = self.answer
+        self.candidates = answer if isinstance(answer, list) else ([] if answer is None else [answer])
+        normalized = normalize_answer(answer) if answer is not None else None
+        self.normalized_set = None
+        if isinstance(normalized, list):
+            try:
+                self.normalized_set = frozenset(normalized)
+                normalized = sorted(normalized)
+            except TypeError:
+                # dict options: exact comparison only
+                pass
+        self.normalized = normalized
+        self.normalized_candidates = [normalize_answer(c) for c in self.candidates]
+        self.boolean = str(answer).lower() if answer is not None else None
+        self.numbers = [n for n in (to_number(c) for c in self.candidates) if n is not None]
+        tolerance = to_number(((question.get("meta") or {}).get("tolerance")))
+        self.tolerance = tolerance if tolerance is not None else DEFAULT_TOLERANCE
+
+    @property
+    def has_key(self):
+        return self.answer is not None
+
+
+class ExamGradingKeys:
+    __slots__ = ("exam_id", "version", "by_id", "order")
+
+    def __init__(self, index):
+        self.exam_id = index.exam_id
+        self.version = index.version_token
+        self.order = [GradingKey(q) for q in index.order]
+        self.by_id = {key.question_id: key for key in self.order}
+
+    def get(self, question_id):
+        return self.by_id.get(str(question_id))
+
+
+def get_grading_keys(db, exam):
+    """Compiled keys for the exam's current question version (exam document or id)."""
+    index = get_question_index(db, exam)
+    cache_key = (str(index.exam_id), index.version_token)
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(cache_key)
+        if entry is not None and entry[0] > now:
+            _local.move_to_end(cache_key)
+            _stats["hits"] += 1
+            return entry[1]
+    return _compile(index, cache_key)
+
+
+@single_flight("grading_keys", key_func=lambda index, cache_key: f"{cache_key[0]}:{cache_key[1]}", copy_result=False)
+def _compile(index, cache_key):
+    keys = ExamGradingKeys(index)
+    ttl = _config("GRADING_KEY_TTL_SECONDS", 300)
+    decrypted = sum(1 for key in keys.order if key.has_key)
+    with _lock:
+        _stats["compiles"] += 1
+        _stats["decrypted"] += decrypted
+        _stats["decrypt_errors"] += sum(1 for key in keys.order if key.encrypted) - decrypted
+        for stale in [k for k in _local if k[0] == cache_key[0]]:
+            del _local[stale]
+        _local[cache_key] = (time.monotonic() + ttl, keys)
+        while len(_local) > _config("GRADING_KEY_CACHE_SIZE", 64):
+            _local.popitem(last=False)
+    return keys
+
+
+def grading_key_for(question):
+    """
+    Key for a single question document: from the exam's compiled keys when they match the
+    stored ciphertext, otherwise compiled on the spot.
+    """
+    exam_id = question.get("exam_id")
+    if exam_id is not None:
+        try:
+            key = get_grading_keys(current_app.mongo.db, exam_id).get(question["_id"])
+            if key is not None and key.encrypted == question.get("answer_key_encrypted"):
+                return key
+        except RuntimeError:
+            pass
+    return GradingKey(question)
+
+
+def invalidate_grading_keys(exam_id):
+    exam_id = str(exam_id)
+    with _lock:
+        for stale in [k for k in _local if k[0] == exam_id]:
+            del _local[stale]
+        _stats["invalidations"] += 1
+
+
+def grade_answer(key, user_answer):
+    """
+    Auto-grade one stored answer against a compiled key.
+    Returns (awarded, needs_manual).
+    """
+    qtype, points = key.type, key.points
+
+    if qtype == "mcq":
+        if not key.has_key:
+            return 0, False
+        given = normalize_answer(user_answer)
+        if isinstance(given, list):
+            if not all(isinstance(item, str) for item in given):
+                # dict / nested selections can't be ordered or counted as options
+                return (points if given == key.normalized else 0), False
+            given = sorted(given)
+        if given == key.normalized:
+            return points, False
+        if key.allow_partial and key.normalized_set and isinstance(given, list):
+            # share of the key's options picked, as submit_session always scored it
+            return (len(key.normalized_set.intersection(given)) / len(key.normalized)) * points, False
+        return 0, False
+
+    if qtype == "boolean":
+        if key.has_key and str(user_answer).lower() == key.boolean:
+            return points, False
+        return 0, False
+
+    if qtype in ("text", "fill_blank"):
+        # crude auto grading (any listed answer counts); can be replaced with fuzzy matching later
+        if key.has_key and normalize_answer(user_answer) in key.normalized_candidates:
+            return points, False
+        return 0, True
+
+    if qtype in ("code", "essay", "file_upload"):
+        return 0, True
+
+    return 0, False
+
+
+def grade_session(keys, answers):
+    """
+    Grade one session's answers ({question_id: answer}) against an exam's compiled keys.
+    Returns (total_score, possible_score, detailed) in the shape stored on exam_results.
+    """
+    total_score = 0
+    possible_score = 0
+    detailed = []
+    for key in keys.order:
+        possible_score += key.points
+        user_answer = answers.get(key.question_id)
+        awarded, needs_manual = grade_answer(key, user_answer)
+        detailed.append({
+            "question_id": key.question_id,
+            "type": key.type,
+            "user_answer": user_answer,
+            "correct_answer": None,     # Hide from student
+            "awarded": awarded,
+            "possible": key.points,
+            "needs_manual": needs_manual,
+        })
+        total_score += awarded
+    return total_score, possible_score, detailed
+
+
+def grading_key_stats():
+    with _lock:
+        return {**_stats, "exams_cached": len(_local)}
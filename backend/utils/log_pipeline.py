@@ -0,0 +1,235 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+
+from flask import g, has_request_context, request
+
+_lock = Lock()
+_state = {"listener": None, "handler": None}
+_stats_lock = Lock()
+_stats = {"enqueued": 0, "dropped": 0, "sampled_out": 0, "payloads_suppressed": 0}
+
+
+def _count(name):
+    # a lock of its own: filters run while configure_logging may hold _lock
+    with _stats_lock:
+        _stats[name] += 1
+
+# LOG_PROFILE picks the defaults; any LOG_* setting given explicitly wins
+PROFILES = {
+    "development": {"level": "DEBUG", "format": "text", "payloads": True},
+    "production": {"level": "INFO", "format": "json", "payloads": False},
+}
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "payload"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the request id while still on the request thread."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = g.get("request_id") if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of sub-WARNING records per logger (and its children), e.g.
+    {"backend.routes.form_response": 0.1}. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        _count("sampled_out")
+        return False
+
+
+class PayloadFilter(logging.Filter):
+    """Drop records logged with extra={"payload": True} unless payload logging is enabled."""
+
+    def filter(self, record):
+        if getattr(record, "payload", False):
+            _count("payloads_suppressed")
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueue a copy of the record with its message already rendered (as QueueHandler does), so
+    mutable arguments can't change before the listener writes it and no traceback frames stay
+    alive in the queue; the traceback travels as text in exc_text. Output formatting (JSON or
+    text) still happens on the listener thread. A full queue drops the record instead of
+    blocking the request.
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _count("enqueued")
+        except queue.Full:
+            _count("dropped")
+
+
+def _parse_rates(value):
+    rates = {}
+    for item in (value or "").split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(config, stream=None):
+    """
+    Route all logging through a bounded queue drained by one listener thread per process.
+    Safe to call again (e.g. a second create_app); the previous listener is stopped first.
+    """
+    profile = PROFILES.get(config.get("LOG_PROFILE") or "development", PROFILES["development"])
+    level = (config.get("LOG_LEVEL") or profile["level"]).upper()
+    fmt = config.get("LOG_FORMAT") or profile["format"]
+    payloads = config.get("LOG_PAYLOADS")
+    payloads = profile["payloads"] if payloads is None else payloads
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=config.get("LOG_QUEUE_SIZE", 10000)))
+    handler.addFilter(RequestContextFilter())
+    rates = _parse_rates(config.get("LOG_SAMPLE_RATES"))
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    if not payloads:
+        handler.addFilter(PayloadFilter())
+
+    with _lock:
+        _stop()
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        listener.start()
+        _state.update(listener=listener, handler=handler)
+    return handler
+
+
+def _restart_after_fork():
+    # the listener thread does not survive fork (gunicorn --preload); give the child its own
+    listener = _state["listener"]
+    if listener is not None:
+        _state["listener"] = QueueListener(listener.queue, *listener.handlers, respect_handler_level=True)
+        _state["listener"].start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _stop():
+    listener = _state["listener"]
+    if listener is not None:
+        listener.stop()
+        _state["listener"] = None
+
+
+def stop_logging():
+    """Drain the queue and join the listener thread (registered atexit)."""
+    with _lock:
+        _stop()
+
+
+atexit.register(stop_logging)
+
+
+def init_request_ids(app):
+    """Accept an incoming X-Request-ID (or mint one) and echo it on the response."""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = (request.headers.get("X-Request-ID") or uuid.uuid4().hex)[:64]
+
+    @app.after_request
+    def echo_request_id(response):
+        if g.get("request_id"):
+            response.headers["X-Request-ID"] = g.request_id
+        return response
+
+
+def logging_stats():
+    handler = _state["handler"]
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "queue_depth": handler.queue.qsize() if handler else None,
+        "pid": os.getpid(),
+    }
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import time
+import uuid
+
+from flask import current_app
+
+from backend.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: id window, id lock, ip window, ip lock
+# ARGV: now_ms, member, window_ms, id_threshold, ip_threshold, base_ms, id_max_ms, ip_max_ms
+_RECORD_FAILURE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[3])
+local base = tonumber(ARGV[6])
+local longest = 0
+for i = 0, 1 do
+    local zkey = KEYS[i * 2 + 1]
+    local lkey = KEYS[i * 2 + 2]
+    local threshold = tonumber(ARGV[4 + i])
+    local cap = tonumber(ARGV[7 + i])
+    redis.call('ZREMRANGEBYSCORE', zkey, '-inf', now - window)
+    redis.call('ZADD', zkey, now, ARGV[2])
+    redis.call('PEXPIRE', zkey, window)
+    local failures = redis.call('ZCARD', zkey)
+    if failures >= threshold then
+        local backoff = math.min(base * 2 ^ (failures - threshold), cap)
+        redis.call('SET', lkey, failures, 'PX', math.floor(backoff))
+        if backoff > longest then longest = backoff end
+    end
+end
+return math.floor(longest)
+"""
+
+
+def _keys(identifier, ip):
+    subject = hashlib.sha256(identifier.encode("utf-8")).hexdigest()[:32]
+    return (
+        f"login_fail:id:{subject}",
+        f"login_lock:id:{subject}",
+        f"login_fail:ip:{ip}",
+        f"login_lock:ip:{ip}",
+    )
+
+
+def login_retry_after(identifier, ip):
+    """
+    Seconds the caller must wait before another attempt (0 = allowed).
+    One redis round trip and no Mongo/hash work, so it runs before the user lookup.
+    Fails open when redis is unavailable.
+    """
+    client = get_redis()
+    if not client:
+        return 0
+    _, id_lock, _, ip_lock = _keys(identifier, ip)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.pttl(id_lock)
+        pipe.pttl(ip_lock)
+        ttls = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Login throttle check failed: {e}")
+        return 0
+    longest = max(ttls)
+    return int(longest / 1000) + 1 if longest > 0 else 0
+
+
+def record_login_failure(identifier, ip):
+    """
+    Count a failed attempt in both sliding windows; returns the backoff (s) now in force.
+    The per-identifier backoff grows up to LOGIN_BACKOFF_MAX_SECONDS; the per-IP one never
+    exceeds LOGIN_IP_MAX_DELAY_SECONDS, so students behind one NAT are slowed, not locked out.
+    """
+    client = get_redis()
+    if not client:
+        return 0
+    config = current_app.config
+    try:
+        backoff_ms = client.eval(
+            _RECORD_FAILURE_SCRIPT,
+            4,
+            *_keys(identifier, ip),
+            int(time.time() * 1000),
+            uuid.uuid4().hex,
+            config.get("LOGIN_FAILURE_WINDOW_SECONDS", 900) * 1000,
+            config.get("LOGIN_MAX_FAILURES_PER_IDENTIFIER", 5),
+            config.get("LOGIN_MAX_FAILURES_PER_IP", 200),
+            config.get("LOGIN_BACKOFF_BASE_SECONDS", 1) * 1000,
+            config.get("LOGIN_BACKOFF_MAX_SECONDS", 900) * 1000,
+            config.get("LOGIN_IP_MAX_DELAY_SECONDS", 5) * 1000,
+        )
+    except Exception as e:
+        logger.warning(f"Login throttle record failed: {e}")
+        return 0
+    return int(backoff_ms) // 1000
+
+
+def clear_login_failures(identifier):
+    """Reset the per-identifier window after a successful login (the IP window is left alone)."""
+    client = get_redis()
+    if not client:
+        return
+    id_window, id_lock, _, _ = _keys(identifier, "")
+    try:
+        client.delete(id_window, id_lock)
+    except Exception as e:
+        logger.warning(f"Login throttle reset failed: {e}")
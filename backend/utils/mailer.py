@@ -1,18 +1,29 @@
 import os
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
 
 BREVO_API_KEY = os.getenv("BREVO_API_KEY")
 BREVO_SENDER_NAME = os.getenv("BREVO_SENDER_NAME", "Feedback App")
 BREVO_SENDER_EMAIL = os.getenv("BREVO_SENDER_EMAIL")
 
-configuration = sib_api_v3_sdk.Configuration()
-configuration.api_key['api-key'] = BREVO_API_KEY
+# the Brevo SDK (~100ms of imports) is loaded on the first email, not at app start
+_configuration = None
+
+
+def _brevo():
+    global _configuration
+    import sib_api_v3_sdk
+    if _configuration is None:
+        configuration = sib_api_v3_sdk.Configuration()
+        configuration.api_key['api-key'] = BREVO_API_KEY
+        _configuration = configuration
+    return sib_api_v3_sdk, _configuration
+
 
 def send_email(subject, recipients, body):
     """
     Send email using Brevo (Sendinblue)
     """
+    sib_api_v3_sdk, configuration = _brevo()
+    from sib_api_v3_sdk.rest import ApiException
     try:
         api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
             sib_api_v3_sdk.ApiClient(configuration)
@@ -0,0 +1,244 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from pymongo import IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+META_COLLECTION = "schema_meta"
+META_ID = "schema"
+LOCK_SECONDS = 600
+LOCK_POLL_SECONDS = 1
+
+DAY = 24 * 60 * 60
+
+# grading_jobs.ACTIVE, kept here so migrating does not import the grading stack
+ACTIVE_GRADING_JOB_STATUSES = ("queued", "running", "failed")
+
+
+def _index(keys, **options):
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    return IndexModel(keys, **options)
+
+
+def _drop_empty_exam_session(db):
+    # indexes used to be created on `exam_session` while every query uses `exam_sessions`
+    if db.exam_session.estimated_document_count() == 0:
+        db.exam_session.drop()
+
+
+def _dedupe_exam_answers(db):
+    # keep the most recently saved answer per (session, question) so the unique index can build
+    duplicates = db.exam_answers.aggregate([
+        {"$match": {"session_id": {"$type": "objectId"}}},
+        {"$sort": {"saved_at": -1}},
+        {"$group": {
+            "_id": {"session_id": "$session_id", "question_id": "$question_id"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    stale = [oid for group in duplicates for oid in group["ids"][1:]]
+    if stale:
+        db.exam_answers.delete_many({"_id": {"$in": stale}})
+        logger.info(f"Removed {len(stale)} duplicate exam answers")
+
+
+def _supersede_duplicate_grading_jobs(db):
+    # keep the newest unfinished job per (exam, question version) so the unique index can build
+    duplicates = db.grading_jobs.aggregate([
+        {"$match": {"status": {"$in": list(ACTIVE_GRADING_JOB_STATUSES)}}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {"_id": {"exam_id": "$exam_id", "version": "$version"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ])
+    stale = [oid for group in duplicates for oid in group["ids"][1:]]
+    if stale:
+        db.grading_jobs.update_many({"_id": {"$in": stale}}, {"$set": {"status": "superseded"}})
+        logger.info(f"Superseded {len(stale)} duplicate grading jobs")
+
+
+# Ordered, append-only. Each step declares the indexes it needs, an optional `prepare(db)`
+# run before they are built and an optional `run(db)` for data changes afterwards; never edit
+# a step that has shipped, add a new one instead.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "baseline TTL, unique and query indexes",
+        "indexes": {
+            "anonymous": [_index("submitted_at", expireAfterSeconds=7 * DAY)],
+            "anonymous_links": [_index("created_at", expireAfterSeconds=7 * DAY)],
+            "feedback": [_index("created_at", expireAfterSeconds=30 * DAY), _index("link_id")],
+            "feedback_links": [_index("slug"), _index("owner")],
+            "users": [
+                _index("email", unique=True, name="unique_email"),
+                _index("name", unique=True, name="unique_name"),
+            ],
+            "used_tokens": [_index("token")],
+            "exams": [_index("code", unique=True), _index("owner_id")],
+            "exam_registration": [_index("user_id"), _index([("exam_id", 1), ("user_id", 1)])],
+            "exam_sessions": [
+                _index([("exam_id", 1), ("user_id", 1)]),
+                _index([("exam_id", 1), ("status", 1)]),
+            ],
+            "exam_questions": [_index("exam_id")],
+            "exam_results": [_index("exam_id"), _index("session_id")],
+            "invites": [_index("token"), _index([("exam_id", 1), ("status", 1)])],
+            "proctor_logs": [_index([("session_id", 1), ("timestamp", 1)])],
+            "refresh_token_audit": [_index("expires_at", expireAfterSeconds=0)],
+        },
+        "run": _drop_empty_exam_session,
+    },
+    {
+        "version": 2,
+        "description": "unique (session_id, question_id) on exam_answers for bulk upserts",
+        "prepare": _dedupe_exam_answers,
+        "indexes": {
+            # answers from the legacy /api/exam/answer/submit route carry no session_id
+            "exam_answers": [_index(
+                [("session_id", 1), ("question_id", 1)],
+                unique=True,
+                name="unique_session_question",
+                partialFilterExpression={"session_id": {"$type": "objectId"}},
+            )],
+        },
+    },
+    {
+        "version": 3,
+        "description": "grading job lookup by exam",
+        "indexes": {
+            "grading_jobs": [_index([("exam_id", 1), ("created_at", -1)])],
+        },
+    },
+    {
+        "version": 4,
+        "description": "open exam sessions by deadline for the session timer sweep",
+        "indexes": {
+            "exam_sessions": [_index([("status", 1), ("expire_at", 1)])],
+        },
+    },
+    {
+        "version": 5,
+        "description": "one unfinished grading job per exam question version",
+        "prepare": _supersede_duplicate_grading_jobs,
+        "indexes": {
+            # $in in a partial filter needs MongoDB 6.0+
+            "grading_jobs": [_index(
+                [("exam_id", 1), ("version", 1)],
+                unique=True,
+                name="unique_active_exam_version",
+                partialFilterExpression={"status": {"$in": list(ACTIVE_GRADING_JOB_STATUSES)}},
+            )],
+        },
+    },
+]
+
+LATEST_VERSION = MIGRATIONS[-1]["version"] if MIGRATIONS else 0
+
+
+def current_version(db):
+    """Schema version recorded in `schema_meta` (0 = never migrated). One indexed lookup."""
+    doc = db[META_COLLECTION].find_one({"_id": META_ID}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+def pending_migrations(db):
+    version = current_version(db)
+    return [m for m in MIGRATIONS if m["version"] > version]
+
+
+def _acquire_lock(db, owner):
+    now = datetime.utcnow()
+    db[META_COLLECTION].update_one({"_id": META_ID}, {"$setOnInsert": {"version": 0}}, upsert=True)
+    doc = db[META_COLLECTION].find_one_and_update(
+        {"_id": META_ID, "$or": [{"locked_until": {"$exists": False}}, {"locked_until": {"$lt": now}}]},
+        {"$set": {"locked_until": now + timedelta(seconds=LOCK_SECONDS), "locked_by": owner}},
+    )
+    return doc is not None
+
+
+def _release_lock(db):
+    db[META_COLLECTION].update_one({"_id": META_ID}, {"$unset": {"locked_until": "", "locked_by": ""}})
+
+
+def apply_migration(db, migration):
+    if migration.get("prepare"):
+        migration["prepare"](db)
+    for collection, models in migration.get("indexes", {}).items():
+        created = db[collection].create_indexes(models)
+        logger.info(f"Migration {migration['version']}: {collection} indexes {created}")
+    if migration.get("run"):
+        migration["run"](db)
+
+
+def upgrade(db, target=None, owner="cli", wait_seconds=0):
+    """
+    Apply pending migrations up to `target` (default: latest), recording each version as it lands.
+    Guarded by a lock on the schema_meta document so concurrent deploys don't race: while another
+    run holds it, wait up to `wait_seconds` for it, and return without applying anything as soon
+    as the schema is already at or above `target`.
+    Returns the list of applied versions.
+    """
+    target = LATEST_VERSION if target is None else target
+    deadline = time.monotonic() + wait_seconds
+    while not _acquire_lock(db, owner):
+        if current_version(db) >= target:
+            return []
+        if time.monotonic() >= deadline:
+            raise RuntimeError("Another migration run holds the schema lock")
+        time.sleep(LOCK_POLL_SECONDS)
+
+    applied = []
+    try:
+        for migration in pending_migrations(db):
+            if migration["version"] > target:
+                break
+            apply_migration(db, migration)
+            db[META_COLLECTION].update_one(
+                {"_id": META_ID},
+                {
+                    "$set": {"version": migration["version"], "updated_at": datetime.utcnow()},
+                    "$push": {"history": {
+                        "version": migration["version"],
+                        "description": migration["description"],
+                        "applied_at": datetime.utcnow(),
+                    }},
+                },
+            )
+            applied.append(migration["version"])
+    finally:
+        _release_lock(db)
+    return applied
+
+
+def check_schema_version(app):
+    """
+    Boot-time check: a single find_one on schema_meta instead of rebuilding indexes in every worker.
+    Deploys run `flask db-upgrade` once as their release step (see Procfile, Dockerfile); boot runs the
+    upgrade itself only when SCHEMA_AUTO_UPGRADE is set (local development).
+    """
+    db = app.mongo.db
+    try:
+        version = current_version(db)
+    except PyMongoError as e:
+        logger.error(f"Mongo connection failed: {e}")
+        raise
+
+    if version >= LATEST_VERSION:
+        return version
+
+    if app.config.get("SCHEMA_AUTO_UPGRADE"):
+        try:
+            upgrade(db, owner="boot")
+        except RuntimeError as e:
+            logger.warning(f"Schema auto-upgrade skipped: {e}")
+        return current_version(db)
+
+    logger.error(
+        f"Database schema is at version {version}, code expects {LATEST_VERSION}; run `flask db-upgrade`"
+    )
+    return version
@@ -0,0 +1,105 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """
+    Raised when the hashing pool and its queue are full, or a hash outlives PASSWORD_HASH_TIMEOUT;
+    map it to a 503 with Retry-After.
+    """
+
+    def __init__(self, retry_after=1):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+_lock = Lock()
+_pool = {"pid": None, "executor": None, "slots": None}
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _mp_context():
+    # hashers are started from a clean server process, never forked from a worker that already
+    # runs the log listener, revocation and rate-limit threads
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _get_pool():
+    # ProcessPoolExecutor does not survive a fork, so every (gunicorn) worker builds its own
+    with _lock:
+        if _pool["pid"] != os.getpid():
+            workers = _config("PASSWORD_HASH_WORKERS", 2)
+            queue_size = _config("PASSWORD_HASH_QUEUE_SIZE", 16)
+            _pool["executor"] = (
+                ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) if workers > 0 else None
+            )
+            _pool["slots"] = BoundedSemaphore(max(workers, 1) + queue_size)
+            _pool["pid"] = os.getpid()
+        return _pool["executor"], _pool["slots"]
+
+
+def _discard_pool(executor):
+    """Drop a broken executor (a hasher died) so the next call builds a fresh one."""
+    with _lock:
+        if _pool["executor"] is executor:
+            _pool["pid"] = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(executor, slots, fn, *args):
+    if not slots.acquire(blocking=False):
+        raise HashingBusy(retry_after=_config("PASSWORD_HASH_RETRY_AFTER", 1))
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=_config("PASSWORD_HASH_TIMEOUT", 10))
+    except FutureTimeout:
+        # the hasher keeps its slot until it finishes; the caller gets the same 503 as a full queue
+        future.cancel()
+        logger.warning("Password hash timed out in the hashing pool")
+        raise HashingBusy(retry_after=_config("PASSWORD_HASH_RETRY_AFTER", 1))
+
+
+def _run(fn, *args):
+    executor, slots = _get_pool()
+    if executor is None:
+        return fn(*args)
+    try:
+        return _submit(executor, slots, fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Password hashing pool broke; rebuilding it")
+        _discard_pool(executor)
+    # hashing is pure, so the call is simply retried once on the new pool
+    executor, slots = _get_pool()
+    return _submit(executor, slots, fn, *args)
+
+
+def hash_password(password):
+    """generate_password_hash, run in the hashing pool so PBKDF2 doesn't hold this worker's GIL."""
+    return _run(generate_password_hash, password)
+
+
+def verify_password(pwhash, password):
+    """check_password_hash, run in the hashing pool."""
+    return _run(check_password_hash, pwhash, password)
+
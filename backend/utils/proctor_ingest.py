@@ -0,0 +1,264 @@
+import atexit
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from threading import Event, Lock
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.extensions import socketio
+
+logger = logging.getLogger(__name__)
+
+# Proctoring events (socket `proctor_event`, manual flags) are buffered per worker and written
+# by one flusher every PROCTOR_FLUSH_MS, or as soon as PROCTOR_FLUSH_EVENTS are waiting:
+#   _events       proctor_logs documents in arrival order (their _id is assigned on ingest)
+#   _violations   session ObjectId -> violation_count increment not yet written
+#   _touched      session ObjectId -> latest event time, for exam_sessions.updated_at
+# A flush is one unordered insert_many plus one unordered bulk_write of $inc per session. A
+# failed flush is put back in front of newer events; re-inserting a log that did get written
+# is a duplicate-key error and skipped, so retries never log an event twice. Past
+# PROCTOR_BUFFER_MAX waiting events the producer flushes inline (back-pressure) and rejects
+# the event only if that fails too. The buffer is drained at exit.
+_events = []
+_violations = Counter()
+_touched = {}
+_lock = Lock()
+_flush_lock = Lock()
+_wake = Event()
+_state = {"app": None, "flusher_started": False}
+_stats = {
+    "ingested": 0,
+    "flushed": 0,
+    "flushes": 0,
+    "inline_flushes": 0,
+    "duplicates_skipped": 0,
+    "rejected": 0,
+    "flush_errors": 0,
+    "max_depth": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "total_flush_ms": 0.0,
+}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        app = _state["app"]
+        return app.config.get(key, default) if app is not None else default
+
+
+def _cap_details(details):
+    """Client-supplied details, kept only while their JSON stays within PROCTOR_DETAILS_MAX_BYTES."""
+    if not details:
+        return {}
+    try:
+        size = len(json.dumps(details, default=str))
+    except (TypeError, ValueError):
+        return {"truncated": True}
+    if size > int(_config("PROCTOR_DETAILS_MAX_BYTES", 2048)):
+        return {"truncated": True, "size": size}
+    return details
+
+
+def buffering_enabled():
+    return _state["app"] is not None
+
+
+def _write_direct(db, event, violation):
+    db.proctor_logs.insert_one(event)
+    update = {"$set": {"updated_at": event["timestamp"]}}
+    if violation:
+        update["$inc"] = {"violation_count": 1}
+    db.exam_sessions.update_one({"_id": event["session_id"]}, update)
+
+
+def ingest(db, session_id, event_type, details=None, violation=True):
+    """
+    Record one proctoring event for `session_id` (and a violation_count increment unless
+    violation=False). Returns False when the buffer is full and could not be drained, in which
+    case the event was not recorded. Without a running flusher the event is written directly.
+    """
+    now = datetime.utcnow()
+    event = {
+        "_id": ObjectId(),
+        "session_id": ObjectId(str(session_id)),
+        "event_type": str(event_type)[:64] if event_type is not None else None,
+        "details": _cap_details(details),
+        "timestamp": now,
+    }
+    if not buffering_enabled():
+        _write_direct(db, event, violation)
+        return True
+
+    limit = int(_config("PROCTOR_BUFFER_MAX", 10000))
+    if len(_events) >= limit:
+        # back-pressure: the producer pays for the flush instead of growing the buffer
+        _count("inline_flushes")
+        flush(db)
+        if len(_events) >= limit:
+            _count("rejected")
+            return False
+
+    with _lock:
+        _events.append(event)
+        if violation:
+            _violations[event["session_id"]] += 1
+        _touched[event["session_id"]] = now
+        depth = len(_events)
+        _stats["ingested"] += 1
+        _stats["max_depth"] = max(_stats["max_depth"], depth)
+    if depth >= int(_config("PROCTOR_FLUSH_EVENTS", 500)):
+        _wake.set()
+    _ensure_flusher()
+    return True
+
+
+def _take():
+    with _lock:
+        events, violations, touched = _events[:], dict(_violations), dict(_touched)
+        _events.clear()
+        _violations.clear()
+        _touched.clear()
+    return events, violations, touched
+
+
+def _put_back(events, violations, touched):
+    with _lock:
+        _events[:0] = events
+        _violations.update(violations)
+        for sid, ts in touched.items():
+            if _touched.get(sid) is None or _touched[sid] < ts:
+                _touched[sid] = ts
+
+
+def _insert(db, events):
+    """insert_many that treats already written logs (duplicate _id) as done."""
+    try:
+        db.proctor_logs.insert_many(events, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        _count("duplicates_skipped", len(errors))
+
+
+def flush(db):
+    """Write everything buffered so far; returns the number of events written."""
+    with _flush_lock:
+        events, violations, touched = _take()
+        if not events and not touched:
+            return 0
+        started = time.perf_counter()
+        try:
+            if events:
+                _insert(db, events)
+        except Exception as e:
+            _put_back(events, violations, touched)
+            _count("flush_errors")
+            logger.warning(f"Proctor log flush of {len(events)} events failed: {e}")
+            return 0
+        try:
+            ops = []
+            for sid, ts in touched.items():
+                update = {"$set": {"updated_at": ts}}
+                if violations.get(sid):
+                    update["$inc"] = {"violation_count": violations[sid]}
+                ops.append(UpdateOne({"_id": sid}, update))
+            db.exam_sessions.bulk_write(ops, ordered=False)
+        except Exception as e:
+            # the logs are written; only the counters are retried with the next flush
+            _put_back([], violations, touched)
+            _count("flush_errors")
+            logger.warning(f"Proctor violation counter flush for {len(touched)} sessions failed: {e}")
+
+        elapsed = (time.perf_counter() - started) * 1000
+        with _lock:
+            _stats["flushed"] += len(events)
+            _stats["flushes"] += 1
+            _stats["last_flush_ms"] = round(elapsed, 2)
+            _stats["max_flush_ms"] = round(max(_stats["max_flush_ms"], elapsed), 2)
+            _stats["total_flush_ms"] += elapsed
+        return len(events)
+
+
+def _flusher(app):
+    with app.app_context():
+        interval = app.config.get("PROCTOR_FLUSH_MS", 500) / 1000
+        while True:
+            _wake.wait(interval)
+            _wake.clear()
+            try:
+                flush(app.mongo.db)
+            except Exception as e:
+                _count("flush_errors")
+                logger.warning(f"Proctor ingest flush failed: {e}")
+
+
+def _ensure_flusher():
+    with _lock:
+        if _state["flusher_started"] or _state["app"] is None:
+            return
+        _state["flusher_started"] = True
+    socketio.start_background_task(_flusher, _state["app"])
+
+
+def start_proctor_flusher(app):
+    """Buffer proctoring events in this worker and start its flusher."""
+    _state["app"] = app
+    _ensure_flusher()
+
+
+def flush_on_exit():
+    """Drain the buffer before the process exits (registered atexit)."""
+    app = _state["app"]
+    if app is None or not (_events or _touched):
+        return
+    try:
+        with app.app_context():
+            flush(app.mongo.db)
+    except Exception as e:
+        logger.warning(f"Proctor log flush at exit failed, {len(_events)} events lost: {e}")
+
+
+atexit.register(flush_on_exit)
+
+
+def _reset_after_fork():
+    # the flusher thread does not survive fork (gunicorn --preload); the child starts its own
+    # on its first event, and never re-flushes events its parent still holds
+    global _lock, _flush_lock
+    _lock, _flush_lock = Lock(), Lock()
+    _events.clear()
+    _violations.clear()
+    _touched.clear()
+    _state["flusher_started"] = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def proctor_ingest_stats():
+    with _lock:
+        flushes = _stats["flushes"]
+        return {
+            **_stats,
+            "depth": len(_events),
+            "sessions_pending": len(_touched),
+            "avg_flush_ms": round(_stats["total_flush_ms"] / flushes, 2) if flushes else 0.0,
+            "flusher_running": _state["flusher_started"],
+        }
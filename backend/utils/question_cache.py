@@ -0,0 +1,191 @@
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from bson import ObjectId
+from flask import current_app
+
+from backend.utils.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# Fields the exam-taking routes read from a question. Everything else (created_at, meta, ...)
+# stays in Mongo.
+QUESTION_PROJECTION = {
+    "_id": 1,
+    "type": 1,
+    "prompt": 1,
+    "text": 1,
+    "points": 1,
+    "options": 1,
+    "media": 1,
+    "shuffle_options": 1,
+    "allow_partial": 1,
+    "answer_key": 1,
+    "answer_key_hash": 1,
+    "answer_key_encrypted": 1,
+    "meta.tolerance": 1,
+}
+
+# exam_id (str) -> QuestionIndex, LRU ordered
+_local = OrderedDict()
+_lock = Lock()
+_stats = {
+    "hits": 0,
+    "loads": 0,
+    "version_checks": 0,
+    "invalidations": 0,
+}
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def version_token(version):
+    """String form of an exam `updated_at`, used to key data derived from one question version."""
+    return version.isoformat() if hasattr(version, "isoformat") else str(version)
+
+
+class QuestionIndex:
+    """
+    Read-only view of one exam's questions at a given exam `updated_at`.
+    `by_id` maps the question id string to its projected document; `order` is sorted by _id so
+    every worker agrees on each question's `position` (used as its bit in progress bitsets).
+    Callers must not mutate the documents.
+    """
+
+    __slots__ = ("exam_id", "version", "by_id", "order", "checked_at", "_delivered")
+
+    def __init__(self, exam_id, version, questions):
+        self.exam_id = exam_id
+        self.version = version
+        self.order = []
+        self.by_id = {}
+        for position, q in enumerate(questions):
+            qid = str(q["_id"])
+            q["question_id"] = qid
+            q["position"] = position
+            self.order.append(q)
+            self.by_id[qid] = q
+        self.checked_at = time.monotonic()
+        self._delivered = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def get(self, question_id):
+        return self.by_id.get(str(question_id))
+
+    @property
+    def version_token(self):
+        return version_token(self.version)
+
+    def total_points(self):
+        return sum(q.get("points", 1) for q in self.order)
+
+    def delivered(self):
+        """Student-facing question list (no answer keys), built once per version."""
+        if self._delivered is None:
+            self._delivered = [
+                {
+                    "question_id": q["question_id"],
+                    "type": q["type"],
+                    "points": q.get("points", 1),
+                    "text": q.get("prompt", ""),
+                    "options": q.get("options"),
+                    "media": q.get("media"),
+                    "shuffle": q.get("shuffle_options", False),
+                    "allow_partial": q.get("allow_partial", False),
+                }
+                for q in self.order
+            ]
+        return self._delivered
+
+
+def _exam_version(db, exam_id):
+    _count("version_checks")
+    exam = db.exams.find_one({"_id": exam_id}, {"updated_at": 1})
+    return exam.get("updated_at") if exam else None
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def get_question_index(db, exam, version=None):
+    """
+    Return the QuestionIndex for an exam, loading all its questions with one query on a miss.
+
+    `exam` is an exam document or id. With a document (or an explicit `version`) the cached
+    entry is validated against the exam's `updated_at` for free; with a bare id the version is
+    re-read from `exams` at most every QUESTION_CACHE_RECHECK_SECONDS, so most requests make
+    no query at all.
+    """
+    if isinstance(exam, dict):
+        exam_id = exam["_id"]
+        if version is None:
+            version = exam.get("updated_at")
+        known = True
+    else:
+        exam_id = exam if isinstance(exam, ObjectId) else ObjectId(str(exam))
+        known = version is not None
+    key = str(exam_id)
+
+    with _lock:
+        index = _local.get(key)
+        if index is not None:
+            _local.move_to_end(key)
+
+    if index is not None:
+        if not known and time.monotonic() - index.checked_at >= _config("QUESTION_CACHE_RECHECK_SECONDS", 5):
+            version = _exam_version(db, exam_id)
+            known = True
+        if not known or index.version == version:
+            if known:
+                index.checked_at = time.monotonic()
+            _count("hits")
+            return index
+
+    if not known:
+        version = _exam_version(db, exam_id)
+    return _load_index(db, exam_id, version)
+
+
+@single_flight("question_index", key_func=lambda db, exam_id, version: f"{exam_id}:{version_token(version)}", copy_result=False)
+def _load_index(db, exam_id, version):
+    _count("loads")
+    questions = list(db.exam_questions.find({"exam_id": exam_id}, QUESTION_PROJECTION).sort("_id", 1))
+    index = QuestionIndex(exam_id, version, questions)
+    key = str(exam_id)
+
+    max_entries = _config("QUESTION_CACHE_MAX_EXAMS", 256)
+    with _lock:
+        _local[key] = index
+        _local.move_to_end(key)
+        while len(_local) > max_entries:
+            _local.popitem(last=False)
+    return index
+
+
+def invalidate_exam_questions(exam_id):
+    """
+    Drop this worker's entry for an exam. Other workers pick the change up from the exam's
+    `updated_at`, so callers must bump it in the same request.
+    """
+    with _lock:
+        _local.pop(str(exam_id), None)
+        _stats["invalidations"] += 1
+
+
+def question_cache_stats():
+    """Counters for this worker; `loads` is the number of exam_questions queries made."""
+    with _lock:
+        stats = dict(_stats)
+        stats["exams_cached"] = len(_local)
+    return stats
@@ -0,0 +1,191 @@
+import logging
+import time
+from threading import Lock
+
+from limits import parse_many
+
+from backend.extensions import get_redis, socketio
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rl:"
+
+
+class CompiledLimit:
+    """One parsed limit ("10 per minute") bound to a scope; built once when a route is decorated."""
+
+    __slots__ = ("amount", "period", "scope", "exact", "text")
+
+    def __init__(self, amount, period, scope, exact, text):
+        self.amount = amount
+        self.period = period
+        self.scope = scope
+        self.exact = exact
+        self.text = text
+
+    def __repr__(self):
+        return f"<CompiledLimit {self.scope} {self.text}{' exact' if self.exact else ''}>"
+
+
+def compile_limits(limit_string, scope, exact=False):
+    """Parse "5 per minute" / "100/minute" / "2000 per day;200 per hour" into CompiledLimits."""
+    return [
+        CompiledLimit(item.amount, item.get_expiry(), scope, exact, str(item))
+        for item in parse_many(limit_string)
+    ]
+
+
+# (limit, key) -> [window, global_used, local_pending]
+# global_used is the window total redis reported at the last sync (it already includes this
+# worker's synced hits); local_pending are hits not pushed yet. CompiledLimits are created once
+# per route, so the object itself is a stable, cheap-to-hash part of the key.
+_counters = {}
+_dirty = set()
+_lock = Lock()
+_state = {"sync_interval": 1.0}
+_sync_started = False
+_time = time.time
+_stats = {"rejected": 0, "exact_checks": 0, "syncs": 0, "sync_errors": 0}
+
+
+def _ensure_sync():
+    global _sync_started
+    with _lock:
+        if _sync_started:
+            return
+        _sync_started = True
+    socketio.start_background_task(_syncer)
+
+
+def hit_local(limit, key, now=None):
+    """
+    Approximate global limit: count locally and let the syncer reconcile with redis in batches.
+    Returns 0 when allowed, otherwise the seconds until the window resets.
+    """
+    if now is None:
+        now = _time()
+    window = now // limit.period
+    ck = (limit, key)
+    with _lock:
+        entry = _counters.get(ck)
+        if entry is None or entry[0] != window:
+            entry = _counters[ck] = [window, 0, 0]
+        pending = entry[2]
+        if entry[1] + pending >= limit.amount:
+            _stats["rejected"] += 1
+            return (window + 1) * limit.period - now
+        if not pending:
+            _dirty.add(ck)
+        entry[2] = pending + 1
+    if not _sync_started:
+        _ensure_sync()
+    return 0
+
+
+def hit_exact(limit, key, now=None):
+    """Exact global limit: one atomic INCR per request. Falls back to local counting without redis."""
+    client = get_redis()
+    if not client:
+        return hit_local(limit, key, now)
+    now = time.time() if now is None else now
+    window = int(now // limit.period)
+    rkey = _redis_key(limit, key, window)
+    try:
+        pipe = client.pipeline(transaction=True)
+        pipe.incr(rkey)
+        pipe.expire(rkey, limit.period + 1)
+        count, _ = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Exact rate limit check failed, using local count: {e}")
+        return hit_local(limit, key, now)
+    rejected = count > limit.amount
+    with _lock:
+        _stats["exact_checks"] += 1
+        if rejected:
+            _stats["rejected"] += 1
+    return (window + 1) * limit.period - now if rejected else 0
+
+
+def hit(limits, key):
+    """Check every limit for key; returns (retry_after, limit) for the first one exceeded, else (0, None)."""
+    now = time.time()
+    if len(limits) == 1 and not limits[0].exact:
+        retry_after = hit_local(limits[0], key, now)
+        return (retry_after, limits[0]) if retry_after else (0, None)
+    for limit in limits:
+        retry_after = hit_exact(limit, key, now) if limit.exact else hit_local(limit, key, now)
+        if retry_after:
+            return retry_after, limit
+    return 0, None
+
+
+def _redis_key(limit, key, window):
+    return f"{KEY_PREFIX}{limit.scope}:{limit.amount}/{limit.period}:{key}:{int(window)}"
+
+
+def sync_counters():
+    """Push pending local hits to redis (one pipeline) and pull back the global window totals."""
+    client = get_redis()
+    now = time.time()
+    with _lock:
+        batch = []
+        for ck in _dirty:
+            entry = _counters.get(ck)
+            if entry is not None and entry[2]:
+                batch.append((ck, entry, entry[0], entry[2]))
+                entry[2] = 0
+        _dirty.clear()
+        for ck in [ck for ck, e in _counters.items() if e[0] < now // ck[0].period]:
+            del _counters[ck]
+    if not batch:
+        return 0
+    if not client:
+        _requeue(batch)
+        return 0
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for (limit, key), _, window, pending in batch:
+            rkey = _redis_key(limit, key, window)
+            pipe.incrby(rkey, pending)
+            pipe.expire(rkey, limit.period + 1)
+        totals = pipe.execute()[::2]
+    except Exception as e:
+        with _lock:
+            _stats["sync_errors"] += 1
+        logger.warning(f"Rate limit sync failed: {e}")
+        _requeue(batch)
+        return 0
+
+    with _lock:
+        for (ck, entry, window, _), total in zip(batch, totals):
+            if entry[0] == window:
+                entry[1] = max(entry[1], int(total))
+        _stats["syncs"] += 1
+    return len(batch)
+
+
+def _requeue(batch):
+    with _lock:
+        for ck, entry, window, pending in batch:
+            if entry[0] == window:
+                entry[2] += pending
+                _dirty.add(ck)
+
+
+def _syncer():
+    while True:
+        socketio.sleep(_state["sync_interval"])
+        try:
+            sync_counters()
+        except Exception as e:
+            logger.warning(f"Rate limit sync failed: {e}")
+
+
+def configure_rate_limiter(sync_interval):
+    _state["sync_interval"] = sync_interval
+
+
+def rate_limiter_stats():
+    with _lock:
+        return {**_stats, "tracked_keys": len(_counters), "pending_keys": len(_dirty)}
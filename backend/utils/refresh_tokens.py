@@ -0,0 +1,292 @@
+import base64
+import hashlib
+import logging
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from backend.extensions import get_redis
+from backend.utils.session_registry import (
+    ACTIVE_KEY,
+    ACTIVE_USERS_KEY,
+    META_PREFIX as SESSION_META_PREFIX,
+    SESSION_LUA,
+    USER_PREFIX as SESSION_USER_PREFIX,
+    queue_session_registration,
+    session_keys,
+)
+from backend.utils.token_version import VERSIONS_KEY
+
+logger = logging.getLogger(__name__)
+
+# rt:<sha256(token)>      hash {user_id, family, used[, used_at, next]}, expires with the token
+# rt_family:<family>      user_id while the login (one device) is live; its tokens are only
+#                         valid while it exists, so revoking a family is a single DEL
+# rt_user:<user_id>       set of live families, for "revoke everything" on password reset
+# Rotation and token revocation are one EVAL: the token's family, user and session keys are
+# derived inside the script from the token record (everything else comes in KEYS), so they
+# need a single Redis node like the rest of the app, not Cluster.
+TOKEN_PREFIX = "rt:"
+FAMILY_PREFIX = "rt_family:"
+USER_PREFIX = "rt_user:"
+
+# The family id doubles as the session id in the session registry, so every script that
+# ends a family also drops its session entry. `sk` holds the session's keys (session_keys).
+_FAMILY_DELETE_LUA = SESSION_LUA + """
+local function delete_family(fkey, ukey, sk, user_id, family)
+    redis.call('DEL', fkey)
+    redis.call('SREM', ukey, family)
+    drop_session(sk, user_id, family)
+end
+"""
+
+# For scripts that start from a token record: its family marker, user families and session
+# keys (as session_keys), with the global session counters in the last two KEYS.
+_TOKEN_KEYS_LUA = _FAMILY_DELETE_LUA + f"""
+local function family_keys(user_id, family)
+    return '{FAMILY_PREFIX}' .. family, '{USER_PREFIX}' .. user_id, {{
+        '{SESSION_META_PREFIX}' .. family, '{SESSION_USER_PREFIX}' .. user_id, KEYS[#KEYS - 1], KEYS[#KEYS]
+    }}
+end
+"""
+
+# KEYS: old token, new token, token versions, active sessions, active users
+# ARGV: ttl ms, now ms, encrypted successor, grace ms
+# -> {status, user_id, family, token_version[, encrypted successor]}; status 1 = rotated,
+#    2 = rotated moments ago (same successor again), 0 = unknown/expired/revoked, -1 = reuse
+_ROTATE_SCRIPT = _TOKEN_KEYS_LUA + """
+local data = redis.call('HMGET', KEYS[1], 'user_id', 'family', 'used', 'used_at', 'next')
+local user_id, family = data[1], data[2]
+if not user_id or not family then
+    return {0}
+end
+local fkey, ukey, sk = family_keys(user_id, family)
+if redis.call('EXISTS', fkey) == 0 then
+    return {0}
+end
+local version = redis.call('ZSCORE', KEYS[3], user_id) or '0'
+if data[3] == '1' then
+    -- two tabs refreshing at once: the late one gets the successor the first one received
+    if data[5] and tonumber(ARGV[2]) - tonumber(data[4] or 0) <= tonumber(ARGV[4]) then
+        return {2, user_id, family, version, data[5]}
+    end
+    -- a rotated token came back: assume it was stolen and kill the whole login
+    delete_family(fkey, ukey, sk, user_id, family)
+    return {-1, user_id, family}
+end
+redis.call('HSET', KEYS[1], 'used', '1', 'used_at', ARGV[2], 'next', ARGV[3])
+redis.call('HSET', KEYS[2], 'user_id', user_id, 'family', family, 'used', '0')
+redis.call('PEXPIRE', KEYS[2], ARGV[1])
+redis.call('SET', fkey, user_id, 'PX', ARGV[1])
+redis.call('SADD', ukey, family)
+redis.call('PEXPIRE', ukey, ARGV[1])
+touch_session(sk, user_id, family, tonumber(ARGV[2]), tonumber(ARGV[1]))
+return {1, user_id, family, version}
+"""
+
+# KEYS: token, active sessions, active users
+# -> {user_id, family} of the revoked family, or {} if the token is unknown
+_REVOKE_SCRIPT = _TOKEN_KEYS_LUA + """
+local data = redis.call('HMGET', KEYS[1], 'user_id', 'family')
+if not data[1] or not data[2] then
+    return {}
+end
+local fkey, ukey, sk = family_keys(data[1], data[2])
+delete_family(fkey, ukey, sk, data[1], data[2])
+return {data[1], data[2]}
+"""
+
+# KEYS: user families, session user zset, active, active_users, then (family, session meta)
+# per family; ARGV: user_id, then the families -> {revoked, families still left}
+_REVOKE_USER_SCRIPT = _FAMILY_DELETE_LUA + """
+for i = 2, #ARGV do
+    local j = 5 + (i - 2) * 2
+    delete_family(KEYS[j], KEYS[1], {KEYS[j + 1], KEYS[2], KEYS[3], KEYS[4]}, ARGV[1], ARGV[i])
+end
+local left = redis.call('SCARD', KEYS[1])
+if left == 0 then
+    redis.call('DEL', KEYS[1])
+end
+return {#ARGV - 1, left}
+"""
+
+# KEYS: family, user families, 4 session keys; ARGV: user_id, family
+# -> 1 if the family belonged to the user
+_REVOKE_FAMILY_SCRIPT = _FAMILY_DELETE_LUA + """
+local owned = redis.call('SISMEMBER', KEYS[2], ARGV[2]) == 1
+    or redis.call('HGET', KEYS[3], 'user_id') == ARGV[1]
+if not owned then
+    return 0
+end
+delete_family(KEYS[1], KEYS[2], {KEYS[3], KEYS[4], KEYS[5], KEYS[6]}, ARGV[1], ARGV[2])
+return 1
+"""
+
+
+class RefreshStoreUnavailable(Exception):
+    """Redis is required for refresh tokens; map this to a 503."""
+
+
+class RefreshTokenReuse(Exception):
+    """An already-rotated token was presented; its whole family has been revoked."""
+
+    def __init__(self, user_id, family):
+        super().__init__("Refresh token reuse detected")
+        self.user_id = user_id
+        self.family = family
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _client():
+    client = get_redis()
+    if not client:
+        raise RefreshStoreUnavailable("Redis is not available")
+    return client
+
+
+def _ttl_ms():
+    return current_app.config.get("REFRESH_TOKEN_TTL_DAYS", 7) * 24 * 3600 * 1000
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _audit(event, token_hash, user_id, family):
+    """Optional Mongo audit trail (REFRESH_TOKEN_AUDIT); never on the critical path's success."""
+    if not current_app.config.get("REFRESH_TOKEN_AUDIT"):
+        return
+    try:
+        now = datetime.utcnow()
+        current_app.mongo.db.refresh_token_audit.insert_one({
+            "event": event,
+            "token_hash": token_hash,
+            "user_id": str(user_id) if user_id else None,
+            "family": family,
+            "at": now,
+            "expires_at": now + timedelta(milliseconds=_ttl_ms()),
+        })
+    except Exception:
+        logger.exception("Refresh token audit write failed")
+
+
+def issue_refresh_token(user_id, device=None, ip=None):
+    """Start a new token family (one per login) and register it as a session. Returns (token, family)."""
+    client = _client()
+    token = secrets.token_urlsafe(32)
+    token_hash = hash_token(token)
+    family = uuid.uuid4().hex
+    ttl = _ttl_ms()
+    user_id = str(user_id)
+
+    pipe = client.pipeline(transaction=True)
+    pipe.hset(f"{TOKEN_PREFIX}{token_hash}", mapping={"user_id": user_id, "family": family, "used": "0"})
+    pipe.pexpire(f"{TOKEN_PREFIX}{token_hash}", ttl)
+    pipe.set(f"{FAMILY_PREFIX}{family}", user_id, px=ttl)
+    pipe.sadd(f"{USER_PREFIX}{user_id}", family)
+    pipe.pexpire(f"{USER_PREFIX}{user_id}", ttl)
+    queue_session_registration(pipe, user_id, family, ttl, device=device, ip=ip)
+    pipe.execute()
+
+    _audit("issued", token_hash, user_id, family)
+    return token, family
+
+
+def _grace_ms():
+    return int(current_app.config.get("REFRESH_TOKEN_GRACE_SECONDS", 10) * 1000)
+
+
+def _successor_cipher(old_token):
+    # only a holder of the old token can read the successor stored with it
+    from cryptography.fernet import Fernet
+
+    key = hashlib.sha256(f"rt-successor:{old_token}".encode("utf-8")).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _family_keys(user_id, family):
+    return [f"{FAMILY_PREFIX}{family}", f"{USER_PREFIX}{user_id}", *session_keys(user_id, family)]
+
+
+def rotate_refresh_token(old_token):
+    """
+    Atomically retire old_token and issue its successor in one scripted round trip.
+    Returns (new_token, user_id, family, token_version), or None if the token is unknown or expired.
+    Presenting old_token again within REFRESH_TOKEN_GRACE_SECONDS (two tabs refreshing at once)
+    returns the same successor; later it raises RefreshTokenReuse.
+    """
+    client = _client()
+    old_hash = hash_token(old_token)
+    new_token = secrets.token_urlsafe(32)
+    new_hash = hash_token(new_token)
+    cipher = _successor_cipher(old_token)
+
+    keys = [f"{TOKEN_PREFIX}{old_hash}", f"{TOKEN_PREFIX}{new_hash}", VERSIONS_KEY, ACTIVE_KEY, ACTIVE_USERS_KEY]
+    result = client.eval(
+        _ROTATE_SCRIPT, len(keys), *keys, _ttl_ms(), int(time.time() * 1000),
+        cipher.encrypt(new_token.encode()).decode(), _grace_ms(),
+    )
+    status = int(result[0])
+    if status == 0:
+        return None
+    user_id, family = _decode(result[1]), _decode(result[2])
+    if status == -1:
+        _audit("reuse_detected", old_hash, user_id, family)
+        raise RefreshTokenReuse(user_id, family)
+    if status == 2:
+        new_token = cipher.decrypt(_decode(result[4]).encode()).decode()
+        _audit("rotated_in_grace", hash_token(new_token), user_id, family)
+    else:
+        _audit("rotated", new_hash, user_id, family)
+    return new_token, user_id, family, int(float(_decode(result[3])))
+
+
+def revoke_refresh_token(token, reason="user_logout"):
+    """Revoke the family the token belongs to (i.e. log out that device). Returns (user_id, family) or None."""
+    client = _client()
+    token_hash = hash_token(token)
+    result = client.eval(_REVOKE_SCRIPT, 3, f"{TOKEN_PREFIX}{token_hash}", ACTIVE_KEY, ACTIVE_USERS_KEY)
+    if not result:
+        return None
+    user_id, family = _decode(result[0]), _decode(result[1])
+    _audit(reason, token_hash, user_id, family)
+    return user_id, family
+
+
+def revoke_user_refresh_tokens(user_id, reason="password_reset"):
+    """Revoke every refresh token of a user (password reset, deactivation)."""
+    client = _client()
+    user_id = str(user_id)
+    user_key = f"{USER_PREFIX}{user_id}"
+    revoked = 0
+    # families are read first so the script can declare their keys; one started in between is
+    # still in the set afterwards and taken by the next pass
+    for _ in range(5):
+        families = sorted(_decode(f) for f in client.smembers(user_key))
+        keys = [user_key, f"{SESSION_USER_PREFIX}{user_id}", ACTIVE_KEY, ACTIVE_USERS_KEY]
+        for family in families:
+            keys += [f"{FAMILY_PREFIX}{family}", session_keys(user_id, family)[0]]
+        count, left = client.eval(_REVOKE_USER_SCRIPT, len(keys), *keys, user_id, *families)
+        revoked += int(count)
+        if not int(left):
+            break
+    _audit(reason, None, user_id, None)
+    return revoked
+
+
+def revoke_refresh_family(user_id, family, reason="session_revoked"):
+    """Revoke one session (family) of a user by id; False if it isn't theirs or no longer exists."""
+    client = _client()
+    user_id = str(user_id)
+    keys = _family_keys(user_id, family)
+    revoked = client.eval(_REVOKE_FAMILY_SCRIPT, len(keys), *keys, user_id, family)
+    if not revoked:
+        return False
+    _audit(reason, None, user_id, family)
+    return True
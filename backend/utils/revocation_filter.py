@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import math
+import time
+from threading import Lock
+
+from backend.extensions import get_redis, socketio
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_KEY_PREFIX = "blacklist:"
+REVOCATION_CHANNEL = "blacklist:events"
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def estimated_false_positive_rate(self):
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+_lock = Lock()
+_state = {
+    "filter": None,
+    "ready": False,
+    "listener_started": False,
+    "built_at": None,
+}
+_stats = {
+    "checks": 0,
+    "filter_negatives": 0,
+    "not_ready": 0,
+    "redis_checks": 0,
+    "confirmed_revoked": 0,
+    "false_positives": 0,
+}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _build_filter(client, capacity, error_rate):
+    """Seed a fresh filter from the blacklist keys currently in redis (SCAN, never KEYS)."""
+    bloom = BloomFilter(capacity, error_rate)
+    for key in client.scan_iter(match=f"{BLACKLIST_KEY_PREFIX}*", count=1000):
+        key = key.decode() if isinstance(key, bytes) else key
+        bloom.add(key[len(BLACKLIST_KEY_PREFIX):])
+    return bloom
+
+
+def _rebuild_filter(client, capacity, error_rate):
+    bloom = _build_filter(client, capacity, error_rate)
+    with _lock:
+        _state["filter"] = bloom
+        _state["ready"] = True
+        _state["built_at"] = time.monotonic()
+
+
+def _handle_message(message, client, capacity, error_rate):
+    """
+    Apply one pub/sub message. Every (re)subscribe confirmation reseeds the filter from redis:
+    redis-py resubscribes on its own after a dropped connection, and revocations published
+    while it was down would otherwise never reach this worker's filter.
+    """
+    kind = message.get("type")
+    if kind == "subscribe":
+        _rebuild_filter(client, capacity, error_rate)
+    elif kind == "message":
+        jti = message["data"]
+        add_revoked_jti(jti.decode() if isinstance(jti, bytes) else jti)
+
+
+def _listener(capacity, error_rate, rebuild_seconds):
+    while True:
+        pubsub = None
+        try:
+            client = get_redis()
+            if not client:
+                socketio.sleep(5)
+                continue
+
+            # the filter is seeded when the subscribe is confirmed, so revocations published
+            # during the scan are not lost
+            pubsub = client.pubsub()
+            pubsub.subscribe(REVOCATION_CHANNEL)
+            rebuild_at = time.monotonic() + rebuild_seconds
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message:
+                    _handle_message(message, client, capacity, error_rate)
+                # rebuild periodically so expired JTIs age out of the filter
+                if time.monotonic() >= rebuild_at:
+                    _rebuild_filter(client, capacity, error_rate)
+                    rebuild_at = time.monotonic() + rebuild_seconds
+                socketio.sleep(0)
+        except Exception as e:
+            logger.warning(f"Revocation filter listener failed, falling back to redis checks: {e}")
+            with _lock:
+                _state["ready"] = False
+            socketio.sleep(5)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def start_revocation_listener(capacity=100000, error_rate=0.001, rebuild_seconds=3600):
+    """Start the per-worker pub/sub listener that mirrors the redis blacklist (idempotent)."""
+    with _lock:
+        if _state["listener_started"]:
+            return
+        _state["listener_started"] = True
+    socketio.start_background_task(_listener, capacity, error_rate, rebuild_seconds)
+
+
+def add_revoked_jti(jti):
+    with _lock:
+        bloom = _state["filter"]
+        # the publishing worker sees its own message too; don't count it twice
+        if bloom is not None and jti not in bloom:
+            bloom.add(jti)
+
+
+def publish_revocation(jti, client=None):
+    """Tell every worker's filter about a newly blacklisted jti."""
+    add_revoked_jti(jti)
+    client = client or get_redis()
+    if client:
+        client.publish(REVOCATION_CHANNEL, jti)
+
+
+def might_be_revoked(jti):
+    """
+    False -> definitely not revoked, no redis call needed.
+    True  -> possibly revoked, confirm with redis.
+    None  -> filter not ready (startup or lost pub/sub), caller must ask redis.
+    """
+    _count("checks")
+    with _lock:
+        if not _state["ready"]:
+            _stats["not_ready"] += 1
+            return None
+        hit = jti in _state["filter"]
+    if not hit:
+        _count("filter_negatives")
+    return hit
+
+
+def record_redis_check(revoked, filter_hit):
+    _count("redis_checks")
+    if revoked:
+        _count("confirmed_revoked")
+    elif filter_hit:
+        _count("false_positives")
+
+
+def revocation_filter_stats():
+    with _lock:
+        stats = dict(_stats)
+        bloom = _state["filter"]
+        stats["ready"] = _state["ready"]
+        stats["seconds_since_rebuild"] = (
+            round(time.monotonic() - _state["built_at"], 1) if _state["built_at"] is not None else None
+        )
+        if bloom is not None:
+            stats["items"] = bloom.count
+            stats["capacity"] = bloom.capacity
+            stats["memory_bytes"] = len(bloom.bits)
+            stats["num_hashes"] = bloom.num_hashes
+            stats["estimated_false_positive_rate"] = round(bloom.estimated_false_positive_rate(), 6)
+    filter_hits = stats["checks"] - stats["filter_negatives"] - stats["not_ready"]
+    negatives_seen = stats["filter_negatives"] + stats["false_positives"]
+    stats["observed_false_positive_rate"] = (
+        round(stats["false_positives"] / negatives_seen, 6) if negatives_seen else None
+    )
+    stats["redis_calls_avoided"] = stats["filter_negatives"]
+    stats["filter_hits"] = filter_hits
+    return stats
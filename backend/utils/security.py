@@ -4,7 +4,7 @@ import hmac
 from flask import session, request 
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
-from cryptography.fernet import Fernet, InvalidToken
+from threading import Lock
 from typing import Any, List, Union
 import logging
 import json 
@@ -20,14 +20,32 @@ if not FERNET_KEY:
     raise RuntimeError(
         "FERNET_KEY is missing! set it in the environment before starting the app"
     )
-    
-try:
-    _fernet = Fernet(FERNET_KEY.encode())
-except Exception as e:
-    raise RuntimeError("FERNET_KEY is invalid. Must be a valid Fernet key.") from e
+
+# cryptography is only imported (and the key parsed) the first time an answer is encrypted
+_fernet = None
+_fernet_lock = Lock()
 
 
-def get_fernet() -> Fernet:
+def check_fernet_key():
+    """Cheap format check for create_app: a Fernet key is 32 bytes, urlsafe base64 encoded."""
+    try:
+        valid = len(base64.urlsafe_b64decode(FERNET_KEY.encode())) == 32
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise RuntimeError("FERNET_KEY is invalid. Must be a valid Fernet key.")
+
+
+def get_fernet():
+    global _fernet
+    if _fernet is None:
+        with _fernet_lock:
+            if _fernet is None:
+                from cryptography.fernet import Fernet
+                try:
+                    _fernet = Fernet(FERNET_KEY.encode())
+                except Exception as e:
+                    raise RuntimeError("FERNET_KEY is invalid. Must be a valid Fernet key.") from e
     return _fernet
 
 def normalize_answer(value: Any) -> Any:
@@ -71,6 +89,7 @@ def encrypt_answer(value: Any) -> str:
     return token.decode('utf-8')
 
 def decrypt_answer(token: str) -> Any:
+    from cryptography.fernet import InvalidToken
     f = get_fernet()
     try:
         payload = f.decrypt(token.encode('utf-8'))
@@ -0,0 +1,118 @@
+import logging
+import time
+
+from backend.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+# A session is one login on one device and shares its id with the refresh-token family.
+#   sessions:meta:<sid>      hash {user_id, device, ip, issued_at, last_seen}, expires with the family
+#   sessions:user:<user_id>  zset sid -> last_seen (ms)
+#   sessions:active          zset "<user_id>:<sid>" -> expires_at (ms), global counter without KEYS scans
+#   sessions:active_users    zset user_id -> latest expires_at (ms)
+META_PREFIX = "sessions:meta:"
+USER_PREFIX = "sessions:user:"
+ACTIVE_KEY = "sessions:active"
+ACTIVE_USERS_KEY = "sessions:active_users"
+
+# Lua helpers shared with the refresh-token scripts so rotation and revocation keep the
+# registry in sync inside the same round trip. `k` is the session's keys as the caller passed
+# them in KEYS (see session_keys): {meta, user zset, active, active_users}.
+SESSION_LUA = """
+local function touch_session(k, user_id, sid, now, ttl)
+    if redis.call('EXISTS', k[1]) == 0 then
+        return
+    end
+    redis.call('HSET', k[1], 'last_seen', now)
+    redis.call('PEXPIRE', k[1], ttl)
+    redis.call('ZADD', k[2], now, sid)
+    redis.call('PEXPIRE', k[2], ttl)
+    redis.call('ZADD', k[3], now + ttl, user_id .. ':' .. sid)
+    redis.call('ZADD', k[4], now + ttl, user_id)
+end
+
+local function drop_session(k, user_id, sid)
+    redis.call('DEL', k[1])
+    redis.call('ZREM', k[2], sid)
+    redis.call('ZREM', k[3], user_id .. ':' .. sid)
+    if redis.call('ZCARD', k[2]) == 0 then
+        redis.call('ZREM', k[4], user_id)
+    end
+end
+"""
+
+
+def session_keys(user_id, sid):
+    """The keys SESSION_LUA's helpers touch for one session, in their expected order."""
+    return [f"{META_PREFIX}{sid}", f"{USER_PREFIX}{user_id}", ACTIVE_KEY, ACTIVE_USERS_KEY]
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def queue_session_registration(pipe, user_id, sid, ttl_ms, device=None, ip=None):
+    """Add the commands registering a new session to an existing pipeline (no extra round trip)."""
+    now = int(time.time() * 1000)
+    user_id = str(user_id)
+    pipe.hset(f"{META_PREFIX}{sid}", mapping={
+        "user_id": user_id,
+        "device": (device or "unknown")[:200],
+        "ip": ip or "unknown",
+        "issued_at": now,
+        "last_seen": now,
+    })
+    pipe.pexpire(f"{META_PREFIX}{sid}", ttl_ms)
+    pipe.zadd(f"{USER_PREFIX}{user_id}", {sid: now})
+    pipe.pexpire(f"{USER_PREFIX}{user_id}", ttl_ms)
+    pipe.zadd(ACTIVE_KEY, {f"{user_id}:{sid}": now + ttl_ms})
+    pipe.zadd(ACTIVE_USERS_KEY, {user_id: now + ttl_ms})
+    # O(log n + expired) housekeeping so the global counters never need a scan
+    pipe.zremrangebyscore(ACTIVE_KEY, "-inf", now)
+    pipe.zremrangebyscore(ACTIVE_USERS_KEY, "-inf", now)
+
+
+def list_sessions(user_id):
+    """All live sessions of a user, most recently seen first."""
+    client = get_redis()
+    if not client:
+        return []
+    user_key = f"{USER_PREFIX}{user_id}"
+    sids = [_decode(s) for s in client.zrevrange(user_key, 0, -1)]
+    if not sids:
+        return []
+
+    pipe = client.pipeline(transaction=False)
+    for sid in sids:
+        pipe.hgetall(f"{META_PREFIX}{sid}")
+    metas = pipe.execute()
+
+    sessions, stale = [], []
+    for sid, meta in zip(sids, metas):
+        if not meta:
+            stale.append(sid)
+            continue
+        meta = {_decode(k): _decode(v) for k, v in meta.items()}
+        sessions.append({
+            "session_id": sid,
+            "device": meta.get("device"),
+            "ip": meta.get("ip"),
+            "issued_at": int(meta.get("issued_at", 0)),
+            "last_seen": int(meta.get("last_seen", 0)),
+        })
+    if stale:
+        client.zrem(user_key, *stale)
+    return sessions
+
+
+def active_session_counts():
+    """Global counters for health/metrics; O(log n), never enumerates the keyspace."""
+    client = get_redis()
+    if not client:
+        return {"active_sessions": None, "active_users": None}
+    now = int(time.time() * 1000)
+    pipe = client.pipeline(transaction=False)
+    pipe.zcount(ACTIVE_KEY, now, "+inf")
+    pipe.zcount(ACTIVE_USERS_KEY, now, "+inf")
+    sessions, users = pipe.execute()
+    return {"active_sessions": sessions, "active_users": users}
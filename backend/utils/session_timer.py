@@ -0,0 +1,493 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
+import socket
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from bson import ObjectId
+from flask import current_app
+
+from backend.extensions import get_redis, socketio
+
+logger = logging.getLogger(__name__)
+
+# Exam deadlines are kept by one scheduler per worker instead of a polling task per session:
+#   _heap        (fire_at, token, session_id, expire_at, remaining) with remaining = 0 for the
+#                deadline itself and the milestone's seconds left otherwise
+#   _scheduled   session_id -> (expire_at, token); heap entries with another token are stale
+# Clients count down locally from the clock-sync handshake on /ws/exam, so the server only
+# emits `time_milestone` and `time_up`. Due sessions are auto-submitted and graded in bulk; a
+# periodic sweep schedules deadlines no connection registered (e.g. after a restart).
+#
+# With redis, sessions hash to SESSION_TIMER_PARTITIONS partitions and each partition's timers
+# run on exactly one worker, the holder of its lease:
+#   <prefix>:lease:<p>    owner id, SET NX with a TTL the owner renews
+#   <prefix>:due:<p>      zset session_id -> expire_at (ms), the cluster-wide schedule
+#   <prefix>:new:<p>      session ids scheduled inside the owner's already loaded window
+#   <prefix>:workers      zset owner id -> last heartbeat (ms), sizes each worker's share
+# (prefix SESSION_TIMER_KEY_PREFIX, "session_timer").
+# A worker that dies stops renewing and its partitions are taken over once the lease expires.
+# The auto-submit itself is a conditional update claimed per run, so even a worker that lost
+# its lease mid-tick can't submit or announce a session twice.
+OPEN_STATUSES = ("in_progress", "started")
+NAMESPACE = "/ws/exam"
+
+# KEYS: lease; ARGV: owner, ttl ms -> 1 if still ours (and extended)
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lease; ARGV: owner
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: due zset; ARGV: session_id, expire_at ms -> drops the entry unless it was rescheduled
+_UNSCHEDULE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) == tonumber(ARGV[2]) then
+    return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+_heap = []
+_scheduled = {}
+_owned = set()
+_loaded_until = {}  # partition -> expire_at ms already loaded into the heap
+_tokens = itertools.count()
+_lock = Lock()
+_state = {"scheduler_started": False, "owner": None, "owner_pid": None, "next_lease_check": 0.0, "leases_valid_until": 0.0}
+_stats = {
+    "scheduled": 0,
+    "milestones": 0,
+    "expired": 0,
+    "auto_submitted": 0,
+    "sweeps": 0,
+    "leases_acquired": 0,
+    "leases_lost": 0,
+    "leases_released": 0,
+    "errors": 0,
+}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _milestones():
+    raw = str(_config("SESSION_TIMER_MILESTONES", "300,60"))
+    return sorted({int(part) for part in raw.split(",") if part.strip().isdigit() and int(part) > 0}, reverse=True)
+
+
+def _partitions():
+    return max(int(_config("SESSION_TIMER_PARTITIONS", 16)), 1)
+
+
+def _lease_ms():
+    return int(_config("SESSION_TIMER_LEASE_MS", 10000))
+
+
+def _horizon_ms():
+    # deadlines are loaded early enough for their first milestone to fire on time
+    return (max(_milestones(), default=0) + 2 * _config("SESSION_TIMER_TICK_SECONDS", 1)) * 1000
+
+
+def _key(*parts):
+    return ":".join([_config("SESSION_TIMER_KEY_PREFIX", "session_timer"), *map(str, parts)])
+
+
+def _owner():
+    # per process, so forked workers never share an identity
+    if _state["owner_pid"] != os.getpid():
+        _state["owner"] = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        _state["owner_pid"] = os.getpid()
+    return _state["owner"]
+
+
+def partition_of(session_id):
+    return zlib.crc32(str(session_id).encode()) % _partitions()
+
+
+def epoch_ms(value):
+    """Milliseconds since the epoch for a naive UTC datetime."""
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def from_epoch_ms(ms):
+    return datetime(1970, 1, 1) + timedelta(milliseconds=int(ms))
+
+
+def sync_payload(session, now=None):
+    """Clock-sync data for a session: the client derives its offset from server_ts."""
+    now = now or datetime.utcnow()
+    expire_at = session.get("expire_at")
+    return {
+        "session_id": str(session["_id"]),
+        "server_ts": epoch_ms(now),
+        "expire_at": expire_at.isoformat() if expire_at else None,
+        "expire_at_ms": epoch_ms(expire_at) if expire_at else None,
+        "remaining_ms": max(epoch_ms(expire_at) - epoch_ms(now), 0) if expire_at else None,
+    }
+
+
+def _push_local(sid, expire_at):
+    """Put a deadline and its milestones still ahead on this worker's heap (no-op if known)."""
+    now = datetime.utcnow()
+    with _lock:
+        current = _scheduled.get(sid)
+        if current is not None and current[0] == expire_at:
+            return
+        token = next(_tokens)
+        _scheduled[sid] = (expire_at, token)
+        heapq.heappush(_heap, (expire_at, token, sid, expire_at, 0))
+        for remaining in _milestones():
+            fire_at = expire_at - timedelta(seconds=remaining)
+            if fire_at > now:
+                heapq.heappush(_heap, (fire_at, token, sid, expire_at, remaining))
+
+
+def schedule_session(session_id, expire_at):
+    """
+    Track a session's deadline. With redis it joins its partition's schedule and is run by
+    that partition's owner; otherwise it goes on this worker's heap. Rescheduling with the
+    same expire_at is a no-op; a new one makes the old entries stale.
+    """
+    if not expire_at:
+        return
+    sid = str(session_id)
+    # millisecond precision, as stored by Mongo and in the redis schedule
+    expire_at = expire_at.replace(microsecond=expire_at.microsecond // 1000 * 1000)
+    client = get_redis()
+    if client is None:
+        _push_local(sid, expire_at)
+    else:
+        p = partition_of(sid)
+        score = epoch_ms(expire_at)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zadd(_key("due", p), {sid: score})
+            if score <= epoch_ms(datetime.utcnow()) + _horizon_ms():
+                # the owner may have loaded past this deadline already; hand it over directly
+                pipe.rpush(_key("new", p), sid)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Session timer schedule via redis failed for {sid}, timing locally: {e}")
+            _push_local(sid, expire_at)
+    _count("scheduled")
+    _ensure_scheduler()
+
+
+def cancel_session(session_id):
+    """Forget a session's deadline (submitted early); its heap entries become stale."""
+    sid = str(session_id)
+    with _lock:
+        _scheduled.pop(sid, None)
+    client = get_redis()
+    if client is not None:
+        try:
+            client.zrem(_key("due", partition_of(sid)), sid)
+        except Exception as e:
+            logger.warning(f"Session timer cancel via redis failed for {sid}: {e}")
+
+
+def _drop_partition(p):
+    with _lock:
+        _owned.discard(p)
+        _loaded_until.pop(p, None)
+        for sid in [sid for sid in _scheduled if partition_of(sid) == p]:
+            del _scheduled[sid]
+
+
+def maintain_leases(client):
+    """
+    Renew this worker's partition leases and move towards a fair share of them: release
+    beyond ceil(partitions / live workers), acquire free ones below it. Returns owned partitions.
+    """
+    owner, lease_ms, partitions = _owner(), _lease_ms(), _partitions()
+    now_ms = int(time.time() * 1000)
+    pipe = client.pipeline(transaction=False)
+    pipe.zadd(_key("workers"), {owner: now_ms})
+    pipe.zremrangebyscore(_key("workers"), "-inf", now_ms - lease_ms)
+    pipe.zcard(_key("workers"))
+    live = max(pipe.execute()[2], 1)
+    share = math.ceil(partitions / live)
+
+    with _lock:
+        owned = sorted(_owned)
+    if owned:
+        pipe = client.pipeline(transaction=False)
+        for p in owned:
+            pipe.eval(_RENEW_SCRIPT, 1, _key("lease", p), owner, lease_ms)
+        for p, renewed in zip(owned, pipe.execute()):
+            if not renewed:
+                _drop_partition(p)
+                _count("leases_lost")
+                logger.warning(f"Session timer lease on partition {p} lost")
+    with _lock:
+        owned = sorted(_owned)
+        _state["leases_valid_until"] = time.monotonic() + lease_ms / 1000
+
+    for p in owned[share:]:
+        client.eval(_RELEASE_SCRIPT, 1, _key("lease", p), owner)
+        _drop_partition(p)
+        _count("leases_released")
+
+    owned = owned[:share]
+    free = [p for p in range(partitions) if p not in owned]
+    random.shuffle(free)
+    for p in free:
+        if len(owned) >= share:
+            break
+        if client.set(_key("lease", p), owner, nx=True, px=lease_ms):
+            owned.append(p)
+            with _lock:
+                _owned.add(p)
+            _count("leases_acquired")
+            logger.info(f"Session timer lease on partition {p} acquired by {owner}")
+    with _lock:
+        return set(_owned)
+
+
+def load_owned(client):
+    """Pull deadlines of owned partitions due within the load horizon into the heap."""
+    with _lock:
+        owned = sorted(_owned)
+    if not owned:
+        return 0
+    until = epoch_ms(datetime.utcnow()) + _horizon_ms()
+    pipe = client.pipeline(transaction=False)
+    for p in owned:
+        since = _loaded_until.get(p)
+        pipe.zrangebyscore(_key("due", p), f"({since}" if since is not None else "-inf", until, withscores=True)
+    ranges = pipe.execute()
+    # handed-over ids, read and cleared atomically
+    pipe = client.pipeline(transaction=True)
+    for p in owned:
+        pipe.lrange(_key("new", p), 0, -1)
+        pipe.delete(_key("new", p))
+    handed = pipe.execute()[::2]
+
+    loaded = 0
+    for p, entries, new_ids in zip(owned, ranges, handed):
+        _loaded_until[p] = until
+        for sid, score in entries:
+            _push_local(_decode(sid), from_epoch_ms(score))
+            loaded += 1
+        if new_ids:
+            pipe = client.pipeline(transaction=False)
+            for sid in new_ids:
+                pipe.zscore(_key("due", p), _decode(sid))
+            for sid, score in zip(new_ids, pipe.execute()):
+                if score is not None:
+                    _push_local(_decode(sid), from_epoch_ms(score))
+                    loaded += 1
+    return loaded
+
+
+def _pop_due(now):
+    """(milestones [(session_id, expire_at, remaining)], expired [(session_id, expire_at)]) due at `now`."""
+    milestones, expired = [], []
+    with _lock:
+        while _heap and _heap[0][0] <= now:
+            _, token, sid, expire_at, remaining = heapq.heappop(_heap)
+            if _scheduled.get(sid) != (expire_at, token):
+                continue
+            if remaining:
+                milestones.append((sid, expire_at, remaining))
+            else:
+                del _scheduled[sid]
+                expired.append((sid, expire_at))
+    return milestones, expired
+
+
+def expire_sessions(db, session_ids):
+    """
+    Auto-submit the given sessions that are still open past their deadline: one claimed
+    update_many, `time_up` to each room, then one bulk grading write per exam.
+    Returns the number of sessions submitted.
+    """
+    from backend.utils.answer_buffer import flush_session
+    from backend.utils.batch_grading import write_results
+    from backend.utils.exam_presence import remove_sessions
+    from backend.utils.grading_keys import get_grading_keys
+
+    now = datetime.utcnow()
+    ids = [ObjectId(str(sid)) for sid in session_ids]
+    _count("expired", len(ids))
+    # the claim tells this run which sessions it moved; a concurrent run gets the others
+    claim = ObjectId()
+    moved = db.exam_sessions.update_many(
+        {"_id": {"$in": ids}, "status": {"$in": list(OPEN_STATUSES)}, "expire_at": {"$lte": now}},
+        {"$set": {
+            "status": "submitted",
+            "auto_submitted": True,
+            "ended_at": now,
+            "updated_at": now,
+            "timer_claim": claim,
+        }},
+    )
+    if not moved.modified_count:
+        return 0
+    sessions = list(db.exam_sessions.find(
+        {"_id": {"$in": ids}, "timer_claim": claim}, {"_id": 1, "exam_id": 1, "user_id": 1}
+    ))
+    claimed = [s["_id"] for s in sessions]
+    db.exam_results.update_many(
+        {"session_id": {"$in": claimed}},
+        {"$set": {"status": "submitted", "submitted_at": now, "grading_status": "grading"}},
+    )
+    remove_sessions(sessions)
+    for session in sessions:
+        sid = str(session["_id"])
+        socketio.emit("time_up", {
+            "session_id": sid,
+            "auto_submitted": True,
+            "result_url": f"/api/exam_result/session/{sid}",
+            "ts": now.isoformat(),
+        }, room=sid, namespace=NAMESPACE)
+
+    by_exam = {}
+    for session in sessions:
+        by_exam.setdefault(session["exam_id"], []).append(session)
+    for exam_id, group in by_exam.items():
+        try:
+            for session in group:
+                flush_session(db, session["_id"])
+            write_results(db, get_grading_keys(db, exam_id), group)
+        except Exception as e:
+            _count("errors")
+            logger.warning(f"Grading {len(group)} auto-submitted sessions of exam {exam_id} failed: {e}")
+            db.exam_results.update_many(
+                {"session_id": {"$in": [s["_id"] for s in group]}}, {"$set": {"grading_status": "failed"}}
+            )
+    _count("auto_submitted", len(sessions))
+    logger.info(f"Auto-submitted {len(sessions)} expired exam sessions")
+    return len(sessions)
+
+
+def sweep(db, horizon_seconds):
+    """Schedule open sessions due within the horizon (one indexed query); returns how many."""
+    due_by = datetime.utcnow() + timedelta(seconds=horizon_seconds)
+    found = 0
+    for session in db.exam_sessions.find(
+        {"status": {"$in": list(OPEN_STATUSES)}, "expire_at": {"$lte": due_by}}, {"_id": 1, "expire_at": 1}
+    ):
+        schedule_session(session["_id"], session["expire_at"])
+        found += 1
+    _count("sweeps")
+    return found
+
+
+def run_due(db, now=None, client=None, expire=expire_sessions):
+    """
+    Emit due milestones and hand due sessions to `expire` (auto-submit); returns its result.
+    """
+    if client is not None and time.monotonic() > _state["leases_valid_until"]:
+        # leases not confirmed within their TTL: another worker may own these partitions now
+        return 0
+    milestones, expired = _pop_due(now or datetime.utcnow())
+    for sid, expire_at, remaining in milestones:
+        socketio.emit("time_milestone", {
+            "session_id": sid,
+            "remaining_seconds": remaining,
+            "expire_at_ms": epoch_ms(expire_at),
+        }, room=sid, namespace=NAMESPACE)
+    _count("milestones", len(milestones))
+    if not expired:
+        return 0
+    submitted = expire(db, [sid for sid, _ in expired])
+    if client is not None:
+        pipe = client.pipeline(transaction=False)
+        for sid, expire_at in expired:
+            pipe.eval(_UNSCHEDULE_SCRIPT, 1, _key("due", partition_of(sid)), sid, epoch_ms(expire_at))
+        pipe.execute()
+    return submitted
+
+
+def tick(db, client, sweep_due=False, expire=expire_sessions):
+    """One scheduler pass: leases (when due), newly due deadlines, sweep, then run_due."""
+    if client is not None and time.monotonic() >= _state["next_lease_check"]:
+        maintain_leases(client)
+        _state["next_lease_check"] = time.monotonic() + _lease_ms() / 3000
+    if client is not None:
+        load_owned(client)
+    # one sweeper per cluster: the owner of partition 0
+    if sweep_due and (client is None or 0 in _owned):
+        sweep(db, _config("SESSION_TIMER_SWEEP_SECONDS", 30))
+    return run_due(db, client=client, expire=expire)
+
+
+def _scheduler(app):
+    with app.app_context():
+        interval = app.config.get("SESSION_TIMER_TICK_SECONDS", 1)
+        sweep_every = app.config.get("SESSION_TIMER_SWEEP_SECONDS", 30)
+        next_sweep = time.monotonic()
+        while True:
+            sweep_due = bool(sweep_every) and time.monotonic() >= next_sweep
+            try:
+                tick(app.mongo.db, get_redis(), sweep_due)
+                if sweep_due:
+                    next_sweep = time.monotonic() + sweep_every
+            except Exception as e:
+                _count("errors")
+                logger.warning(f"Session timer tick failed: {e}")
+            socketio.sleep(interval)
+
+
+def _ensure_scheduler():
+    with _lock:
+        if _state["scheduler_started"]:
+            return
+        _state["scheduler_started"] = True
+    socketio.start_background_task(_scheduler, current_app._get_current_object())
+
+
+def start_session_scheduler(app):
+    """
+    Start this worker's scheduler with its first request (or socket connection), so overdue
+    sessions are swept without connections while CLI commands and celery workers, which
+    serve neither, never take partition leases.
+    """
+    def _start():
+        if not _state["scheduler_started"]:
+            _ensure_scheduler()
+
+    app.before_request(_start)
+
+
+def session_timer_stats():
+    with _lock:
+        return {
+            **_stats,
+            "owner": _state["owner"],
+            "partitions_owned": sorted(_owned),
+            "sessions_tracked": len(_scheduled),
+            "heap_size": len(_heap),
+            "scheduler_running": _state["scheduler_started"],
+        }
@@ -0,0 +1,201 @@
+import copy
+import hashlib
+import logging
+import time
+import uuid
+from functools import wraps
+from threading import Event, Lock
+
+from bson import json_util
+from flask import current_app
+
+from backend.extensions import get_redis, socketio
+
+logger = logging.getLogger(__name__)
+
+# Coalesces identical concurrent lookups: the first caller (leader) runs the query, callers
+# arriving while it is in flight wait for and share its result. Nothing is kept once the
+# leader finishes, so this only flattens stampedes (e.g. hundreds of students opening an exam
+# in the same second); it is not a cache.
+#
+# With SINGLE_FLIGHT_REDIS the leader also takes a short redis lock and leaves its result under
+# sf:result:<key> for SINGLE_FLIGHT_RESULT_MS so leaders in other workers can reuse it.
+LOCK_PREFIX = "sf:lock:"
+RESULT_PREFIX = "sf:result:"
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+_inflight = {}
+_lock = Lock()
+_stats = {}
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _default_key(args, kwargs):
+    return repr((args, sorted(kwargs.items())))
+
+
+def _digest(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _run_distributed(key, func, args, kwargs, stats):
+    client = get_redis()
+    if not client:
+        return func(*args, **kwargs)
+
+    digest = _digest(key)
+    lock_key, result_key = f"{LOCK_PREFIX}{digest}", f"{RESULT_PREFIX}{digest}"
+    lock_ms = _config("SINGLE_FLIGHT_LOCK_MS", 2000)
+    token = uuid.uuid4().hex
+    try:
+        raw = client.get(result_key)
+        if raw is None:
+            leader = client.set(lock_key, token, nx=True, px=lock_ms)
+    except Exception as e:
+        logger.warning(f"Single-flight redis lock unavailable, querying directly: {e}")
+        return func(*args, **kwargs)
+
+    if raw is not None:
+        stats["remote_hits"] += 1
+        return json_util.loads(raw)
+
+    if leader:
+        try:
+            result = func(*args, **kwargs)
+            client.set(result_key, json_util.dumps(result), px=_config("SINGLE_FLIGHT_RESULT_MS", 500))
+            return result
+        finally:
+            try:
+                client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except Exception:
+                pass
+
+    # another worker is running the query; wait for its result, at most for the lock lifetime
+    deadline = time.monotonic() + lock_ms / 1000
+    while time.monotonic() < deadline:
+        socketio.sleep(0.01)
+        try:
+            raw = client.get(result_key)
+            if raw is not None:
+                stats["remote_hits"] += 1
+                return json_util.loads(raw)
+            if not client.exists(lock_key):
+                break
+        except Exception:
+            break
+    stats["remote_timeouts"] += 1
+    return func(*args, **kwargs)
+
+
+def single_flight(name, key_func=None, distributed=False, copy_result=True):
+    """
+    Decorator for read helpers. Concurrent calls with the same key share one execution.
+
+    key_func(*args, **kwargs) builds the key (default: repr of the arguments).
+    distributed=True opts the helper into the cross-worker redis variant (SINGLE_FLIGHT_REDIS);
+    its result must be BSON/JSON serializable.
+    copy_result=False hands every caller the same object; use it only for immutable results.
+    Otherwise each caller gets its own deep copy whenever the result was shared.
+    """
+    def decorator(func):
+        stats = _stats.setdefault(name, {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "remote_hits": 0,
+            "remote_timeouts": 0,
+        })
+
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            key = f"{name}:{key_func(*args, **kwargs) if key_func else _default_key(args, kwargs)}"
+            with _lock:
+                stats["calls"] += 1
+                call = _inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = _inflight[key] = _Call()
+                else:
+                    call.followers += 1
+                    stats["coalesced"] += 1
+
+            if not leader:
+                call.event.wait()
+                if call.error is not None:
+                    raise call.error
+                return copy.deepcopy(call.result) if copy_result else call.result
+
+            try:
+                if distributed and _config("SINGLE_FLIGHT_REDIS", False):
+                    call.result = _run_distributed(key, func, args, kwargs, stats)
+                else:
+                    call.result = func(*args, **kwargs)
+                stats["executions"] += 1
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with _lock:
+                    _inflight.pop(key, None)
+                call.event.set()
+
+            # followers can only join while the call is in flight, so the count is final here
+            if copy_result and call.followers:
+                return copy.deepcopy(call.result)
+            return call.result
+
+        wrapped.single_flight_name = name
+        return wrapped
+    return decorator
+
+
+def forget(name, *keys):
+    """
+    Drop results shared under the given keys (as built by the helper's key_func), so a write is
+    not followed by SINGLE_FLIGHT_RESULT_MS of reads returning the pre-write document.
+    """
+    client = get_redis()
+    if not client or not keys or not _config("SINGLE_FLIGHT_REDIS", False):
+        return
+    try:
+        client.delete(*(f"{RESULT_PREFIX}{_digest(f'{name}:{key}')}" for key in keys))
+    except Exception as e:
+        logger.warning(f"Single-flight result invalidation for {name} failed: {e}")
+
+
+def single_flight_stats():
+    """Per helper: calls, queries actually run (executions) and the share of calls coalesced."""
+    with _lock:
+        report = {}
+        for name, stats in _stats.items():
+            calls = stats["calls"]
+            saved = calls - stats["executions"] + stats["remote_hits"]
+            report[name] = {
+                **stats,
+                "in_flight": sum(1 for key in _inflight if key.startswith(f"{name}:")),
+                "coalescing_ratio": round(saved / calls, 4) if calls else None,
+            }
+    return report
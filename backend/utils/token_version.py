@@ -0,0 +1,142 @@
+import logging
+import time
+from threading import Lock
+
+from backend.extensions import get_redis, socketio
+
+logger = logging.getLogger(__name__)
+
+# user_id -> version (redis server time in ms of the last revocation), kept as a sorted set
+# so workers can sync incrementally by score and old entries can be pruned. One device's
+# logout bumps "<user_id>:<sid>" instead, revoking only the tokens of that login session.
+VERSIONS_KEY = "token_versions"
+
+# Entries only matter while access tokens issued before them can still be alive.
+VERSION_RETENTION_SECONDS = 2 * 900
+
+_BUMP_SCRIPT = """
+local t = redis.call('TIME')
+local ms = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZADD', KEYS[1], ms, ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ms - tonumber(ARGV[2]) * 1000)
+return ms
+"""
+
+_versions = {}
+_lock = Lock()
+_state = {
+    "synced_at": None,
+    "cursor": None,
+    "refresher_started": False,
+    "refresh_interval": 5,
+}
+
+
+def get_token_version(user_id):
+    """Current version for user_id, to embed as the `ver` claim of a new access token."""
+    client = get_redis()
+    if not client:
+        return 0
+    try:
+        score = client.zscore(VERSIONS_KEY, str(user_id))
+        return int(score) if score else 0
+    except Exception as e:
+        logger.warning(f"Token version read failed: {e}")
+        return 0
+
+
+def _member(user_id, session_id=None):
+    return f"{user_id}:{session_id}" if session_id else str(user_id)
+
+
+def bump_token_version(user_id, session_id=None):
+    """
+    Revoke every access token issued to user_id so far (password reset, log out everywhere,
+    deactivation), or with session_id only those of that login session (logout).
+    Only tokens checked through the stateless fast path rely on this.
+    """
+    client = get_redis()
+    if not client or not user_id:
+        return None
+    member = _member(user_id, session_id)
+    try:
+        version = int(client.eval(_BUMP_SCRIPT, 1, VERSIONS_KEY, member, VERSION_RETENTION_SECONDS))
+    except Exception:
+        logger.exception("Token version bump failed")
+        return None
+    with _lock:
+        _versions[member] = version
+    return version
+
+
+def _sync_versions():
+    client = get_redis()
+    if not client:
+        return
+    with _lock:
+        cursor = _state["cursor"]
+    if cursor is None:
+        cursor = int(time.time() * 1000) - VERSION_RETENTION_SECONDS * 1000
+    # inclusive lower bound: a bump landing in the same ms as the last one seen must not be missed
+    rows = client.zrangebyscore(VERSIONS_KEY, cursor, "+inf", withscores=True)
+    horizon = int(time.time() * 1000) - VERSION_RETENTION_SECONDS * 1000
+    with _lock:
+        for member, score in rows:
+            user_id = member.decode() if isinstance(member, bytes) else member
+            _versions[user_id] = max(int(score), _versions.get(user_id, 0))
+            cursor = max(cursor, int(score))
+        for user_id in [u for u, v in _versions.items() if v < horizon]:
+            _versions.pop(user_id, None)
+        _state["cursor"] = cursor
+        _state["synced_at"] = time.monotonic()
+
+
+def _refresher():
+    while True:
+        try:
+            _sync_versions()
+        except Exception as e:
+            logger.warning(f"Token version sync failed: {e}")
+        socketio.sleep(_state["refresh_interval"])
+
+
+def start_version_refresher(refresh_interval=5):
+    """Start the per-worker background sync of the version table (idempotent)."""
+    with _lock:
+        if _state["refresher_started"]:
+            return
+        _state["refresher_started"] = True
+        _state["refresh_interval"] = refresh_interval
+    socketio.start_background_task(_refresher)
+
+
+def version_table_is_fresh():
+    """True when the local table was synced recently enough to be trusted instead of redis."""
+    with _lock:
+        synced_at = _state["synced_at"]
+        interval = _state["refresh_interval"]
+    return synced_at is not None and time.monotonic() - synced_at < 3 * interval
+
+
+def is_token_version_current(user_id, version, session_id=None):
+    """
+    Local-only check: a token is revoked if it carries a version older than the latest bump of
+    its user or of its login session.
+    """
+    with _lock:
+        latest = _versions.get(str(user_id), 0)
+        if session_id:
+            latest = max(latest, _versions.get(_member(user_id, session_id), 0))
+    try:
+        return int(version) >= latest
+    except (TypeError, ValueError):
+        return False
+
+
+def token_version_stats():
+    with _lock:
+        synced_at = _state["synced_at"]
+        return {
+            "tracked_users": len(_versions),
+            "seconds_since_sync": round(time.monotonic() - synced_at, 2) if synced_at is not None else None,
+        }
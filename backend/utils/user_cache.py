@@ -0,0 +1,165 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from bson import ObjectId
+from flask import current_app
+
+from backend.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Only the fields routes read from g.current_user are cached; password hashes never leave Mongo.
+USER_PROJECTION = {
+    "_id": 1,
+    "email": 1,
+    "name": 1,
+    "role": 1,
+    "is_active": 1,
+    "is_verified": 1,
+    "email_verified": 1,
+    "student_id": 1,
+    "provider": 1,
+}
+
+REDIS_KEY_PREFIX = "user_cache:"
+
+_local = OrderedDict()
+_lock = Lock()
+_stats = {
+    "local_hits": 0,
+    "redis_hits": 0,
+    "misses": 0,
+    "invalidations": 0,
+}
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _local_get(user_id):
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(user_id)
+        if not entry:
+            return None
+        expires_at, user = entry
+        if expires_at < now:
+            _local.pop(user_id, None)
+            return None
+        _local.move_to_end(user_id)
+        return user
+
+
+def _local_set(user_id, user):
+    ttl = _config("USER_CACHE_LOCAL_TTL", 5)
+    max_entries = _config("USER_CACHE_MAX_ENTRIES", 10000)
+    with _lock:
+        _local[user_id] = (time.monotonic() + ttl, user)
+        _local.move_to_end(user_id)
+        while len(_local) > max_entries:
+            _local.popitem(last=False)
+
+
+def _serialize(user):
+    doc = dict(user)
+    doc["_id"] = str(doc["_id"])
+    return json.dumps(doc)
+
+
+def _deserialize(raw):
+    doc = json.loads(raw)
+    doc["_id"] = ObjectId(doc["_id"])
+    return doc
+
+
+def _redis_get(user_id):
+    client = get_redis()
+    if not client:
+        return None
+    try:
+        raw = client.get(f"{REDIS_KEY_PREFIX}{user_id}")
+        return _deserialize(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"User cache redis read failed: {e}")
+        return None
+
+
+def _redis_set(user_id, user):
+    client = get_redis()
+    if not client:
+        return
+    try:
+        client.setex(f"{REDIS_KEY_PREFIX}{user_id}", _config("USER_CACHE_REDIS_TTL", 60), _serialize(user))
+    except Exception as e:
+        logger.warning(f"User cache redis write failed: {e}")
+
+
+def get_cached_user(user_id):
+    """
+    Return the projected, active user for user_id.
+    Lookup order: per-worker LRU -> Redis -> Mongo. Returns None for unknown or inactive users.
+    """
+    user_id = str(user_id)
+
+    user = _local_get(user_id)
+    if user is not None:
+        _count("local_hits")
+        return user
+
+    user = _redis_get(user_id)
+    if user is not None:
+        _count("redis_hits")
+        _local_set(user_id, user)
+        return user
+
+    _count("misses")
+    user = current_app.mongo.db.users.find_one(
+        {"_id": ObjectId(user_id), "is_active": True},
+        USER_PROJECTION
+    )
+    if user is None:
+        return None
+
+    _local_set(user_id, user)
+    _redis_set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    """Drop a user from both cache tiers. Call after any change to password, is_active or profile."""
+    if not user_id:
+        return
+    user_id = str(user_id)
+    with _lock:
+        _local.pop(user_id, None)
+        _stats["invalidations"] += 1
+
+    client = get_redis()
+    if not client:
+        return
+    try:
+        client.delete(f"{REDIS_KEY_PREFIX}{user_id}")
+    except Exception as e:
+        logger.warning(f"User cache redis invalidation failed: {e}")
+
+
+def user_cache_stats():
+    """Hit/miss counters for this worker; `misses` is the number of Mongo lookups made."""
+    with _lock:
+        stats = dict(_stats)
+        stats["local_size"] = len(_local)
+    lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+    stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else None
+    return stats
@@ -0,0 +1,11 @@
+"""create_app with Mongo swapped for mongomock, for cold-start checks in a fresh interpreter."""
+import flask_pymongo
+import mongomock
+
+flask_pymongo.MongoClient = mongomock.MongoClient
+
+
+def create_app():
+    from backend import create_app
+
+    return create_app()
@@ -0,0 +1,42 @@
+import os
+
+from cryptography.fernet import Fernet
+
+# backend.utils.security reads the key at import time
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+
+import fakeredis  # noqa: E402
+import mongomock  # noqa: E402
+import pytest  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from backend import extensions  # noqa: E402
+from backend.config import Config  # noqa: E402
+
+
+class _Mongo:
+    def __init__(self, db):
+        self.db = db
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(extensions, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def app(db):
+    """A bare Flask app with the project config and an in-memory Mongo (no create_app)."""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["TESTING"] = True
+    app.mongo = _Mongo(db)
+    with app.app_context():
+        yield app
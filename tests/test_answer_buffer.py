@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from backend.utils import answer_buffer
+from backend.utils.answer_buffer import buffer_answers, direct_seq, flush_session, merge_pending
+from backend.utils.migrations import MIGRATIONS, apply_migration
+
+
+def _direct_write(db, session_id, question_id, answer):
+    # what save_answer does when buffering is off or fails
+    db.exam_answers.update_one(
+        {"session_id": session_id, "question_id": question_id},
+        {"$set": {"answer": answer, "saved_at": datetime.utcnow(), "is_final": False, "buffer_seq": direct_seq()},
+         "$setOnInsert": {"_id": ObjectId()}},
+        upsert=True,
+    )
+
+
+def test_direct_write_wins_over_older_buffered_answer(app, db, redis_client, monkeypatch):
+    monkeypatch.setattr(answer_buffer, "_ensure_flusher", lambda: None)
+    apply_migration(db, MIGRATIONS[1])
+    exam_id, session_id, question_id = ObjectId(), ObjectId(), ObjectId()
+
+    assert buffer_answers(exam_id, session_id, [(question_id, "A")])
+    _direct_write(db, session_id, question_id, "B")
+
+    merged = merge_pending(session_id, list(db.exam_answers.find({"session_id": session_id})))
+    assert [doc["answer"] for doc in merged] == ["B"]
+
+    flush_session(db, session_id)
+    docs = list(db.exam_answers.find({"session_id": session_id, "question_id": question_id}))
+    assert [doc["answer"] for doc in docs] == ["B"]
+
+
+def test_later_buffered_answer_replaces_direct_write(app, db, redis_client, monkeypatch):
+    monkeypatch.setattr(answer_buffer, "_ensure_flusher", lambda: None)
+    apply_migration(db, MIGRATIONS[1])
+    exam_id, session_id, question_id = ObjectId(), ObjectId(), ObjectId()
+
+    db.exam_answers.insert_one({
+        "session_id": session_id, "question_id": question_id, "answer": "A", "buffer_seq": direct_seq() - 10**12,
+    })
+    assert buffer_answers(exam_id, session_id, [(question_id, "B")])
+
+    flush_session(db, session_id)
+    docs = list(db.exam_answers.find({"session_id": session_id, "question_id": question_id}))
+    assert [doc["answer"] for doc in docs] == ["B"]
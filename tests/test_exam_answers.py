@@ -0,0 +1,88 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from backend.routes.exam import exam_take
+
+
+@pytest.fixture
+def exam(app, db, redis_client, monkeypatch):
+    from backend.middleware import auth as auth_middleware
+    from backend.routes.auth import access_token_claims, create_jwt
+    from backend.utils import rate_limiter, revocation_filter
+
+    monkeypatch.setattr(auth_middleware, "redis_client", redis_client)
+    monkeypatch.setitem(revocation_filter._state, "listener_started", True)
+    monkeypatch.setattr(rate_limiter, "_sync_started", True)
+    monkeypatch.setattr(exam_take, "push_progress_update", lambda session_id, data: None)
+    app.config.update(EXAM_ANSWER_WRITE_BEHIND=False)
+    app.register_blueprint(exam_take.exam_take_bp, url_prefix="/api/exam_take")
+
+    user_id = db.users.insert_one({"email": "s@example.com", "role": "student", "is_active": True}).inserted_id
+    token = create_jwt(access_token_claims(db.users.find_one({"_id": user_id})))
+    exam_id = db.exams.insert_one({"title": "quiz", "updated_at": datetime(2026, 1, 1)}).inserted_id
+    questions = [ObjectId() for _ in range(3)]
+    db.exam_questions.insert_many([
+        {"_id": qid, "exam_id": exam_id, "type": "mcq", "prompt": "?", "options": ["a", "b"]} for qid in questions
+    ])
+    session_id = db.exam_sessions.insert_one(
+        {"exam_id": exam_id, "user_id": user_id, "status": "in_progress"}
+    ).inserted_id
+
+    client = app.test_client()
+
+    def save(*answers):
+        return client.post(
+            "/api/exam_take/answer",
+            json={"session_id": str(session_id), "answers": [{"question_id": str(q), "answer": a} for q, a in answers]},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    return SimpleNamespace(save=save, questions=questions, session_id=session_id)
+
+
+def test_mixed_batch_is_one_unordered_bulk_write(exam, db, monkeypatch):
+    calls = []
+    bulk_write = db.exam_answers.bulk_write
+
+    def recording_bulk_write(ops, ordered=True):
+        calls.append((len(ops), ordered))
+        return bulk_write(ops, ordered=ordered)
+
+    monkeypatch.setattr(db.exam_answers, "bulk_write", recording_bulk_write)
+    q0, q1, _ = exam.questions
+
+    response = exam.save((q0, "a"), (ObjectId(), "b"), (q1, "B"))
+
+    assert response.status_code == 200
+    assert [r["status"] for r in response.get_json()["results"]] == ["saved", "rejected", "saved"]
+    assert calls == [(2, False)]
+    saved = {doc["question_id"]: doc["answer"] for doc in db.exam_answers.find({"session_id": exam.session_id})}
+    assert saved == {q0: "a", q1: "b"}
+
+
+def test_answering_a_question_again_counts_it_once(exam, db, redis_client):
+    from backend.utils.exam_progress import BITS_PREFIX, get_progress, init_progress
+    from backend.utils.question_cache import get_question_index
+
+    index = get_question_index(db, db.exam_sessions.find_one({"_id": exam.session_id})["exam_id"])
+    init_progress(exam.session_id, index)
+    q0, q1, _ = exam.questions
+    bits = f"{BITS_PREFIX}{exam.session_id}"
+
+    def answered(*answers):
+        return exam.save(*answers).get_json()["progress"]["answered"]
+
+    assert answered((q0, "a")) == 1
+    assert answered((q0, "b")) == 1
+    # the same question twice in one batch, the last answer wins
+    assert answered((q1, "a"), (q1, "b")) == 2
+    assert answered((q1, "b")) == 2
+    assert [redis_client.getbit(bits, index.get(q)["position"]) for q in exam.questions] == [1, 1, 0]
+
+    # clearing an answer flips its bit back
+    assert answered((q0, [])) == 1
+    assert [redis_client.getbit(bits, index.get(q)["position"]) for q in exam.questions] == [0, 1, 0]
+    assert get_progress(str(exam.session_id)) == (1, 3)
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+
+@pytest.fixture
+def client(app, db, redis_client, monkeypatch, tmp_path):
+    from backend.middleware import auth as auth_middleware
+    from backend.routes.exam.exam_manage import exam_manage_bp
+    from backend.routes.exam.exam_take import exam_take_bp
+    from backend.utils import rate_limiter, revocation_filter
+
+    monkeypatch.setattr(auth_middleware, "redis_client", redis_client)
+    monkeypatch.setitem(revocation_filter._state, "listener_started", True)
+    monkeypatch.setattr(rate_limiter, "_sync_started", True)
+    app.config.update(EXAM_PAPER_DIR=str(tmp_path))
+    app.register_blueprint(exam_take_bp, url_prefix="/api/exam_take")
+    app.register_blueprint(exam_manage_bp)
+    return app.test_client()
+
+
+@pytest.fixture
+def exam(app, db):
+    from backend.routes.auth import access_token_claims, create_jwt
+
+    # the owner also sits the exam, so one token serves both routes
+    user_id = db.users.insert_one({"email": "t@example.com", "role": "teacher", "is_active": True}).inserted_id
+    exam_id = db.exams.insert_one({
+        "title": "quiz", "status": "published", "owner_id": user_id, "updated_at": datetime(2026, 1, 1),
+    }).inserted_id
+    question_id = db.exam_questions.insert_one(
+        {"exam_id": exam_id, "type": "mcq", "prompt": "2 + 2?", "options": ["3", "4"]}
+    ).inserted_id
+    db.exam_sessions.insert_one({"exam_id": exam_id, "user_id": user_id, "status": "in_progress"})
+    token = create_jwt(access_token_claims(db.users.find_one({"_id": user_id})))
+    return exam_id, question_id, {"Authorization": f"Bearer {token}"}
+
+
+def test_paper_revalidates_with_304_until_a_question_changes(client, exam):
+    exam_id, question_id, auth = exam
+    url = f"/api/exam_take/{exam_id}/question"
+
+    first = client.get(url, headers=auth)
+    assert first.status_code == 200 and first.get_json()["questions"][0]["text"] == "2 + 2?"
+    etag = first.headers["ETag"]
+
+    cached = client.get(url, headers={**auth, "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["ETag"] == etag and not cached.data
+
+    edited = client.put(f"/api/exam/manage/{exam_id}/questions/{question_id}", json={"prompt": "3 + 3?"}, headers=auth)
+    assert edited.status_code == 200
+
+    fresh = client.get(url, headers={**auth, "If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["ETag"] != etag
+    assert fresh.get_json()["questions"][0]["text"] == "3 + 3?"
+    assert client.get(url, headers={**auth, "If-None-Match": fresh.headers["ETag"]}).status_code == 304
+
+
+def test_unknown_etag_gets_the_paper(client, exam):
+    exam_id, _, auth = exam
+    response = client.get(f"/api/exam_take/{exam_id}/question", headers={**auth, "If-None-Match": f'W/"{ObjectId()}"'})
+    assert response.status_code == 200 and response.get_json()["exam_id"] == str(exam_id)
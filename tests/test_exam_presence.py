@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from backend.utils import exam_presence
+
+
+def _session(exam_id):
+    return {"_id": ObjectId(), "exam_id": exam_id, "user_id": ObjectId(), "started_at": datetime.utcnow()}
+
+
+def test_started_session_without_socket_is_listed_as_disconnected(app, redis_client):
+    exam_id = ObjectId()
+    idle, live = _session(exam_id), _session(exam_id)
+    exam_presence.join(idle, connections=0)
+    exam_presence.join(live, connections=0)
+    exam_presence.join(live)
+
+    assert exam_presence.heartbeat(live["_id"], {"question": 3})
+    present = {p["session_id"]: p for p in exam_presence.live_sessions(exam_id)}
+    assert present[str(idle["_id"])]["presence"] == "disconnected"
+    assert present[str(live["_id"])]["presence"] == "online"
+    assert present[str(live["_id"])]["question"] == "3"
+
+    exam_presence.leave(live["_id"])
+    assert exam_presence.presence_summary(exam_presence.live_sessions(exam_id)) == {
+        "online": 0, "idle": 0, "disconnected": 2,
+    }
+
+
+def test_heartbeat_without_presence_is_refused(app, redis_client):
+    assert not exam_presence.heartbeat(ObjectId())
+    assert "exam_presence:" not in exam_presence._HEARTBEAT_SCRIPT
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from backend.routes.exam import exam_take
+
+
+@pytest.fixture
+def submit(app, db, redis_client, monkeypatch):
+    from backend.middleware import auth as auth_middleware
+    from backend.routes.auth import access_token_claims, create_jwt
+    from backend.utils import rate_limiter, revocation_filter
+
+    monkeypatch.setattr(auth_middleware, "redis_client", redis_client)
+    monkeypatch.setitem(revocation_filter._state, "listener_started", True)
+    monkeypatch.setattr(rate_limiter, "_sync_started", True)
+    app.register_blueprint(exam_take.exam_take_bp, url_prefix="/api/exam_take")
+
+    user_id = db.users.insert_one({"email": "s@example.com", "role": "student", "is_active": True}).inserted_id
+    token = create_jwt(access_token_claims(db.users.find_one({"_id": user_id})))
+    session_id = db.exam_sessions.insert_one(
+        {"exam_id": ObjectId(), "user_id": user_id, "status": "in_progress"}
+    ).inserted_id
+    db.exam_results.insert_one({"session_id": session_id, "status": "in_progress"})
+
+    graded = []
+
+    def grade_submission(db, session):
+        graded.append(session["_id"])
+        db.exam_results.update_one({"session_id": session["_id"]}, {"$set": {
+            "grading_status": "graded", "graded": True, "auto_score": 3, "possible_score": 4,
+        }})
+        return {"auto_score": 3, "possible_score": 4, "needs_manual_review": False}
+
+    monkeypatch.setattr(exam_take, "grade_submission", grade_submission)
+    client = app.test_client()
+
+    def post(**body):
+        return client.post(
+            "/api/exam_take/submit",
+            json={"session_id": str(session_id), **body},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    return SimpleNamespace(post=post, session_id=session_id, graded=graded)
+
+
+def test_async_submit_queues_grading_once(submit, db, monkeypatch):
+    queued = []
+    monkeypatch.setattr(exam_take, "grade_submission_task", SimpleNamespace(delay=queued.append))
+
+    first = submit.post(**{"async": True})
+    assert first.status_code == 202 and first.get_json()["grading_status"] == "queued"
+    assert queued == [str(submit.session_id)]
+    assert db.exam_sessions.find_one({"_id": submit.session_id})["status"] == "submitted"
+
+    # a retry while the job is still queued reports it instead of queueing another
+    retry = submit.post(**{"async": True})
+    assert retry.status_code == 202 and retry.get_json()["grading_status"] == "queued"
+    assert queued == [str(submit.session_id)] and submit.graded == []
+
+
+def test_failed_enqueue_grades_inline(submit, db, monkeypatch):
+    def delay(session_id):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(exam_take, "grade_submission_task", SimpleNamespace(delay=delay))
+
+    response = submit.post(**{"async": True})
+    assert response.status_code == 200
+    assert response.get_json()["auto_score"] == 3
+    assert submit.graded == [submit.session_id]
+
+    # submitting again returns the stored result without grading a second time
+    again = submit.post()
+    assert again.status_code == 200
+    assert again.get_json()["auto_score"] == 3 and again.get_json()["message"] == "Already submitted"
+    assert submit.graded == [submit.session_id]
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from backend.routes.exam.exam_take import normalize_answer_for_type
+from backend.utils.batch_grading import _score_numpy
+from backend.utils.grading_keys import ExamGradingKeys, grade_answer
+from backend.utils.security import encrypt_answer
+
+
+def _mcq(answer, allow_partial=False, points=4):
+    return {
+        "_id": ObjectId(),
+        "type": "mcq",
+        "points": points,
+        "allow_partial": allow_partial,
+        "answer_key_encrypted": encrypt_answer(answer),
+    }
+
+
+def _keys(*questions):
+    return ExamGradingKeys(SimpleNamespace(exam_id="exam", version_token="v1", order=list(questions)))
+
+
+def test_mcq_rejects_non_scalar_selections():
+    assert normalize_answer_for_type("mcq", [{"x": 1}])[1]
+    assert normalize_answer_for_type("mcq", {"x": 1})[1]
+    assert normalize_answer_for_type("mcq", [["a"]])[1]
+    assert normalize_answer_for_type("mcq", ["B", " a "]) == (["a", "b"], None)
+    assert normalize_answer_for_type("mcq", 2) == ("2", None)
+
+
+def test_unhashable_mcq_selection_scores_zero(app):
+    key = _keys(_mcq(["a", "b"], allow_partial=True)).order[0]
+    assert grade_answer(key, [{"x": 1}]) == (0, False)
+    assert grade_answer(key, [["a"], "b"]) == (0, False)
+
+
+def test_batch_grading_survives_a_bad_cell(app):
+    np = __import__("numpy")
+    keys = _keys(_mcq(["a", "b"], allow_partial=True))
+    totals, _, _, _ = _score_numpy(np, keys, [[["a", "b"], [{"x": 1}], ["a"]]], 3)
+    assert list(totals) == [4.0, 0.0, 2.0]
+
+
+def _baseline_mcq(correct_answer, user_answer, allow_partial, points):
+    # the MCQ branch of submit_session before keys were precompiled
+    from backend.models.question import normalize_answer
+
+    corr, given = normalize_answer(correct_answer), normalize_answer(user_answer)
+    if isinstance(corr, list):
+        corr = sorted(corr)
+    if isinstance(given, list):
+        given = sorted(given)
+    if corr == given:
+        return points
+    if allow_partial and isinstance(corr, list) and isinstance(given, list):
+        return (len(set(corr) & set(given)) / len(corr)) * points
+    return 0
+
+
+def test_both_graders_match_baseline_mcq_scores(app):
+    np = __import__("numpy")
+    answers = [["a"], ["a", "c"], ["a", "b", "c", "d"], ["c"], ["B", "a"], [], "a", None, ["a", "a"]]
+    for correct, allow_partial in ((["a", "b"], True), (["a", "b", "c"], True), (["a", "b"], False), ("a", True)):
+        keys = _keys(_mcq(correct, allow_partial=allow_partial))
+        expected = [_baseline_mcq(correct, a, allow_partial, 4) for a in answers]
+        assert [grade_answer(keys.order[0], a)[0] for a in answers] == expected
+        totals, _, _, _ = _score_numpy(np, keys, [answers], len(answers))
+        assert list(totals) == expected
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from backend.utils import grading_jobs
+from backend.utils.migrations import MIGRATIONS
+
+
+@pytest.fixture
+def exam(app, db, monkeypatch):
+    app.config.update(GRADING_CHUNK_SIZE=2)
+    # mongomock's create_indexes drops partialFilterExpression, so build the index directly
+    (model,) = MIGRATIONS[4]["indexes"]["grading_jobs"]
+    options = dict(model.document)
+    db.grading_jobs.create_index(list(options.pop("key").items()), **options)
+
+    exam = SimpleNamespace(id=ObjectId(), version="v1")
+    db.exam_sessions.insert_many([{"exam_id": exam.id, "status": "submitted"} for _ in range(5)])
+    monkeypatch.setattr(grading_jobs, "get_question_index", lambda db, exam_id: SimpleNamespace(version_token=exam.version))
+    monkeypatch.setattr(grading_jobs, "get_grading_keys", lambda db, exam_id: None)
+    monkeypatch.setattr(grading_jobs, "write_results", lambda db, keys, sessions: len(sessions))
+    return exam
+
+
+def test_job_grades_each_chunk_once(db, exam):
+    job, dispatch = grading_jobs.start_job(db, exam.id)
+    assert dispatch and [c["sessions"] for c in job["chunks"]] == [2, 2, 1]
+
+    assert grading_jobs.run_chunk(db, job["_id"], 0) == 2
+    # a redelivered chunk is skipped
+    assert grading_jobs.run_chunk(db, job["_id"], 0) == 0
+    for index in grading_jobs.pending_chunks(grading_jobs.find_job(db, job["_id"])):
+        grading_jobs.run_chunk(db, job["_id"], index)
+
+    done = grading_jobs.finish_job(db, job["_id"])
+    assert done["status"] == "completed" and done["graded"] == 5
+    assert grading_jobs.job_progress(done)["percent"] == 100.0
+
+
+def test_failed_job_resumes_from_its_checkpoint(db, exam):
+    job, _ = grading_jobs.start_job(db, exam.id)
+    grading_jobs.run_chunk(db, job["_id"], 0)
+    grading_jobs.fail_job(db, job["_id"], 1, "worker lost")
+
+    resumed, dispatch = grading_jobs.start_job(db, exam.id)
+    assert dispatch and resumed["_id"] == job["_id"] and resumed["status"] == "queued"
+    assert grading_jobs.pending_chunks(resumed) == [1, 2]
+
+    # a queued job that still checkpoints is reused without dispatching it again
+    again, dispatch = grading_jobs.start_job(db, exam.id)
+    assert not dispatch and again["_id"] == job["_id"]
+
+
+def test_question_edit_supersedes_the_running_job(db, exam):
+    old, _ = grading_jobs.start_job(db, exam.id)
+    exam.version = "v2"
+
+    new, dispatch = grading_jobs.start_job(db, exam.id)
+    assert dispatch and new["_id"] != old["_id"] and new["version"] == "v2"
+    assert grading_jobs.find_job(db, old["_id"])["status"] == "superseded"
+    assert grading_jobs.run_chunk(db, old["_id"], 0) == 0
+
+
+def test_concurrent_starts_create_one_job(db, exam, monkeypatch):
+    chunk_bounds = grading_jobs._chunk_bounds
+    racer = {}
+
+    def chunk_bounds_after_a_racing_start(db, exam_id, chunk_size):
+        # another request passes the find and inserts its job while this one chunks the exam
+        monkeypatch.setattr(grading_jobs, "_chunk_bounds", chunk_bounds)
+        racer["job"], _ = grading_jobs.start_job(db, exam_id)
+        return chunk_bounds(db, exam_id, chunk_size)
+
+    monkeypatch.setattr(grading_jobs, "_chunk_bounds", chunk_bounds_after_a_racing_start)
+    job, dispatch = grading_jobs.start_job(db, exam.id)
+
+    assert not dispatch and job["_id"] == racer["job"]["_id"]
+    assert db.grading_jobs.count_documents({"exam_id": exam.id}) == 1
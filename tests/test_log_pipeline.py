@@ -0,0 +1,26 @@
+import io
+import json
+import logging
+
+from backend.utils.log_pipeline import configure_logging, stop_logging
+
+
+def test_records_are_rendered_before_they_are_queued():
+    stream = io.StringIO()
+    configure_logging({"LOG_FORMAT": "json", "LOG_LEVEL": "INFO"}, stream=stream)
+    try:
+        payload = {"state": "before"}
+        logger = logging.getLogger("tests.log_pipeline")
+        logger.info("payload %s", payload)
+        payload["state"] = "after"
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        stop_logging()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert lines[0]["msg"] == "payload {'state': 'before'}"
+    assert lines[1]["msg"] == "failed"
+    assert "ValueError: boom" in lines[1]["exc"]
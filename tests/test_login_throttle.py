@@ -0,0 +1,29 @@
+from backend.utils.login_throttle import clear_login_failures, login_retry_after, record_login_failure
+
+HALL = "203.0.113.7"
+
+
+def test_identifier_window_backs_off_after_threshold(app, redis_client):
+    app.config.update(LOGIN_MAX_FAILURES_PER_IDENTIFIER=3, LOGIN_BACKOFF_BASE_SECONDS=10)
+    for _ in range(2):
+        assert record_login_failure("alice@example.com", HALL) == 0
+    assert login_retry_after("alice@example.com", HALL) == 0
+
+    assert record_login_failure("alice@example.com", HALL) == 10
+    assert record_login_failure("alice@example.com", HALL) == 20
+    assert 0 < login_retry_after("alice@example.com", HALL) <= 21
+
+    clear_login_failures("alice@example.com")
+    assert login_retry_after("alice@example.com", HALL) == 0
+
+
+def test_ip_window_only_delays_a_shared_address(app, redis_client):
+    app.config.update(LOGIN_MAX_FAILURES_PER_IP=10, LOGIN_IP_MAX_DELAY_SECONDS=2)
+    # a hall of students behind one NAT address, each mistyping once or twice
+    for student in range(30):
+        record_login_failure(f"student{student}@example.com", HALL)
+        record_login_failure(f"student{student}@example.com", HALL)
+
+    # everyone on the address waits at most the short IP delay, never the identifier backoff
+    assert 0 < login_retry_after("newcomer@example.com", HALL) <= 2
+    assert login_retry_after("newcomer@example.com", "198.51.100.1") == 0
@@ -0,0 +1,40 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.utils import migrations
+
+
+def _hold_lock(db, version, seconds=60):
+    db[migrations.META_COLLECTION].insert_one({
+        "_id": migrations.META_ID,
+        "version": version,
+        "locked_until": datetime.utcnow() + timedelta(seconds=seconds),
+        "locked_by": "replica-1",
+    })
+
+
+def test_upgrade_succeeds_while_locked_when_schema_is_current(db):
+    _hold_lock(db, migrations.LATEST_VERSION)
+    assert migrations.upgrade(db, owner="replica-2") == []
+
+
+def test_upgrade_fails_while_locked_with_pending_migrations(db):
+    _hold_lock(db, 0)
+    with pytest.raises(RuntimeError):
+        migrations.upgrade(db, owner="replica-2")
+
+
+def test_upgrade_waits_for_the_lock(db, monkeypatch):
+    monkeypatch.setattr(migrations, "LOCK_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(migrations, "apply_migration", lambda db, migration: None)
+    _hold_lock(db, 0)
+    timer = threading.Timer(0.1, migrations._release_lock, args=(db,))
+    timer.start()
+    try:
+        applied = migrations.upgrade(db, owner="replica-2", wait_seconds=5)
+    finally:
+        timer.cancel()
+    assert applied == [m["version"] for m in migrations.MIGRATIONS]
+    assert migrations.current_version(db) == migrations.LATEST_VERSION
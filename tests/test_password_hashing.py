@@ -0,0 +1,31 @@
+import os
+import signal
+import time
+
+import pytest
+
+from backend.utils import password_hashing
+from backend.utils.password_hashing import HashingBusy, hash_password, verify_password
+
+
+def test_pool_rebuilds_after_a_hasher_dies(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1)
+    pwhash = hash_password("secret")
+    executor = password_hashing._pool["executor"]
+    assert executor._mp_context.get_start_method() in ("forkserver", "spawn")
+
+    for pid in list(executor._processes):
+        os.kill(pid, signal.SIGKILL)
+
+    assert verify_password(pwhash, "secret")
+    assert password_hashing._pool["executor"] is not executor
+    assert not verify_password(pwhash, "wrong")
+
+
+def test_slow_hash_maps_to_hashing_busy(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_TIMEOUT=0.2, PASSWORD_HASH_RETRY_AFTER=3)
+    hash_password("warm up the pool")
+
+    with pytest.raises(HashingBusy) as excinfo:
+        password_hashing._run(time.sleep, 1)
+    assert excinfo.value.retry_after == 3
@@ -0,0 +1,34 @@
+from bson import ObjectId
+
+from backend.utils import proctor_ingest
+from backend.utils.proctor_ingest import flush, ingest
+
+
+def test_events_flush_as_one_batch_with_folded_counters(app, db, monkeypatch):
+    monkeypatch.setitem(proctor_ingest._state, "app", app)
+    monkeypatch.setattr(proctor_ingest, "_ensure_flusher", lambda: None)
+    session_id = db.exam_sessions.insert_one({"violation_count": 1}).inserted_id
+
+    for kind in ("blur", "focus", "devtools"):
+        assert ingest(db, session_id, kind, {"n": 1})
+    assert ingest(db, session_id, "blur", {"blob": "x" * 10000})
+    assert db.proctor_logs.count_documents({}) == 0
+
+    assert flush(db) == 4
+    assert db.exam_sessions.find_one({"_id": session_id})["violation_count"] == 5
+    logs = list(db.proctor_logs.find({"session_id": session_id}))
+    assert len(logs) == 4
+    assert logs[-1]["details"]["truncated"]
+
+
+def test_full_buffer_rejects_when_it_cannot_drain(app, db, monkeypatch):
+    monkeypatch.setitem(proctor_ingest._state, "app", app)
+    monkeypatch.setattr(proctor_ingest, "_ensure_flusher", lambda: None)
+    monkeypatch.setattr(proctor_ingest, "_insert", lambda db, events: (_ for _ in ()).throw(RuntimeError("down")))
+    app.config["PROCTOR_BUFFER_MAX"] = 2
+    session_id = ObjectId()
+
+    assert ingest(db, session_id, "blur")
+    assert ingest(db, session_id, "blur")
+    assert not ingest(db, session_id, "blur")
+    proctor_ingest._take()
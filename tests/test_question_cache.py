@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from backend.utils import question_cache
+from backend.utils.question_cache import get_question_index
+
+
+@pytest.fixture
+def exam(app, db, redis_client, monkeypatch):
+    monkeypatch.setattr(question_cache, "_local", OrderedDict())
+    monkeypatch.setitem(question_cache._stats, "loads", 0)
+    exam_id = db.exams.insert_one({"title": "quiz", "updated_at": datetime(2026, 1, 1)}).inserted_id
+    db.exam_questions.insert_many([
+        {"_id": ObjectId(), "exam_id": exam_id, "type": "mcq", "prompt": f"Q{i}", "points": 1} for i in range(3)
+    ])
+    return exam_id
+
+
+def _edit_question(db, exam_id, prompt):
+    # what an exam edit does: change the question, then bump the exam's updated_at
+    question = db.exam_questions.find_one({"exam_id": exam_id}, sort=[("_id", 1)])
+    db.exam_questions.update_one({"_id": question["_id"]}, {"$set": {"prompt": prompt}})
+    updated_at = db.exams.find_one({"_id": exam_id})["updated_at"] + timedelta(seconds=1)
+    db.exams.update_one({"_id": exam_id}, {"$set": {"updated_at": updated_at}})
+
+
+def test_bare_id_lookup_reloads_after_updated_at_bump(app, db, exam):
+    app.config.update(QUESTION_CACHE_RECHECK_SECONDS=0)
+    first = get_question_index(db, exam)
+    assert [q["prompt"] for q in first.order] == ["Q0", "Q1", "Q2"]
+    assert get_question_index(db, exam) is first
+    assert question_cache._stats["loads"] == 1
+
+    # edited by another worker: this worker's entry was never invalidated
+    _edit_question(db, exam, "Q0 (fixed)")
+
+    reloaded = get_question_index(db, exam)
+    assert reloaded is not first and reloaded.order[0]["prompt"] == "Q0 (fixed)"
+    assert reloaded.version_token != first.version_token
+    assert question_cache._stats["loads"] == 2
+
+
+def test_exam_document_lookup_reloads_without_a_version_query(app, db, exam):
+    app.config.update(QUESTION_CACHE_RECHECK_SECONDS=3600)
+    first = get_question_index(db, db.exams.find_one({"_id": exam}))
+    _edit_question(db, exam, "Q0 (fixed)")
+
+    # within the recheck interval a bare id still gets the cached version
+    assert get_question_index(db, exam) is first
+
+    checks = question_cache._stats["version_checks"]
+    reloaded = get_question_index(db, db.exams.find_one({"_id": exam}))
+    assert reloaded.order[0]["prompt"] == "Q0 (fixed)"
+    assert question_cache._stats["version_checks"] == checks
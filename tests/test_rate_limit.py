@@ -0,0 +1,42 @@
+from bson import ObjectId
+from flask import g
+
+from backend.middleware.rate_limit import current_user_key, rate_limit
+from backend.utils import rate_limiter
+
+
+def test_user_keyed_limit_is_per_student_behind_one_ip(app, monkeypatch):
+    # no background syncer: the counters stay local to this test
+    monkeypatch.setattr(rate_limiter, "_sync_started", True)
+    alice, bob = ObjectId(), ObjectId()
+
+    @rate_limit("2 per minute", key_func=current_user_key, scope=f"test:{ObjectId()}")
+    def save():
+        return "ok"
+
+    def call(user_id):
+        with app.test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+            g.current_user = {"_id": user_id}
+            return save()
+
+    assert [call(alice), call(alice)] == ["ok", "ok"]
+    response, status = call(alice)
+    assert status == 429 and response.headers["Retry-After"]
+    assert call(bob) == "ok"
+
+
+def test_current_user_key_falls_back_to_ip(app):
+    with app.test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.2"}):
+        assert current_user_key() == "10.0.0.2"
+
+
+def test_exact_limit_counts_checks_and_rejections(redis_client, monkeypatch):
+    monkeypatch.setitem(rate_limiter._stats, "exact_checks", 0)
+    monkeypatch.setitem(rate_limiter._stats, "rejected", 0)
+    (limit,) = rate_limiter.compile_limits("2 per minute", scope=f"test:{ObjectId()}", exact=True)
+
+    retry_after = [rate_limiter.hit_exact(limit, "10.0.0.3", now=60.0) for _ in range(3)]
+
+    assert retry_after == [0, 0, 60.0]
+    stats = rate_limiter.rate_limiter_stats()
+    assert stats["exact_checks"] == 3 and stats["rejected"] == 1
@@ -0,0 +1,69 @@
+import re
+
+import pytest
+
+from backend.utils import refresh_tokens
+from backend.utils.refresh_tokens import (
+    RefreshTokenReuse,
+    issue_refresh_token,
+    revoke_refresh_family,
+    revoke_refresh_token,
+    revoke_user_refresh_tokens,
+    rotate_refresh_token,
+)
+from backend.utils.session_registry import list_sessions
+
+
+@pytest.mark.parametrize("name", ["_REVOKE_USER_SCRIPT", "_REVOKE_FAMILY_SCRIPT"])
+def test_scripts_only_touch_declared_keys(name):
+    # every key comes from KEYS; a quoted key prefix would mean one is built inside Lua
+    assert not re.search(r"'(rt|rt_family|rt_user|sessions|token_versions)[:_']", getattr(refresh_tokens, name))
+
+
+def test_rotate_and_revoke_are_one_round_trip(app, redis_client, monkeypatch):
+    token, _ = issue_refresh_token("u0")
+    commands = []
+    execute = redis_client.execute_command
+
+    def counted(*args, **kwargs):
+        commands.append(args[0])
+        return execute(*args, **kwargs)
+
+    monkeypatch.setattr(redis_client, "execute_command", counted)
+    new_token = rotate_refresh_token(token)[0]
+    assert commands == ["EVAL"]
+    assert revoke_refresh_token(new_token) == ("u0", redis_client.hget(f"rt:{refresh_tokens.hash_token(new_token)}", "family"))
+    assert commands == ["EVAL", "EVAL", "HGET"]
+
+
+def test_rotation_grace_then_reuse(app, redis_client):
+    token, family = issue_refresh_token("u1")
+    new_token, user_id, rotated_family, _ = rotate_refresh_token(token)
+    assert (user_id, rotated_family) == ("u1", family)
+
+    # a second tab presenting the same token right away gets the same successor
+    assert rotate_refresh_token(token)[0] == new_token
+
+    app.config["REFRESH_TOKEN_GRACE_SECONDS"] = 0
+    redis_client.hset(f"rt:{refresh_tokens.hash_token(token)}", "used_at", 0)
+    with pytest.raises(RefreshTokenReuse):
+        rotate_refresh_token(token)
+    assert rotate_refresh_token(new_token) is None
+    assert list_sessions("u1") == []
+
+
+def test_revoke_family_and_user(app, redis_client):
+    phone, phone_family = issue_refresh_token("u2", device="phone")
+    laptop, _ = issue_refresh_token("u2", device="laptop")
+    tablet, _ = issue_refresh_token("u2", device="tablet")
+
+    assert not revoke_refresh_family("someone-else", phone_family)
+    assert revoke_refresh_family("u2", phone_family)
+    assert rotate_refresh_token(phone) is None
+    assert len(list_sessions("u2")) == 2
+
+    assert revoke_user_refresh_tokens("u2") == 2
+    assert rotate_refresh_token(laptop) is None
+    assert rotate_refresh_token(tablet) is None
+    assert list_sessions("u2") == []
+    assert not redis_client.exists("rt_user:u2")
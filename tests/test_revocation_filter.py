@@ -0,0 +1,70 @@
+import pytest
+
+from backend.utils import revocation_filter
+from backend.utils.revocation_filter import (
+    BLACKLIST_KEY_PREFIX,
+    REVOCATION_CHANNEL,
+    add_revoked_jti,
+    might_be_revoked,
+    publish_revocation,
+)
+
+CAPACITY, ERROR_RATE = 1000, 0.001
+
+
+@pytest.fixture(autouse=True)
+def fresh_filter(monkeypatch):
+    for name, value in {"filter": None, "ready": False, "built_at": None}.items():
+        monkeypatch.setitem(revocation_filter._state, name, value)
+
+
+def _next_message(pubsub):
+    message = None
+    for _ in range(10):
+        message = pubsub.get_message(timeout=0.1)
+        if message:
+            return message
+    raise AssertionError("no pub/sub message")
+
+
+def test_added_jti_is_reported_only_once_ready(redis_client):
+    assert might_be_revoked("jti-1") is None
+
+    revocation_filter._rebuild_filter(redis_client, CAPACITY, ERROR_RATE)
+    add_revoked_jti("jti-1")
+
+    assert might_be_revoked("jti-1") is True
+    assert might_be_revoked("jti-2") is False
+
+
+def test_published_revocation_reaches_other_workers(redis_client):
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe(REVOCATION_CHANNEL)
+    revocation_filter._handle_message(_next_message(pubsub), redis_client, CAPACITY, ERROR_RATE)
+
+    publish_revocation("jti-3")
+    message = _next_message(pubsub)
+    assert message["data"] == "jti-3"
+
+    # another worker's filter, fed only by the channel
+    revocation_filter._state["filter"] = revocation_filter.BloomFilter(CAPACITY, ERROR_RATE)
+    revocation_filter._handle_message(message, redis_client, CAPACITY, ERROR_RATE)
+    assert might_be_revoked("jti-3") is True
+
+
+def test_every_resubscribe_rebuilds_from_redis(redis_client):
+    redis_client.set(f"{BLACKLIST_KEY_PREFIX}jti-4", 1)
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe(REVOCATION_CHANNEL)
+    revocation_filter._handle_message(_next_message(pubsub), redis_client, CAPACITY, ERROR_RATE)
+    assert might_be_revoked("jti-4") is True
+
+    # revoked while this worker's connection was down: the message itself is lost
+    redis_client.set(f"{BLACKLIST_KEY_PREFIX}jti-5", 1)
+    assert might_be_revoked("jti-5") is False
+
+    pubsub.connection.disconnect()
+    message = _next_message(pubsub)
+    assert message["type"] == "subscribe"
+    revocation_filter._handle_message(message, redis_client, CAPACITY, ERROR_RATE)
+    assert might_be_revoked("jti-5") is True
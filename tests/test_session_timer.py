@@ -0,0 +1,123 @@
+import multiprocessing
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+import redis
+from bson import ObjectId
+from flask import Flask
+
+from backend import extensions
+from backend.utils import session_timer
+
+WORKERS = 3
+SESSIONS = 40
+
+
+@pytest.fixture
+def time_ups(monkeypatch):
+    """session_id -> number of `time_up` emits."""
+    emitted = Counter()
+
+    def emit(event, data, **kwargs):
+        if event == "time_up":
+            emitted[data["session_id"]] += 1
+
+    monkeypatch.setattr(session_timer.socketio, "emit", emit)
+    return emitted
+
+
+def _open_sessions(db, n, expire_at):
+    exam_id = db.exams.insert_one({"title": "timer", "questions": []}).inserted_id
+    sessions = [
+        {"_id": ObjectId(), "exam_id": exam_id, "user_id": ObjectId(), "status": "in_progress", "expire_at": at}
+        for at in (expire_at(i) for i in range(n))
+    ]
+    db.exam_sessions.insert_many(sessions)
+    db.exam_results.insert_many([{"session_id": s["_id"], "status": "in_progress"} for s in sessions])
+    return sessions
+
+
+def test_expire_sessions_announces_each_session_once(app, db, redis_client, time_ups):
+    past = datetime.utcnow() - timedelta(seconds=1)
+    sessions = _open_sessions(db, 5, lambda i: past)
+    ids = [s["_id"] for s in sessions]
+
+    assert session_timer.expire_sessions(db, ids[:3]) == 3
+    # a second run, e.g. from a worker that lost its lease mid-tick, only gets the rest
+    assert session_timer.expire_sessions(db, ids) == 2
+    assert session_timer.expire_sessions(db, ids) == 0
+
+    assert time_ups == Counter({str(sid): 1 for sid in ids})
+    assert db.exam_sessions.count_documents({"status": "submitted", "auto_submitted": True}) == 5
+
+
+def _worker(port, results, stop_at):
+    # a forked scheduler: real leases and ticks against the shared redis, with the due ids
+    # sent to the parent, which runs the real expire_sessions against its Mongo
+    app = Flask(f"worker-{port}")
+    app.config.update(SESSION_TIMER_LEASE_MS=600, SESSION_TIMER_PARTITIONS=8, SESSION_TIMER_MILESTONES="")
+    client = redis.Redis(port=port, decode_responses=True)
+    owned = set()
+
+    def expire(db, session_ids):
+        results.put(("due", session_ids))
+        return len(session_ids)
+
+    with app.app_context():
+        while time.time() < stop_at:
+            session_timer.tick(None, client, expire=expire)
+            owned |= session_timer._owned
+            time.sleep(0.02)
+    results.put(("owned", sorted(owned)))
+
+
+def test_timers_across_processes_emit_time_up_once(app, db, time_ups, monkeypatch):
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = redis.Redis(port=port, decode_responses=True)
+        monkeypatch.setattr(extensions, "redis_client", client)
+        monkeypatch.setattr(session_timer, "_ensure_scheduler", lambda: None)
+        app.config.update(SESSION_TIMER_PARTITIONS=8, SESSION_TIMER_MILESTONES="")
+
+        # deadlines spread over the run, so partitions change hands while sessions come due
+        start = datetime.utcnow()
+        sessions = _open_sessions(db, SESSIONS, lambda i: start + timedelta(milliseconds=50 * i))
+        for session in sessions:
+            session_timer.schedule_session(session["_id"], session["expire_at"])
+
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        stop_at = time.time() + 4
+        workers = [ctx.Process(target=_worker, args=(port, results, stop_at)) for _ in range(WORKERS)]
+        for worker in workers:
+            worker.start()
+
+        handed, owners, submitted = [], [], 0
+        while len(owners) < WORKERS:
+            try:
+                kind, payload = results.get(timeout=10)
+            except queue.Empty:
+                break
+            if kind == "due":
+                handed += payload
+                submitted += session_timer.expire_sessions(db, payload)
+            else:
+                owners.append(payload)
+        for worker in workers:
+            worker.join(timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(owners) == WORKERS
+    assert sum(1 for owned in owners if owned) > 1, "partitions never spread over the workers"
+    assert set(handed) == {str(s["_id"]) for s in sessions}
+    assert submitted == SESSIONS
+    assert time_ups == Counter({str(s["_id"]): 1 for s in sessions})
@@ -0,0 +1,25 @@
+from bson import ObjectId
+
+from backend.models.exam import find_exam, find_published_exam_by_code, invalidate_exam
+
+
+def test_exam_writes_drop_shared_lookups(app, db, redis_client):
+    app.config.update(SINGLE_FLIGHT_REDIS=True, SINGLE_FLIGHT_RESULT_MS=60000)
+    exam_id = db.exams.insert_one({"title": "before", "code": "ABC", "status": "published"}).inserted_id
+    assert find_exam(exam_id)["title"] == "before"
+    assert find_exam(str(exam_id), published_only=True)["title"] == "before"
+    assert find_published_exam_by_code("ABC")["title"] == "before"
+
+    db.exams.update_one({"_id": exam_id}, {"$set": {"title": "after"}})
+    # other workers would still be served the shared pre-edit copy
+    assert find_exam(exam_id)["title"] == "before"
+
+    invalidate_exam(exam_id, "ABC")
+    assert find_exam(exam_id)["title"] == "after"
+    assert find_exam(exam_id, published_only=True)["title"] == "after"
+    assert find_published_exam_by_code("ABC")["title"] == "after"
+
+
+def test_invalidate_without_shared_results_is_a_no_op(app, redis_client):
+    invalidate_exam(ObjectId(), None)
+    assert redis_client.dbsize() == 0
@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from cryptography.fernet import Fernet
+
+from backend.config import Config
+from backend.utils import security
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a fresh interpreter with Mongo swapped for mongomock; the clock covers importing backend
+# and create_app, i.e. what a worker pays before serving its first request
+_COLD_START = """
+import sys, time
+import flask_pymongo, mongomock
+flask_pymongo.MongoClient = mongomock.MongoClient
+start = time.perf_counter()
+from backend import create_app
+create_app()
+print(f"create_app_ms={(time.perf_counter() - start) * 1000:.1f}")
+print("loaded=" + ",".join(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+# imported on first use only (grading, answer encryption, celery dispatch, uploads, mail, docs);
+# the cryptography package itself is loaded by redis-py, so only Fernet is checked
+DEFERRED = {"numpy", "cryptography.fernet", "celery", "cloudinary", "sib_api_v3_sdk", "flasgger"}
+
+
+def _env(fernet_key):
+    return {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "FERNET_KEY": fernet_key,
+        "MONGO_URI": "mongodb://localhost:27017",
+        "SCHEMA_AUTO_UPGRADE": "true",
+    }
+
+
+def _cold_start(fernet_key):
+    snippet = _COLD_START.replace("{heavy!r}", repr(DEFERRED))
+    return subprocess.run(
+        [sys.executable, "-c", snippet], cwd=ROOT, env=_env(fernet_key), capture_output=True, text=True, timeout=60
+    )
+
+
+def test_create_app_cold_start_within_budget():
+    proc = _cold_start(Fernet.generate_key().decode())
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    create_app_ms = float(proc.stdout.rsplit("create_app_ms=", 1)[1].split()[0])
+    assert create_app_ms < Config.STARTUP_BUDGET_MS
+
+
+def test_create_app_defers_heavy_dependencies():
+    proc = _cold_start(Fernet.generate_key().decode())
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert proc.stdout.rsplit("loaded=", 1)[1].strip() == ""
+
+
+def test_import_profile_reports_modules():
+    entry = "tests.coldstart:create_app"
+    proc = subprocess.run(
+        [sys.executable, "-m", "flask", "--app", entry, "import-profile", "--entry", entry, "--top", "5", "--budget-ms", "100000"],
+        cwd=ROOT, env=_env(Fernet.generate_key().decode()), capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert "cumulative ms" in proc.stdout and "top-level packages:" in proc.stdout
+    assert "backend" in proc.stdout.split("top-level packages:")[1]
+    assert "create_app wall:" in proc.stdout
+
+
+def test_create_app_rejects_malformed_fernet_key():
+    proc = _cold_start("not-a-fernet-key")
+    assert proc.returncode != 0
+    assert "FERNET_KEY is invalid" in proc.stderr
+
+
+@pytest.mark.parametrize("key", ["", "short", Fernet.generate_key().decode()[:-4]])
+def test_check_fernet_key(monkeypatch, key):
+    monkeypatch.setattr(security, "FERNET_KEY", key)
+    with pytest.raises(RuntimeError):
+        security.check_fernet_key()
+
+
+def test_check_fernet_key_accepts_valid_key(monkeypatch):
+    monkeypatch.setattr(security, "FERNET_KEY", Fernet.generate_key().decode())
+    security.check_fernet_key()
@@ -0,0 +1,72 @@
+import pytest
+from flask import g
+
+from backend.utils.token_version import bump_token_version, get_token_version, is_token_version_current
+
+
+def test_session_bump_revokes_only_that_session(redis_client):
+    version = get_token_version("u1")
+    bump_token_version("u1", "phone")
+
+    assert not is_token_version_current("u1", version, "phone")
+    assert is_token_version_current("u1", version, "laptop")
+    assert is_token_version_current("u1", version)
+
+
+def test_user_bump_revokes_every_session(redis_client):
+    version = get_token_version("u2")
+    bump_token_version("u2")
+
+    assert not is_token_version_current("u2", version, "phone")
+    assert not is_token_version_current("u2", version, "laptop")
+    assert is_token_version_current("u2", get_token_version("u2"), "laptop")
+
+
+@pytest.fixture
+def auth_app(app, db, redis_client, monkeypatch):
+    from backend.middleware import auth as auth_middleware
+    from backend.routes.auth import auth_bp
+    from backend.utils import revocation_filter, token_version
+
+    # no background listener or refresher: the test syncs the version table itself
+    monkeypatch.setattr(auth_middleware, "redis_client", redis_client)
+    monkeypatch.setitem(revocation_filter._state, "listener_started", True)
+    monkeypatch.setitem(token_version._state, "refresher_started", True)
+    monkeypatch.setitem(token_version._state, "cursor", None)
+    monkeypatch.setitem(token_version._state, "synced_at", None)
+    app.config["AUTH_STATELESS_FAST_PATH"] = True
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+
+    @app.route("/fast")
+    @auth_middleware.stateless_token_required
+    def fast():
+        return {"user_id": g.user_id}
+
+    return app
+
+
+def test_revoked_session_access_token_is_rejected_on_fast_path(auth_app, db):
+    from backend.routes.auth import access_token_claims, create_jwt
+    from backend.utils.refresh_tokens import issue_refresh_token
+    from backend.utils.token_version import _sync_versions
+
+    user_id = db.users.insert_one({"email": "s@example.com", "role": "student", "is_active": True}).inserted_id
+    user = db.users.find_one({"_id": user_id})
+    _, phone = issue_refresh_token(user_id)
+    _, laptop = issue_refresh_token(user_id)
+    phone_token = create_jwt(access_token_claims(user, session_id=phone))
+    laptop_token = create_jwt(access_token_claims(user, session_id=laptop))
+    client = auth_app.test_client()
+
+    def get_fast(token):
+        _sync_versions()
+        return client.get("/fast", headers={"Authorization": f"Bearer {token}"})
+
+    assert get_fast(phone_token).status_code == 200
+
+    response = client.delete(f"/api/auth/sessions/{phone}", headers={"Authorization": f"Bearer {laptop_token}"})
+    assert response.status_code == 200
+
+    revoked = get_fast(phone_token)
+    assert revoked.status_code == 401 and revoked.get_json()["error"] == "Token revoked"
+    assert get_fast(laptop_token).status_code == 200
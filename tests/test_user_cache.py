@@ -0,0 +1,84 @@
+from collections import OrderedDict
+
+import pytest
+
+from backend.utils import user_cache
+from backend.utils.user_cache import REDIS_KEY_PREFIX, get_cached_user, invalidate_user
+
+
+@pytest.fixture
+def user(app, db, redis_client, monkeypatch):
+    monkeypatch.setattr(user_cache, "_local", OrderedDict())
+    for name in user_cache._stats:
+        monkeypatch.setitem(user_cache._stats, name, 0)
+    user_id = db.users.insert_one({
+        "email": "s@example.com", "name": "Sam", "role": "student", "is_active": True, "password": "hash",
+    }).inserted_id
+    return user_id
+
+
+def _auth_app(app, redis_client, monkeypatch):
+    from backend.middleware import auth as auth_middleware
+    from backend.routes.auth import auth_bp
+    from backend.routes.exam.exam_auth import exam_auth_bp
+    from backend.utils import rate_limiter, revocation_filter
+
+    monkeypatch.setattr(auth_middleware, "redis_client", redis_client)
+    monkeypatch.setitem(revocation_filter._state, "listener_started", True)
+    monkeypatch.setattr(rate_limiter, "_sync_started", True)
+    app.config.update(PASSWORD_HASH_WORKERS=0)
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(exam_auth_bp)
+    return app.test_client()
+
+
+def test_lookups_go_local_then_redis_then_mongo(user, db, redis_client):
+    assert get_cached_user(user)["name"] == "Sam"
+    assert "password" not in get_cached_user(user)
+    assert user_cache._stats["misses"] == 1 and user_cache._stats["local_hits"] == 1
+
+    # another worker: empty local tier, warm redis
+    user_cache._local.clear()
+    db.users.update_one({"_id": user}, {"$set": {"name": "changed without invalidation"}})
+    assert get_cached_user(user)["name"] == "Sam"
+    assert user_cache._stats["redis_hits"] == 1 and user_cache._stats["misses"] == 1
+
+    invalidate_user(user)
+    assert redis_client.get(f"{REDIS_KEY_PREFIX}{user}") is None
+    assert get_cached_user(user)["name"] == "changed without invalidation"
+    assert user_cache._stats["misses"] == 2
+
+
+def test_inactive_user_is_not_cached(user, db):
+    db.users.update_one({"_id": user}, {"$set": {"is_active": False}})
+    assert get_cached_user(user) is None
+    assert get_cached_user(user) is None
+    assert user_cache._stats["misses"] == 2
+
+
+def test_profile_change_invalidates_the_cached_user(user, app, db, redis_client, monkeypatch):
+    from backend.routes.auth import access_token_claims, create_jwt
+
+    client = _auth_app(app, redis_client, monkeypatch)
+    token = create_jwt(access_token_claims(db.users.find_one({"_id": user})))
+    assert get_cached_user(user).get("student_id") is None
+
+    response = client.post("/api/exam/auth/create-student-id", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+
+    assert get_cached_user(user)["student_id"] == response.get_json()["student_id"]
+
+
+def test_password_reset_invalidates_the_cached_user(user, app, db, redis_client, monkeypatch):
+    from backend.utils.validation import generate_token
+
+    client = _auth_app(app, redis_client, monkeypatch)
+    get_cached_user(user)
+    db.users.update_one({"_id": user}, {"$set": {"role": "teacher"}})
+    token = generate_token(app.config["SECURITY_PASSWORD_SALT"], "s@example.com", app.config["SECRET_KEY"])
+
+    response = client.post("/api/auth/reset-password", json={"token": token, "password": "n3w-passw0rd"})
+    assert response.status_code == 200
+
+    assert redis_client.get(f"{REDIS_KEY_PREFIX}{user}") is None
+    assert get_cached_user(user)["role"] == "teacher"